@@ -6,32 +6,58 @@ Routes are organized in separate blueprint modules in the routes package.
 """
 
 from flask import Flask
-from database import init_database, add_sample_data
+from database import init_database, add_sample_data, init_app as init_db_pool
+from metrics import init_app as init_metrics
+from response_cache import init_app as init_response_cache
 from routes import register_blueprints
+from services.job_queue import init_app as init_job_workers
 
 
-def create_app():
+def create_app(config=None):
     """
     Application factory function to create and configure Flask app.
     
+    Settings are read from LIBRARY_* environment variables (for example
+    LIBRARY_METRICS_ENABLED=true), then overridden by `config`. Sample books
+    are only added when SAMPLE_DATA is set, as in the demo server below.
+    
+    Args:
+        config: Optional dict of Flask config values
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.config.from_prefixed_env('LIBRARY')
+    app.config.update(config or {})
+    
+    # Opt-in request timing, SQL instrumentation and /metrics endpoint
+    init_metrics(app)
     
-    # Initialize the database
+    # Pool database connections and release them at the end of each request
+    init_db_pool(app)
+    
+    # Initialize the database (skipped when the schema is already current)
     init_database()
     
     # Add sample data for testing and demonstration
-    add_sample_data()
+    if app.config.get('SAMPLE_DATA', False):
+        add_sample_data()
+    
+    # Cache rendered catalog and search pages per catalog version
+    init_response_cache(app)
     
     # Register all route blueprints
     register_blueprints(app)
     
+    # Run queued payment jobs in background threads, only if JOB_WORKERS is set
+    # (workers normally run separately: python manage.py run-workers)
+    init_job_workers(app)
+    
     return app
 
 
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app({'SAMPLE_DATA': True})
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,281 @@
+"""
+Hot Path Benchmark - Latency of the service functions and routes patrons hit most
+
+Seeds a temporary database with a synthetic catalog and loan history of the
+given size, then times borrow, return, search and the patron status report,
+both as direct service calls and as requests through the Flask test client.
+The catalog and search pages are timed rendered (response cache off) and,
+as route_*_cached, served from the response cache. Results are printed as
+JSON and can be compared against a stored baseline; only the 10,000-row
+run has one (benchmarks/baselines/hot_paths_10000.json), so other sizes
+are reported without comparison.
+
+Usage:
+    python -m benchmarks.bench_hot_paths --rows 10000 100000 1000000
+    python -m benchmarks.bench_hot_paths --rows 10000 --save benchmarks/baselines/hot_paths_10000.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from services.library_service import (
+    borrow_book_by_patron, return_book_by_patron, search_books_in_catalog, get_patron_status_report
+)
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+HISTORY_PER_PATRON = 20
+WORDS = (
+    "river", "shadow", "garden", "winter", "empire", "silent", "golden", "storm", "journey", "harbor",
+    "forest", "secret", "broken", "island", "crimson", "machine", "letters", "north", "glass", "orchard",
+    "thunder", "paper", "hollow", "kingdom", "distant", "ember", "ocean", "velvet", "iron", "lantern",
+    "morning", "wild", "station", "echo", "marble", "summer", "raven", "atlas", "bridge", "city",
+)
+SURNAMES = (
+    "Adams", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jensen",
+    "Kowalski", "Larsen", "Moreau", "Nakamura", "Okafor", "Patel", "Quinn", "Rossi", "Silva", "Tanaka",
+)
+
+
+def seed_catalog(rows: int, seed: int = 0):
+    """
+    Insert `rows` books and `rows` returned loans spread over rows // 20 patrons.
+
+    Titles and authors are drawn from small vocabularies so that searches
+    match realistic numbers of books.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    patrons = max(1, rows // HISTORY_PER_PATRON)
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, 3, 3)
+    ''', ((
+        ' '.join(rng.choice(WORDS).capitalize() for _ in range(3)),
+        f"{rng.choice(SURNAMES)} {rng.choice(SURNAMES)}",
+        f"{2000000000000 + i}"
+    ) for i in range(rows)))
+
+    def loans():
+        for _ in range(rows):
+            borrowed = now - timedelta(days=rng.randint(15, 1000), seconds=rng.randint(0, 86399))
+            yield (
+                f"{100000 + rng.randrange(patrons):06d}", rng.randint(1, rows), borrowed.isoformat(),
+                (borrowed + timedelta(days=14)).isoformat(), (borrowed + timedelta(days=rng.randint(1, 20))).isoformat()
+            )
+
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', loans())
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    return patrons
+
+
+def summarize(samples) -> dict:
+    """Reduce per-call latencies in seconds to millisecond statistics."""
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        'count': count,
+        'mean_ms': sum(samples) / count * 1000,
+        'p50_ms': samples[count // 2] * 1000,
+        'p95_ms': samples[min(count - 1, int(count * 0.95))] * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def time_calls(calls) -> dict:
+    """Run each zero-argument callable once and summarize the latencies."""
+    samples = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _check_ok(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+
+
+def run(rows: int, iterations: int = 200, seed: int = 0) -> dict:
+    """Seed a temporary database of the given size and time every hot path."""
+    rng = random.Random(seed + 1)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = database.DATABASE
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        try:
+            database.init_database()
+            started = time.perf_counter()
+            patrons = seed_catalog(rows, seed)
+            seed_seconds = time.perf_counter() - started
+
+            # Imported here so create_app sees the seeded database and skips sample data
+            from app import create_app
+            cached_client = create_app().test_client()
+            client = create_app({'RESPONSE_CACHE_SIZE': 0}).test_client()
+
+            # Each benchmark patron borrows one book, so the borrowing limit never applies
+            books = rng.sample(range(1, rows + 1), min(rows, iterations * 2))
+            loans = [(f"9{i:05d}", book_id) for i, book_id in enumerate(books[:iterations])]
+            route_loans = [(f"8{i:05d}", book_id) for i, book_id in enumerate(books[iterations:])]
+            existing_patrons = [f"{100000 + rng.randrange(patrons):06d}" for _ in range(iterations)]
+            title_terms = [rng.choice(WORDS)[:rng.randint(3, 6)] for _ in range(iterations)]
+            author_terms = [rng.choice(SURNAMES) for _ in range(iterations)]
+            isbns = [f"{2000000000000 + rng.randrange(rows)}" for _ in range(iterations)]
+
+            results['borrow_book_by_patron'] = time_calls(
+                lambda p=p, b=b: borrow_book_by_patron(p, b) for p, b in loans)
+            results['return_book_by_patron'] = time_calls(
+                lambda p=p, b=b: return_book_by_patron(p, b) for p, b in loans)
+            results['search_title'] = time_calls(
+                lambda t=t: search_books_in_catalog(t, 'title') for t in title_terms)
+            results['search_author'] = time_calls(
+                lambda t=t: search_books_in_catalog(t, 'author') for t in author_terms)
+            results['search_isbn'] = time_calls(
+                lambda t=t: search_books_in_catalog(t, 'isbn') for t in isbns)
+            results['get_patron_status_report'] = time_calls(
+                lambda p=p: get_patron_status_report(p) for p in existing_patrons)
+
+            results['route_catalog'] = time_calls(
+                lambda: _check_ok(client.get('/catalog')) for _ in range(iterations))
+            results['route_search'] = time_calls(
+                lambda t=t: _check_ok(client.get('/search', query_string={'q': t, 'type': 'title'}))
+                for t in title_terms)
+
+            # Cache hits only: each distinct page is rendered once before timing
+            def catalog_page():
+                _check_ok(cached_client.get('/catalog'))
+
+            def search_page(term):
+                _check_ok(cached_client.get('/search', query_string={'q': term, 'type': 'title'}))
+
+            catalog_page()
+            for t in set(title_terms):
+                search_page(t)
+            results['route_catalog_cached'] = time_calls(catalog_page for _ in range(iterations))
+            results['route_search_cached'] = time_calls(lambda t=t: search_page(t) for t in title_terms)
+            results['route_api_books'] = time_calls(
+                lambda: _check_ok(client.get('/api/books', query_string={'limit': 100})) for _ in range(iterations))
+            results['route_borrow'] = time_calls(
+                lambda p=p, b=b: _check_ok(client.post('/borrow', data={'patron_id': p, 'book_id': b}))
+                for p, b in route_loans)
+            results['route_return'] = time_calls(
+                lambda p=p, b=b: _check_ok(client.post('/return', data={'patron_id': p, 'book_id': b}))
+                for p, b in route_loans)
+
+            conn = database.get_db_connection()
+            open_loans = conn.execute('SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL').fetchone()[0]
+            conn.close()
+            if open_loans:
+                raise RuntimeError(f"{open_loans} benchmark loans were not returned")
+        finally:
+            database.get_pool().close()
+            database.DATABASE = previous
+
+    return {
+        'meta': {
+            'rows': rows,
+            'iterations': iterations,
+            'seed': seed,
+            'seed_seconds': seed_seconds,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+
+
+def default_baseline_path(rows: int) -> str:
+    return os.path.join(BASELINE_DIR, f"hot_paths_{rows}.json")
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.25) -> list:
+    """
+    Compare median latencies with a baseline run of the same size.
+
+    Returns:
+        list: [{'name', 'baseline_p50_ms', 'p50_ms', 'change', 'regression'}] for benchmarks in both runs
+    """
+    comparison = []
+    for name, stats in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        change = stats['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] > 0 else 0.0
+        comparison.append({
+            'name': name,
+            'baseline_p50_ms': before['p50_ms'],
+            'p50_ms': stats['p50_ms'],
+            'change': change,
+            'regression': change > threshold,
+        })
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='catalog sizes to benchmark')
+    parser.add_argument('--iterations', type=int, default=200, help='calls timed per benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--baseline', default=None,
+                        help='baseline JSON to compare with (default: benchmarks/baselines/hot_paths_<rows>.json)')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p50 slowdown before failing')
+    parser.add_argument('--save', default=None, help='write the results of a single --rows run to this file')
+    parser.add_argument('--output', default=None, help='write all results as JSON to this file instead of stdout')
+    args = parser.parse_args(argv)
+    if args.save and len(args.rows) > 1:
+        parser.error("--save takes a single --rows value")
+
+    runs = []
+    regressions = 0
+    for rows in args.rows:
+        result = run(rows, args.iterations, args.seed)
+        baseline_path = args.baseline or default_baseline_path(rows)
+        if not os.path.exists(baseline_path):
+            print(f"No baseline for {rows} rows ({baseline_path}); not compared", file=sys.stderr)
+        else:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            if baseline['meta']['rows'] == rows:
+                result['comparison'] = compare(result, baseline, args.threshold)
+                for entry in result['comparison']:
+                    if entry['regression']:
+                        regressions += 1
+                        print(f"REGRESSION {rows} rows {entry['name']}: p50 {entry['baseline_p50_ms']:.2f} ms -> "
+                              f"{entry['p50_ms']:.2f} ms ({entry['change']:+.0%})", file=sys.stderr)
+        runs.append(result)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(runs[0], f, indent=2)
+            f.write('\n')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(runs, f, indent=2)
+    else:
+        json.dump(runs, sys.stdout, indent=2)
+        print()
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Late Fee Benchmark - Bulk SQL fee engine vs the per-book calculation
+
+Seeds a temporary database with randomized open loans, computes every
+overdue fee with calculate_all_late_fees and with calculate_late_fee_for_book,
+checks the results match and reports the time taken by each.
+
+Usage:
+    python -m benchmarks.bench_late_fees --loans 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from services.library_service import calculate_all_late_fees, calculate_late_fee_for_book
+
+
+def seed_loans(loans: int, seed: int = 0):
+    """Insert one book per loan and a random open loan for each, due between 40 days ago and 14 days ahead."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, 1, 0)
+    ''', ((f"Book {i}", "Author", f"{1000000000000 + i}") for i in range(loans)))
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        (f"{rng.randint(100000, 100000 + loans // 3):06d}", i + 1, (due - timedelta(days=14)).isoformat(), due.isoformat())
+        for i, due in enumerate(now + timedelta(days=rng.randint(-40, 14), seconds=rng.randint(0, 86399)) for _ in range(loans))
+    ])
+    conn.commit()
+    conn.close()
+
+
+def run(loans: int, seed: int = 0) -> dict:
+    """Seed a temporary database, time both fee paths and compare their results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = database.DATABASE
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        try:
+            database.init_database()
+            seed_loans(loans, seed)
+
+            started = time.perf_counter()
+            bulk = calculate_all_late_fees()
+            bulk_seconds = time.perf_counter() - started
+
+            conn = database.get_db_connection()
+            open_loans = conn.execute('SELECT patron_id, book_id FROM borrow_records WHERE return_date IS NULL').fetchall()
+            conn.close()
+
+            started = time.perf_counter()
+            scalar = {}
+            for loan in open_loans:
+                fee = calculate_late_fee_for_book(loan['patron_id'], loan['book_id'])
+                if fee['fee_amount'] > 0:
+                    patron = scalar.setdefault(loan['patron_id'], 0.00)
+                    scalar[loan['patron_id']] = round(patron + fee['fee_amount'], 2)
+            scalar_seconds = time.perf_counter() - started
+        finally:
+            database.get_pool().close()
+            database.DATABASE = previous
+
+    totals = {patron_id: fees['total_fee'] for patron_id, fees in bulk.items()}
+    return {
+        'loans': loans,
+        'patrons_with_fees': len(totals),
+        'matches': totals == scalar,
+        'bulk_seconds': bulk_seconds,
+        'scalar_seconds': scalar_seconds,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--loans', type=int, default=5000, help='number of open loans to seed')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args(argv)
+
+    result = run(args.loans, args.seed)
+    print(f"{result['loans']} open loans, {result['patrons_with_fees']} patrons owing fees")
+    print(f"bulk:   {result['bulk_seconds'] * 1000:.1f} ms")
+    print(f"scalar: {result['scalar_seconds'] * 1000:.1f} ms")
+    print(f"results match: {result['matches']}")
+    return 0 if result['matches'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
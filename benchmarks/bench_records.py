@@ -0,0 +1,224 @@
+"""
+Record Benchmark - Slotted loan records vs the per-row dicts they replaced
+
+Seeds a temporary database with one patron's long loan history, fetches the
+rows once and then times turning them into the borrowed-book and history
+lists: the old way (a dict per row, every date parsed up front, a
+try/except per history row) and with the records module (dates parsed on
+first access). Each is timed building the list alone and building it and
+reading every date, and the memory held per record is reported.
+
+Usage:
+    python -m benchmarks.bench_records --loans 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from records import BorrowedBook, HistoryEntry
+
+PATRON_ID = '100000'
+
+
+def legacy_borrowed_books(records) -> list:
+    """The dict-per-row conversion get_patron_borrowed_books used to do."""
+    borrowed_books = []
+    for record in records:
+        borrowed_books.append({
+            'book_id': record['book_id'],
+            'title': record['title'],
+            'author': record['author'],
+            'borrow_date': datetime.fromisoformat(record['borrow_date']),
+            'due_date': datetime.fromisoformat(record['due_date']),
+            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
+        })
+    return borrowed_books
+
+
+def legacy_borrow_history(records) -> list:
+    """The dict-per-row conversion get_patron_borrow_history used to do."""
+    borrowed_books = []
+    for record in records:
+        try:
+            borrowed_books.append({
+                'book_id': record['book_id'],
+                'title': record['title'],
+                'author': record['author'],
+                'borrow_date': datetime.fromisoformat(record['borrow_date']),
+                'return_date': datetime.fromisoformat(record['return_date'])
+            })
+        except:
+            borrowed_books.append({
+                'book_id': record['book_id'],
+                'title': record['title'],
+                'author': record['author'],
+                'borrow_date': datetime.fromisoformat(record['borrow_date']),
+                'return_date': None
+            })
+    return borrowed_books
+
+
+def seed_history(loans: int, seed: int = 0):
+    """Insert `loans` books and one loan of each for PATRON_ID; one in ten is still open."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, 1, 1)
+    ''', ((f"Book {i}", "Author", f"{3000000000000 + i}") for i in range(loans)))
+
+    def history():
+        for i in range(loans):
+            borrowed = now - timedelta(days=rng.randint(1, 3000), seconds=rng.randint(0, 86399))
+            returned = None if i % 10 == 0 else (borrowed + timedelta(days=rng.randint(1, 20))).isoformat()
+            yield PATRON_ID, i + 1, borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat(), returned
+
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', history())
+    conn.commit()
+    conn.close()
+
+
+def best_of(repeat: int, call) -> float:
+    """Fastest of `repeat` timed calls, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bytes_per_record(build, rows: int) -> float:
+    """Memory allocated per row by building the list once."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        built = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del built
+    return (after - before) / max(rows, 1)
+
+
+# Read every date the way callers do: dicts by key, records by attribute
+def read_borrowed_dicts(books):
+    for book in books:
+        book['borrow_date'], book['due_date'], book['is_overdue']
+
+
+def read_borrowed_records(books):
+    for book in books:
+        book.borrow_date, book.due_date, book.is_overdue
+
+
+def read_history_dicts(entries):
+    for entry in entries:
+        entry['borrow_date'], entry['return_date']
+
+
+def read_history_records(entries):
+    for entry in entries:
+        entry.borrow_date, entry.return_date
+
+
+def run(loans: int = 5000, repeat: int = 5, seed: int = 0) -> dict:
+    """Seed a temporary database and time both representations on the same rows."""
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = database.DATABASE
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        try:
+            database.init_database()
+            seed_history(loans, seed)
+            conn = database.get_db_connection()
+            # The old helpers selected br.* and looked columns up by name
+            legacy_open = conn.execute('''
+                SELECT br.*, b.title, b.author FROM borrow_records br JOIN books b ON br.book_id = b.id
+                WHERE br.patron_id = ? AND br.return_date IS NULL ORDER BY br.borrow_date
+            ''', (PATRON_ID,)).fetchall()
+            legacy_all = conn.execute('''
+                SELECT br.*, b.title, b.author FROM borrow_records br JOIN books b ON br.book_id = b.id
+                WHERE br.patron_id = ? ORDER BY br.borrow_date
+            ''', (PATRON_ID,)).fetchall()
+            record_open = conn.execute('''
+                SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date
+                FROM borrow_records br JOIN books b ON br.book_id = b.id
+                WHERE br.patron_id = ? AND br.return_date IS NULL ORDER BY br.borrow_date
+            ''', (PATRON_ID,)).fetchall()
+            record_all = conn.execute('''
+                SELECT br.book_id, b.title, b.author, br.borrow_date, br.return_date
+                FROM borrow_records br JOIN books b ON br.book_id = b.id
+                WHERE br.patron_id = ? ORDER BY br.borrow_date
+            ''', (PATRON_ID,)).fetchall()
+            conn.close()
+
+            build = {
+                'borrowed_books': (lambda: legacy_borrowed_books(legacy_open), read_borrowed_dicts,
+                                   lambda: [BorrowedBook(*row) for row in record_open], read_borrowed_records),
+                'borrow_history': (lambda: legacy_borrow_history(legacy_all), read_history_dicts,
+                                   lambda: [HistoryEntry(*row) for row in record_all], read_history_records),
+            }
+            results = {}
+            for name, (legacy, read_legacy, records, read_records) in build.items():
+                rows = len(legacy())
+                if legacy() != records():
+                    raise RuntimeError(f"{name}: records differ from the legacy dicts")
+                results[name] = {
+                    'rows': rows,
+                    'dict_build_ms': best_of(repeat, legacy) * 1000,
+                    'record_build_ms': best_of(repeat, records) * 1000,
+                    'dict_build_and_read_ms': best_of(repeat, lambda: read_legacy(legacy())) * 1000,
+                    'record_build_and_read_ms': best_of(repeat, lambda: read_records(records())) * 1000,
+                    'dict_bytes_per_row': bytes_per_record(legacy, rows),
+                    'record_bytes_per_row': bytes_per_record(records, rows),
+                }
+
+            results['get_patron_borrow_history'] = {
+                'rows': loans,
+                'end_to_end_ms': best_of(repeat, lambda: database.get_patron_borrow_history(PATRON_ID)) * 1000,
+            }
+        finally:
+            database.get_pool().close()
+            database.DATABASE = previous
+    return {'loans': loans, 'repeat': repeat, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--loans', type=int, default=5000, help='loans in the patron\'s history')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per measurement (best is reported)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    result = run(args.loans, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    for name in ('borrowed_books', 'borrow_history'):
+        stats = result['results'][name]
+        print(f"{name} ({stats['rows']} rows)")
+        print(f"  build:          dicts {stats['dict_build_ms']:.2f} ms, records {stats['record_build_ms']:.2f} ms")
+        print(f"  build and read: dicts {stats['dict_build_and_read_ms']:.2f} ms, "
+              f"records {stats['record_build_and_read_ms']:.2f} ms")
+        print(f"  memory per row: dicts {stats['dict_bytes_per_row']:.0f} B, records {stats['record_bytes_per_row']:.0f} B")
+    print(f"get_patron_borrow_history end to end: {result['results']['get_patron_borrow_history']['end_to_end_ms']:.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Startup Benchmark - Time for a fresh process to import and build the app
+
+Starts new Python processes that import app and call create_app() against a
+temporary database: once on an empty file (migrations run) and then
+repeatedly on the migrated file, which is what each server worker does on
+boot. Reports the median times and fails if warm startup exceeds a target.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 10 --target-ms 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child process; prints timings and which heavy modules got imported
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app({'DATABASE': sys.argv[1]})
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'total_ms': (created - started) * 1000,
+    'modules': [name for name in ('requests', 'urllib3') if name in sys.modules],
+}))
+'''
+
+
+def measure(database_path: str) -> dict:
+    """Start one fresh interpreter, build the app and return its timings."""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, database_path],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs: int = 10) -> dict:
+    """Time one cold start (new database) and `runs` warm starts (current schema)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'startup.db')
+        cold = measure(path)
+        warm = [measure(path) for _ in range(runs)]
+    return {
+        'runs': runs,
+        'cold_total_ms': cold['total_ms'],
+        'warm_import_ms': statistics.median(sample['import_ms'] for sample in warm),
+        'warm_create_ms': statistics.median(sample['create_ms'] for sample in warm),
+        'warm_total_ms': statistics.median(sample['total_ms'] for sample in warm),
+        'heavy_modules': sorted(set().union(*(sample['modules'] for sample in warm))),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='warm starts to time')
+    parser.add_argument('--target-ms', type=float, default=None, help='fail if median warm startup exceeds this')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    result = run(args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"cold start (migrations): {result['cold_total_ms']:.0f} ms")
+        print(f"warm start: {result['warm_total_ms']:.0f} ms median "
+              f"(imports {result['warm_import_ms']:.0f} ms, create_app {result['warm_create_ms']:.0f} ms)")
+        print(f"heavy modules loaded at startup: {', '.join(result['heavy_modules']) or 'none'}")
+    if args.target_ms is not None and result['warm_total_ms'] > args.target_ms:
+        print(f"warm startup {result['warm_total_ms']:.0f} ms exceeds target {args.target_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
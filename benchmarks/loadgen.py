@@ -0,0 +1,351 @@
+"""
+Load Generator - Concurrent borrow/return stress test with invariant checks
+
+Seeds a temporary catalog, then drives /borrow, /return and read-only pages
+from many threads at once, either in-process through the WSGI test client or
+over HTTP against a local threaded server. Books are picked from a Zipfian
+distribution so a few hot titles see heavy contention. Reports throughput,
+p50/p99 latency and error rates per operation, then checks that the catalog
+is still consistent: available_copies never negative or above total_copies,
+and always equal to total_copies minus open loans.
+
+Usage:
+    python -m benchmarks.loadgen --threads 1 8 32 --duration 10
+    python -m benchmarks.loadgen --server --threads 16 --read-ratio 0.8 --zipf 1.3
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+MAX_LOANS_PER_PATRON = 5
+PATRONS_PER_THREAD = 50
+TITLE_WORDS = ("Hot", "Popular", "Classic", "Modern", "Rare", "Quiet")
+
+
+class ZipfSampler:
+    """Draw 1-based ranks with probability proportional to 1 / rank ** s."""
+
+    def __init__(self, n: int, s: float):
+        total = 0.0
+        self.cumulative = []
+        for rank in range(1, n + 1):
+            total += 1.0 / rank ** s
+            self.cumulative.append(total)
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1]) + 1
+
+
+def seed_books(books: int, copies: int):
+    """Insert `books` books with `copies` copies each; book id 1 is the hottest title."""
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((f"{TITLE_WORDS[i % len(TITLE_WORDS)]} Title {i + 1}", "Load Author", f"{3000000000000 + i}", copies, copies)
+          for i in range(books)))
+    conn.commit()
+    conn.close()
+
+
+class WSGITransport:
+    """Send requests in-process through the Flask test client."""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client(use_cookies=False)
+
+    def get(self, path, params=None):
+        response = self.client.get(path, query_string=params)
+        return response.status_code, response.get_data(as_text=True), None
+
+    def post(self, path, data):
+        response = self.client.post(path, data=data)
+        cookie = SimpleCookie()
+        for header in response.headers.getlist('Set-Cookie'):
+            cookie.load(header)
+        session = cookie.get(self.app.config['SESSION_COOKIE_NAME'])
+        return response.status_code, response.get_data(as_text=True), session.value if session else None
+
+
+class HTTPTransport:
+    """Send requests over HTTP to a server at base_url."""
+
+    def __init__(self, app, base_url):
+        import requests
+        self.app = app
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def get(self, path, params=None):
+        response = self.session.get(self.base_url + path, params=params)
+        return response.status_code, response.text, None
+
+    def post(self, path, data):
+        self.session.cookies.clear()
+        response = self.session.post(self.base_url + path, data=data, allow_redirects=False)
+        return response.status_code, response.text, response.cookies.get(self.app.config['SESSION_COOKIE_NAME'])
+
+
+def _outcome(app, status, body, session_cookie) -> str:
+    """Classify a borrow/return response as 'ok', 'rejected' (business rule) or 'error'."""
+    if status >= 500:
+        return 'error'
+    if 'class="flash-success"' in body:
+        return 'ok'
+    if 'class="flash-error"' in body:
+        return 'rejected'
+    if session_cookie:
+        # /borrow redirects, leaving its flash message in the session cookie
+        session = app.session_interface.get_signing_serializer(app).loads(session_cookie)
+        flashes = session.get('_flashes') or []
+        if flashes:
+            return 'ok' if flashes[-1][0] == 'success' else 'rejected'
+    return 'error'
+
+
+class Worker(threading.Thread):
+    """
+    One simulated client. Owns a disjoint set of patrons, so it can track
+    their loans locally and pick sensible borrows and returns.
+    """
+
+    def __init__(self, index, app, transport, sampler, read_ratio, stop, budget, seed):
+        super().__init__(daemon=True)
+        self.app = app
+        self.transport = transport
+        self.sampler = sampler
+        self.read_ratio = read_ratio
+        self.stop = stop
+        self.budget = budget
+        self.rng = random.Random(seed * 1000 + index)
+        first = 100000 + index * PATRONS_PER_THREAD
+        self.loans = {f"{first + i:06d}": set() for i in range(PATRONS_PER_THREAD)}
+        self.samples = {}
+        self.outcomes = {}
+        self.failures = 0
+
+    def _record(self, operation, seconds, outcome):
+        self.samples.setdefault(operation, []).append(seconds)
+        counts = self.outcomes.setdefault(operation, {'ok': 0, 'rejected': 0, 'error': 0})
+        counts[outcome] += 1
+
+    def _read(self):
+        choice = self.rng.random()
+        if choice < 0.4:
+            operation, path, params = 'catalog', '/catalog', None
+        elif choice < 0.8:
+            operation, path = 'search', '/search'
+            params = {'q': TITLE_WORDS[self.sampler.sample(self.rng) % len(TITLE_WORDS)], 'type': 'title'}
+        else:
+            operation, path, params = 'book_lookup', '/search', {'q': f"{2999999999999 + self.sampler.sample(self.rng)}", 'type': 'isbn'}
+        started = time.perf_counter()
+        status, _, _ = self.transport.get(path, params)
+        self._record(operation, time.perf_counter() - started, 'ok' if status < 400 else 'error')
+
+    def _write(self):
+        patron_id = self.rng.choice(list(self.loans))
+        loans = self.loans[patron_id]
+        book_id = self.sampler.sample(self.rng)
+        if loans and (len(loans) >= MAX_LOANS_PER_PATRON or book_id in loans or self.rng.random() < 0.5):
+            operation, book_id = 'return', self.rng.choice(sorted(loans))
+        else:
+            operation = 'borrow'
+        started = time.perf_counter()
+        status, body, cookie = self.transport.post(f"/{operation}", {'patron_id': patron_id, 'book_id': book_id})
+        seconds = time.perf_counter() - started
+        outcome = _outcome(self.app, status, body, cookie)
+        self._record(operation, seconds, outcome)
+        if outcome == 'ok':
+            if operation == 'borrow':
+                loans.add(book_id)
+            else:
+                loans.discard(book_id)
+        elif operation == 'return':
+            # A tracked loan that cannot be returned means the app lost it
+            self.failures += 1
+
+    def run(self):
+        while not self.stop.is_set() and next(self.budget) > 0:
+            try:
+                if self.rng.random() < self.read_ratio:
+                    self._read()
+                else:
+                    self._write()
+            except Exception:
+                self._record('exception', 0.0, 'error')
+
+
+def _percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def check_invariants(successful_borrows: int, successful_returns: int) -> list:
+    """Return a description of every consistency violation found in the database."""
+    conn = database.get_db_connection()
+    try:
+        violations = [
+            f"book {row['id']}: available_copies={row['available_copies']} total_copies={row['total_copies']}"
+            for row in conn.execute('''
+                SELECT id, available_copies, total_copies FROM books
+                WHERE available_copies < 0 OR available_copies > total_copies
+            ''')
+        ]
+        violations += [
+            f"book {row['id']}: available_copies={row['available_copies']} but "
+            f"{row['total_copies']} copies with {row['open_loans']} open loans"
+            for row in conn.execute('''
+                SELECT b.id, b.available_copies, b.total_copies, COUNT(br.id) AS open_loans
+                FROM books b
+                LEFT JOIN borrow_records br ON br.book_id = b.id AND br.return_date IS NULL
+                GROUP BY b.id
+                HAVING b.available_copies != b.total_copies - COUNT(br.id)
+            ''')
+        ]
+        violations += [
+            f"patron {row['patron_id']} has {row['loans']} open loans of book {row['book_id']}"
+            for row in conn.execute('''
+                SELECT patron_id, book_id, COUNT(*) AS loans FROM borrow_records
+                WHERE return_date IS NULL GROUP BY patron_id, book_id HAVING COUNT(*) > 1
+            ''')
+        ]
+        open_loans = conn.execute('SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL').fetchone()[0]
+    finally:
+        conn.close()
+    if open_loans != successful_borrows - successful_returns:
+        violations.append(f"{open_loans} open loans but {successful_borrows} borrows and "
+                          f"{successful_returns} returns succeeded")
+    return violations
+
+
+def run(threads: int, duration: float = 10.0, max_requests: int = None, books: int = 1000,
+        copies: int = 2, zipf: float = 1.1, read_ratio: float = 0.5, server: bool = False, seed: int = 0) -> dict:
+    """Seed a temporary catalog, apply load from `threads` clients and check invariants."""
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = database.DATABASE
+        database.DATABASE = os.path.join(tmp, 'load.db')
+        http_server = None
+        try:
+            database.init_database()
+            seed_books(books, copies)
+            from app import create_app
+            app = create_app({'DB_POOL_SIZE': max(database.DB_POOL_SIZE, threads)})
+
+            if server:
+                from werkzeug.serving import WSGIRequestHandler, make_server
+
+                class QuietHandler(WSGIRequestHandler):
+                    def log_request(self, *args, **kwargs):
+                        pass
+
+                http_server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+                threading.Thread(target=http_server.serve_forever, daemon=True).start()
+                base_url = f"http://127.0.0.1:{http_server.server_port}"
+
+            sampler = ZipfSampler(books, zipf)
+            stop = threading.Event()
+            budget = itertools.count(max_requests, -1) if max_requests else itertools.repeat(1)
+            workers = [
+                Worker(i, app, HTTPTransport(app, base_url) if server else WSGITransport(app),
+                       sampler, read_ratio, stop, budget, seed)
+                for i in range(threads)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            deadline = started + duration
+            while any(worker.is_alive() for worker in workers) and (max_requests or time.perf_counter() < deadline):
+                time.sleep(0.05)
+            stop.set()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+            operations = {}
+            for worker in workers:
+                for operation, samples in worker.samples.items():
+                    entry = operations.setdefault(operation, {'samples': [], 'ok': 0, 'rejected': 0, 'error': 0})
+                    entry['samples'].extend(samples)
+                    for outcome, count in worker.outcomes[operation].items():
+                        entry[outcome] += count
+            report = {}
+            for operation, entry in sorted(operations.items()):
+                samples = sorted(entry.pop('samples'))
+                count = len(samples)
+                report[operation] = dict(
+                    entry, count=count, per_second=count / elapsed,
+                    p50_ms=_percentile(samples, 0.50), p99_ms=_percentile(samples, 0.99),
+                    error_rate=entry['error'] / count
+                )
+
+            total = sum(entry['count'] for entry in report.values())
+            violations = check_invariants(report.get('borrow', {}).get('ok', 0), report.get('return', {}).get('ok', 0))
+            lost_returns = sum(worker.failures for worker in workers)
+            if lost_returns:
+                violations.append(f"{lost_returns} returns of loans the app had accepted were refused")
+        finally:
+            if http_server is not None:
+                http_server.shutdown()
+            database.get_pool().close()
+            database.DATABASE = previous
+
+    return {
+        'threads': threads,
+        'transport': 'http' if server else 'wsgi',
+        'seconds': elapsed,
+        'requests': total,
+        'requests_per_second': total / elapsed,
+        'operations': report,
+        'violations': violations,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[8], help='concurrency levels to run')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--requests', type=int, default=None, help='stop after this many requests instead')
+    parser.add_argument('--books', type=int, default=1000, help='catalog size')
+    parser.add_argument('--copies', type=int, default=2, help='copies of each book')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for book popularity (0 = uniform)')
+    parser.add_argument('--read-ratio', type=float, default=0.5, help='fraction of requests that are page reads')
+    parser.add_argument('--server', action='store_true', help='go through a local HTTP server instead of WSGI calls')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for threads in args.threads:
+        result = run(threads, args.duration, args.requests, args.books, args.copies, args.zipf,
+                     args.read_ratio, args.server, args.seed)
+        results.append(result)
+        print(f"{threads} threads ({result['transport']}): {result['requests']} requests in "
+              f"{result['seconds']:.1f}s, {result['requests_per_second']:.0f} req/s")
+        for operation, stats in result['operations'].items():
+            print(f"  {operation:<12} {stats['count']:>7} {stats['per_second']:>8.0f}/s  p50 {stats['p50_ms']:7.2f} ms  "
+                  f"p99 {stats['p99_ms']:7.2f} ms  ok {stats['ok']}  rejected {stats['rejected']}  "
+                  f"errors {stats['error_rate']:.2%}")
+        for violation in result['violations']:
+            print(f"  INVARIANT VIOLATED: {violation}", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(result['violations'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
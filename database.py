@@ -3,25 +3,489 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import base64
+import json
+import queue
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-# Database configuration
+from flask import g, has_app_context
+
+from cache import LRUCache
+from records import BorrowedBook, HistoryEntry, Loan
+from db_backends import SQLiteBackend, create_backend
+
+# Database configuration: DATABASE is a file path for SQLite or a connection
+# URL for PostgreSQL (see db_backends.BACKENDS)
 DATABASE = 'library.db'
+DATABASE_BACKEND = 'sqlite'
+
+# Connection pool configuration (overridable via configure_pool / app config)
+DB_POOL_SIZE = 5
+DB_POOL_TIMEOUT = 30.0
+DB_POOL_HEALTH_CHECK_INTERVAL = 30.0
+
+# Book lookup cache configuration (overridable via configure_book_cache / app config)
+BOOK_CACHE_SIZE = 1024
+BOOK_CACHE_TTL = 30.0
+
+# Closed loans returned more than this many days ago may be moved to
+# borrow_records_archive (see archive_closed_loans)
+ARCHIVE_AFTER_DAYS = 365
+
+# Pragmas applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',       # safe with WAL; fsync on checkpoint instead of every commit
+    'cache_size': -20000,          # ~20 MB page cache per connection
+    'mmap_size': 268435456,        # memory-map up to 256 MB of the database file
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,          # wait up to 5 s for the write lock instead of failing
+}
+
+# Callables invoked as listener(sql, seconds) after each statement run through
+# a pooled connection; an immutable tuple so execute() can read it without a lock
+_query_listeners = ()
+_query_listeners_lock = threading.Lock()
+
+def add_query_listener(listener: Callable[[str, float], None]):
+    """Time every statement executed through get_db_connection() and report it to listener."""
+    global _query_listeners
+    with _query_listeners_lock:
+        if listener not in _query_listeners:
+            _query_listeners = _query_listeners + (listener,)
+
+def remove_query_listener(listener: Callable[[str, float], None]):
+    """Stop reporting statements to listener."""
+    global _query_listeners
+    with _query_listeners_lock:
+        _query_listeners = tuple(l for l in _query_listeners if l != listener)
+
+def _notify_query_listeners(sql: str, seconds: float):
+    for listener in _query_listeners:
+        listener(sql, seconds)
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled database connection.
+
+    Behaves like the underlying connection, except that close() hands the
+    connection back to its pool instead of closing it. Connections pinned to a
+    Flask app context ignore close() and are released on teardown.
+    """
+
+    def __init__(self, raw: sqlite3.Connection, pool: 'ConnectionPool', pinned: bool = False):
+        self._raw = raw
+        self._pool = pool
+        self._pinned = pinned
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def backend(self):
+        """The backend (SQL dialect) of the database this connection belongs to."""
+        return self._pool.backend
+
+    def __enter__(self):
+        return self._raw.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._raw.__exit__(exc_type, exc, tb)
+
+    def execute(self, sql, parameters=()):
+        if not _query_listeners:
+            return self._raw.execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return self._raw.execute(sql, parameters)
+        finally:
+            _notify_query_listeners(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _query_listeners:
+            return self._raw.executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return self._raw.executemany(sql, seq_of_parameters)
+        finally:
+            _notify_query_listeners(sql, time.perf_counter() - started)
+
+    def close(self):
+        """Return the connection to the pool (no-op while pinned to an app context)."""
+        if not self._pinned:
+            self.release()
+
+    def release(self):
+        """Return the connection to the pool."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections shared between threads.
+
+    Idle connections are reused most-recently-used first. When all `size`
+    connections are checked out, callers wait up to `timeout` seconds for one
+    to be returned. Connections idle for longer than `health_check_interval`
+    are pinged before reuse and replaced if the ping fails.
+    """
+
+    def __init__(self, database: str, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 health_check_interval: float = DB_POOL_HEALTH_CHECK_INTERVAL, backend=None):
+        self.database = database
+        self.backend = backend or _create_backend(database)
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._last_used = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        return self.backend.connect()
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        last_used = self._last_used.get(id(conn), 0.0)
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except self.backend.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except self.backend.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['discarded'] += 1
+
+    def _take_idle(self, block: bool, timeout: Optional[float] = None) -> Optional[sqlite3.Connection]:
+        try:
+            conn = self._idle.get(block=block, timeout=timeout)
+        except queue.Empty:
+            return None
+        if self._is_healthy(conn):
+            return conn
+        self._discard(conn)
+        return self._create()
+
+    def _create(self) -> Optional[sqlite3.Connection]:
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self._connect()
+        except self.backend.Error:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, waiting if the pool is exhausted."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed.")
+
+        conn = self._take_idle(block=False)
+        if conn is not None:
+            with self._lock:
+                self._stats['hits'] += 1
+            return conn
+
+        conn = self._create()
+        if conn is not None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return conn
+
+        started = time.monotonic()
+        conn = self._take_idle(block=True, timeout=self.timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats['waits'] += 1
+            self._stats['wait_time'] += waited
+            if conn is None:
+                self._stats['timeouts'] += 1
+        if conn is None:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection.")
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except self.backend.Error:
+            self._discard(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._idle.put(conn)
+
+    def close(self):
+        """Close all idle connections; checked-out connections are closed on release."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        """Return a snapshot of pool usage counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._created
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _create_backend(database: str):
+    """Create the configured DATABASE_BACKEND for database."""
+    if DATABASE_BACKEND == SQLiteBackend.name:
+        return SQLiteBackend(database, SQLITE_PRAGMAS)
+    return create_backend(DATABASE_BACKEND, database)
+
+def get_pool() -> ConnectionPool:
+    """Get the connection pool for the configured DATABASE, creating it on first use."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.database == DATABASE and pool.backend.name == DATABASE_BACKEND:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE or _pool.backend.name != DATABASE_BACKEND:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE)
+            clear_book_cache()
+        return _pool
+
+def configure_pool(size: Optional[int] = None, timeout: Optional[float] = None,
+                   health_check_interval: Optional[float] = None):
+    """Change pool settings; the current pool is replaced on next use."""
+    global DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL, _pool
+    if size is not None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        DB_POOL_SIZE = size
+    if timeout is not None:
+        DB_POOL_TIMEOUT = timeout
+    if health_check_interval is not None:
+        DB_POOL_HEALTH_CHECK_INTERVAL = health_check_interval
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DATABASE, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL)
+    clear_book_cache()
+
+def close_pool():
+    """Close the connection pool; the next get_db_connection() opens a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_pool_stats() -> Dict:
+    """Get hit/miss/wait statistics for the connection pool."""
+    return get_pool().stats()
 
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """
+    Get a database connection from the pool.
+
+    Inside a Flask app context the same connection is reused for the whole
+    request and returned to the pool on teardown; elsewhere, close() returns
+    it to the pool immediately.
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            pool = get_pool()
+            conn = g._db_conn = PooledConnection(pool.acquire(), pool, pinned=True)
+        return conn
+    pool = get_pool()
+    return PooledConnection(pool.acquire(), pool)
+
+def release_db_connection(exception=None):
+    """Return the app context's connection to the pool (Flask teardown handler)."""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+def init_app(app):
+    """Configure the database, connection pool and book cache from app config and register teardown."""
+    global DATABASE, DATABASE_BACKEND
+    DATABASE = app.config.get('DATABASE', DATABASE)
+    DATABASE_BACKEND = app.config.get('DATABASE_BACKEND', DATABASE_BACKEND)
+    configure_pool(
+        size=app.config.get('DB_POOL_SIZE', DB_POOL_SIZE),
+        timeout=app.config.get('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT),
+        health_check_interval=app.config.get('DB_POOL_HEALTH_CHECK_INTERVAL', DB_POOL_HEALTH_CHECK_INTERVAL)
+    )
+    configure_book_cache(
+        size=app.config.get('BOOK_CACHE_SIZE', BOOK_CACHE_SIZE),
+        ttl=app.config.get('BOOK_CACHE_TTL', BOOK_CACHE_TTL)
+    )
+    app.teardown_appcontext(release_db_connection)
+
+# Books by id, plus ISBN -> id (an ISBN never moves to another book, so the
+# second cache only needs clearing when the database changes)
+_book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+_isbn_cache = LRUCache(BOOK_CACHE_SIZE, None)
+
+def configure_book_cache(size: Optional[int] = None, ttl: Optional[float] = None):
+    """Resize the book lookup cache or change its time-to-live (size 0 disables it)."""
+    global BOOK_CACHE_SIZE, BOOK_CACHE_TTL, _book_cache, _isbn_cache
+    if size is not None:
+        BOOK_CACHE_SIZE = size
+    if ttl is not None:
+        BOOK_CACHE_TTL = ttl
+    _book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+    _isbn_cache = LRUCache(BOOK_CACHE_SIZE, None)
+
+def clear_book_cache():
+    """Drop every cached book lookup."""
+    _book_cache.clear()
+    _isbn_cache.clear()
+
+def get_book_cache_stats() -> Dict:
+    """Get hit/miss statistics for the book lookup cache."""
+    return _book_cache.stats()
+
+def _invalidate_book(book_id: int):
+    """
+    Drop a book from the cache after it is written.
+
+    Inside a transaction the book is dropped again once the transaction ends,
+    since another thread may re-cache the old committed row in the meantime.
+    """
+    _book_cache.invalidate(book_id)
+    pending = getattr(_local, 'pending_invalidations', None)
+    if pending is not None:
+        pending.add(book_id)
+
+_local = threading.local()
+
+@contextmanager
+def uncached_book_reads():
+    """
+    Read books from the database, not the book cache, for the rest of the block.
+
+    For work whose result outlives the cache's TTL, such as pages cached by
+    catalog version: another server process may have changed a book without
+    being able to invalidate this process's cache.
+    """
+    previous = getattr(_local, 'uncached_book_reads', False)
+    _local.uncached_book_reads = True
+    try:
+        yield
+    finally:
+        _local.uncached_book_reads = previous
+
+def _book_cache_usable() -> bool:
+    # Transactions need the current row for their checks
+    return getattr(_local, 'transaction', None) is None and not getattr(_local, 'uncached_book_reads', False)
+
+@contextmanager
+def transaction():
+    """
+    Run a block of database helper calls as one unit of work.
+
+    Opens a write transaction (BEGIN IMMEDIATE on SQLite, taking the write
+    lock up front so concurrent borrow/return requests serialize instead of
+    racing; PostgreSQL takes no lock, so blocks that check then write call
+    acquire_lock() first) and binds
+    it to the current thread; every helper called inside the block reuses that
+    connection and skips its own commit. Commits on exit, rolls back on error.
+    Nested transaction() blocks join the outer transaction.
+    """
+    active = getattr(_local, 'transaction', None)
+    if active is not None:
+        yield active
+        return
 
-def init_database():
-    """Initialize the database with required tables."""
     conn = get_db_connection()
-    
-    # Create books table
-    conn.execute('''
+    try:
+        if conn.in_transaction:
+            conn.commit()
+        conn.backend.begin(conn)
+        _local.transaction = conn
+        _local.pending_invalidations = set()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        _local.transaction = None
+        for book_id in getattr(_local, 'pending_invalidations', None) or ():
+            _book_cache.invalidate(book_id)
+        _local.pending_invalidations = None
+        conn.close()
+
+@contextmanager
+def _connection():
+    """Yield the active transaction's connection, or a pooled one committed on exit."""
+    active = getattr(_local, 'transaction', None)
+    if active is not None:
+        yield active
+        return
+
+    conn = get_db_connection()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def acquire_lock(name: str):
+    """
+    Serialize transactions that check and then change the data behind name
+    (e.g. 'patron:123456'): the lock is held until the current transaction
+    ends. Call inside transaction(), before the reads it protects.
+    """
+    with _connection() as conn:
+        conn.backend.lock(conn, name)
+
+# Schema migrations, applied in order. Each entry is (version, description, statements);
+# the database's schema version (PRAGMA user_version on SQLite) records the last
+# version applied. POSTGRES_SCHEMA_MIGRATIONS below must keep the same versions.
+SCHEMA_MIGRATIONS = [
+    (1, 'Create books and borrow_records tables', [
+        '''
         CREATE TABLE IF NOT EXISTS books (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
@@ -30,10 +494,8 @@ def init_database():
             total_copies INTEGER NOT NULL,
             available_copies INTEGER NOT NULL
         )
-    ''')
-    
-    # Create borrow_records table
-    conn.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS borrow_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patron_id TEXT NOT NULL,
@@ -43,14 +505,477 @@ def init_database():
             return_date TEXT,
             FOREIGN KEY (book_id) REFERENCES books (id)
         )
-    ''')
+        ''',
+    ]),
+    (2, 'Index borrow_records for patron and open-loan lookups', [
+        # Active loans / loan count / return lookups: patron_id = ? AND return_date IS NULL
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_return
+        ON borrow_records (patron_id, return_date)
+        ''',
+        # Borrow history: patron_id = ? ORDER BY borrow_date
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_borrow_date
+        ON borrow_records (patron_id, borrow_date)
+        ''',
+        # Open loans per book, kept small by only indexing unreturned records
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_book
+        ON borrow_records (book_id) WHERE return_date IS NULL
+        ''',
+    ]),
+    (3, 'Full-text index over book titles and authors', [
+        # External-content FTS5 table: stores only the index, rows live in books
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        # Keep the index in step with books; availability updates do not touch it
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_after_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+        ''',
+        # Index any books that existed before this migration
+        "INSERT INTO books_fts (books_fts) VALUES ('rebuild')",
+    ]),
+    (4, 'Index books for keyset pagination by title', [
+        'CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)',
+    ]),
+    (5, 'Record how each late fee payment is split across books', [
+        '''
+        CREATE TABLE IF NOT EXISTS payment_allocations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            refunded_amount REAL NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            UNIQUE (transaction_id, book_id)
+        )
+        ''',
+    ]),
+    (6, 'Payment ledger keyed by idempotency key', [
+        '''
+        CREATE TABLE IF NOT EXISTS payments (
+            idempotency_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            transaction_id TEXT,
+            message TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_payments_transaction ON payments (transaction_id)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments (created_at)',
+    ]),
+    (7, 'Background job queue', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at TEXT NOT NULL,
+            result TEXT,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        # Workers only ever look for due, queued jobs
+        "CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (run_at, id) WHERE status = 'queued'",
+    ]),
+    (8, 'Per-patron active loan counters', [
+        # One row per patron: open loan count and the open book ids as ",1,5,"
+        '''
+        CREATE TABLE IF NOT EXISTS patrons (
+            patron_id TEXT PRIMARY KEY,
+            active_loans INTEGER NOT NULL DEFAULT 0,
+            active_book_ids TEXT NOT NULL DEFAULT ','
+        )
+        ''',
+        # Triggers keep the counters in step with every write to borrow_records,
+        # inside the same transaction as the borrow or return
+        '''
+        CREATE TRIGGER IF NOT EXISTS patrons_after_loan_insert AFTER INSERT ON borrow_records
+        WHEN new.return_date IS NULL BEGIN
+            INSERT INTO patrons (patron_id, active_loans, active_book_ids)
+            VALUES (new.patron_id, 1, ',' || new.book_id || ',')
+            ON CONFLICT (patron_id) DO UPDATE SET
+                active_loans = active_loans + 1,
+                active_book_ids = active_book_ids || new.book_id || ',';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS patrons_after_loan_delete AFTER DELETE ON borrow_records
+        WHEN old.return_date IS NULL BEGIN
+            UPDATE patrons SET
+                active_loans = active_loans - 1,
+                active_book_ids = substr(active_book_ids, 1, instr(active_book_ids, ',' || old.book_id || ','))
+                    || substr(active_book_ids, instr(active_book_ids, ',' || old.book_id || ',') + length(',' || old.book_id || ','))
+            WHERE patron_id = old.patron_id AND instr(active_book_ids, ',' || old.book_id || ',') > 0;
+        END
+        ''',
+        # An update moves the loan out of the old row's counters and into the new row's
+        '''
+        CREATE TRIGGER IF NOT EXISTS patrons_after_loan_update AFTER UPDATE OF patron_id, book_id, return_date ON borrow_records
+        BEGIN
+            UPDATE patrons SET
+                active_loans = active_loans - 1,
+                active_book_ids = substr(active_book_ids, 1, instr(active_book_ids, ',' || old.book_id || ','))
+                    || substr(active_book_ids, instr(active_book_ids, ',' || old.book_id || ',') + length(',' || old.book_id || ','))
+            WHERE old.return_date IS NULL AND patron_id = old.patron_id
+                AND instr(active_book_ids, ',' || old.book_id || ',') > 0;
+            INSERT INTO patrons (patron_id, active_loans, active_book_ids)
+            SELECT new.patron_id, 1, ',' || new.book_id || ',' WHERE new.return_date IS NULL
+            ON CONFLICT (patron_id) DO UPDATE SET
+                active_loans = active_loans + 1,
+                active_book_ids = active_book_ids || new.book_id || ',';
+        END
+        ''',
+        # Count the loans that were open before this migration
+        '''
+        INSERT OR REPLACE INTO patrons (patron_id, active_loans, active_book_ids)
+        SELECT patron_id, COUNT(*), ',' || group_concat(book_id || ',', '')
+        FROM borrow_records WHERE return_date IS NULL GROUP BY patron_id
+        ''',
+    ]),
+    (9, 'Archive table for old closed loans', [
+        # Same columns and ids as borrow_records; only returned loans are moved here
+        '''
+        CREATE TABLE IF NOT EXISTS borrow_records_archive (
+            id INTEGER PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_archive_patron_borrow_date
+        ON borrow_records_archive (patron_id, borrow_date)
+        ''',
+    ]),
+    (10, 'Catalog version counter', [
+        # Single row bumped by every change to books, so cached catalog pages
+        # and HTTP validators can be keyed by it; updated_at is UTC
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO catalog_version (id, version, updated_at) VALUES (1, 1, datetime('now'))",
+        '''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_after_insert AFTER INSERT ON books BEGIN
+            UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_after_update AFTER UPDATE ON books BEGIN
+            UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS catalog_version_after_delete AFTER DELETE ON books BEGIN
+            UPDATE catalog_version SET version = version + 1, updated_at = datetime('now') WHERE id = 1;
+        END
+        ''',
+    ]),
+    (11, 'Cover borrow_date in the open-loan index', [
+        # Borrowed books: patron_id = ? AND return_date IS NULL ORDER BY borrow_date,
+        # answered from the index in order instead of scanning the patron's history
+        'DROP INDEX IF EXISTS idx_borrow_records_patron_return',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_return
+        ON borrow_records (patron_id, return_date, borrow_date)
+        ''',
+    ]),
+]
+
+# The same schema for PostgreSQL: SERIAL keys, and expression GIN indexes for
+# full-text search in place of the FTS5 table and its triggers
+POSTGRES_SCHEMA_MIGRATIONS = [
+    (1, 'Create books and borrow_records tables', [
+        '''
+        CREATE TABLE IF NOT EXISTS books (
+            id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS borrow_records (
+            id SERIAL PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL REFERENCES books (id),
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT
+        )
+        ''',
+    ]),
+    (2, 'Index borrow_records for patron and open-loan lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_return ON borrow_records (patron_id, return_date)',
+        'CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_borrow_date ON borrow_records (patron_id, borrow_date)',
+        'CREATE INDEX IF NOT EXISTS idx_borrow_records_open_book ON borrow_records (book_id) WHERE return_date IS NULL',
+    ]),
+    (3, 'Full-text index over book titles and authors', [
+        "CREATE INDEX IF NOT EXISTS idx_books_title_fts ON books USING GIN (to_tsvector('simple', title))",
+        "CREATE INDEX IF NOT EXISTS idx_books_author_fts ON books USING GIN (to_tsvector('simple', author))",
+    ]),
+    (4, 'Index books for keyset pagination by title', [
+        'CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)',
+    ]),
+    (5, 'Record how each late fee payment is split across books', [
+        '''
+        CREATE TABLE IF NOT EXISTS payment_allocations (
+            id SERIAL PRIMARY KEY,
+            transaction_id TEXT NOT NULL,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            amount DOUBLE PRECISION NOT NULL,
+            refunded_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            UNIQUE (transaction_id, book_id)
+        )
+        ''',
+    ]),
+    (6, 'Payment ledger keyed by idempotency key', [
+        '''
+        CREATE TABLE IF NOT EXISTS payments (
+            idempotency_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            patron_id TEXT,
+            book_id INTEGER,
+            amount DOUBLE PRECISION NOT NULL,
+            status TEXT NOT NULL,
+            transaction_id TEXT,
+            message TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_payments_transaction ON payments (transaction_id)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments (created_at)',
+    ]),
+    (7, 'Background job queue', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id SERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at TEXT NOT NULL,
+            result TEXT,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (run_at, id) WHERE status = 'queued'",
+    ]),
+    (8, 'Per-patron active loan counters', [
+        '''
+        CREATE TABLE IF NOT EXISTS patrons (
+            patron_id TEXT PRIMARY KEY,
+            active_loans INTEGER NOT NULL DEFAULT 0,
+            active_book_ids TEXT NOT NULL DEFAULT ','
+        )
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION patrons_track_loans() RETURNS trigger AS $$
+        DECLARE
+            token TEXT;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.return_date IS NULL THEN
+                token := ',' || OLD.book_id || ',';
+                UPDATE patrons SET
+                    active_loans = active_loans - 1,
+                    active_book_ids = overlay(active_book_ids PLACING ',' FROM strpos(active_book_ids, token) FOR length(token))
+                WHERE patron_id = OLD.patron_id AND strpos(active_book_ids, token) > 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.return_date IS NULL THEN
+                INSERT INTO patrons (patron_id, active_loans, active_book_ids)
+                VALUES (NEW.patron_id, 1, ',' || NEW.book_id || ',')
+                ON CONFLICT (patron_id) DO UPDATE SET
+                    active_loans = patrons.active_loans + 1,
+                    active_book_ids = patrons.active_book_ids || NEW.book_id || ',';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        '''
+        CREATE OR REPLACE TRIGGER patrons_track_loans
+        AFTER INSERT OR DELETE OR UPDATE OF patron_id, book_id, return_date ON borrow_records
+        FOR EACH ROW EXECUTE FUNCTION patrons_track_loans()
+        ''',
+        '''
+        INSERT INTO patrons (patron_id, active_loans, active_book_ids)
+        SELECT patron_id, COUNT(*), ',' || string_agg(book_id || ',', '')
+        FROM borrow_records WHERE return_date IS NULL GROUP BY patron_id
+        ON CONFLICT (patron_id) DO UPDATE SET
+            active_loans = EXCLUDED.active_loans, active_book_ids = EXCLUDED.active_book_ids
+        ''',
+    ]),
+    (9, 'Archive table for old closed loans', [
+        '''
+        CREATE TABLE IF NOT EXISTS borrow_records_archive (
+            id INTEGER PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_archive_patron_borrow_date
+        ON borrow_records_archive (patron_id, borrow_date)
+        ''',
+    ]),
+    (10, 'Catalog version counter', [
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+        '''
+        INSERT INTO catalog_version (id, version, updated_at)
+        VALUES (1, 1, to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS'))
+        ON CONFLICT (id) DO NOTHING
+        ''',
+        # One bump per statement, so a bulk import touches the row once
+        '''
+        CREATE OR REPLACE FUNCTION catalog_version_bump() RETURNS trigger AS $$
+        BEGIN
+            UPDATE catalog_version SET
+                version = version + 1,
+                updated_at = to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')
+            WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        ''',
+        '''
+        CREATE OR REPLACE TRIGGER catalog_version_bump
+        AFTER INSERT OR UPDATE OR DELETE ON books
+        FOR EACH STATEMENT EXECUTE FUNCTION catalog_version_bump()
+        ''',
+    ]),
+    (11, 'Cover borrow_date in the open-loan index', [
+        'DROP INDEX IF EXISTS idx_borrow_records_patron_return',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_return
+        ON borrow_records (patron_id, return_date, borrow_date)
+        ''',
+    ]),
+]
+
+def _schema_migrations(backend) -> List[Tuple[int, str, List[str]]]:
+    return POSTGRES_SCHEMA_MIGRATIONS if backend.name == 'postgresql' else SCHEMA_MIGRATIONS
+
+def get_schema_version(conn=None) -> int:
+    """Get the schema version recorded in the database."""
+    if conn is not None:
+        return conn.backend.get_schema_version(conn)
+    with _connection() as conn:
+        return conn.backend.get_schema_version(conn)
+
+def migrate_database() -> List[int]:
+    """
+    Apply any pending schema migrations.
+
+    Each migration runs in its own transaction and re-checks the schema
+    version once it holds the database's write lock, so several processes
+    starting at once upgrade the database exactly once.
+
+    Returns:
+        List[int]: Versions applied by this call
+    """
+    applied = []
+    conn = get_db_connection()
+    backend = conn.backend
+    try:
+        for version, description, statements in _schema_migrations(backend):
+            if get_schema_version(conn) >= version:
+                continue
+            if conn.in_transaction:
+                conn.commit()
+            backend.begin(conn, exclusive=True)
+            try:
+                if get_schema_version(conn) < version:
+                    for statement in statements:
+                        conn.execute(statement)
+                    backend.set_schema_version(conn, version)
+                    applied.append(version)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        if applied:
+            backend.optimize(conn)
+    finally:
+        conn.close()
+    return applied
+
+def init_database():
+    """
+    Initialize the database: enable WAL journaling (SQLite) and apply schema migrations.
+
+    Does nothing beyond one schema version read when the schema is already
+    current, so it is cheap to call on every worker start.
+    """
+    conn = get_db_connection()
+    try:
+        if get_schema_version(conn) >= _schema_migrations(conn.backend)[-1][0]:
+            return
+        conn.backend.prepare(conn)
+    finally:
+        conn.close()
     
-    conn.commit()
-    conn.close()
+    migrate_database()
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
+    if conn.in_transaction:
+        conn.commit()
+    # Take the write lock before checking, so concurrent server workers add it once
+    conn.backend.begin(conn, exclusive=True)
     book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
     
     if book_count == 0:
@@ -78,157 +1003,787 @@ def add_sample_data():
         # Update available copies for 1984
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
         
-        conn.commit()
-    
+    conn.commit()
     conn.close()
 
 # Helper Functions for Database Operations
 
+def get_catalog_version() -> Tuple[int, datetime]:
+    """
+    Get the catalog version and when it last changed (UTC).
+
+    The version goes up with every insert, update or delete on books, in the
+    same transaction, so it changes exactly when catalog pages may differ.
+    """
+    with _connection() as conn:
+        row = conn.execute('SELECT version, updated_at FROM catalog_version WHERE id = 1').fetchone()
+    return row['version'], datetime.fromisoformat(row['updated_at']).replace(tzinfo=timezone.utc)
+
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    with _connection() as conn:
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
     return [dict(book) for book in books]
 
+def _encode_book_cursor(book: Dict) -> str:
+    """Encode a book's (title, id) sort key as an opaque URL-safe cursor."""
+    key = json.dumps([book['title'], book['id']]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip('=')
+
+def _decode_book_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a cursor produced by _encode_book_cursor, raising ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        raise ValueError("Invalid cursor.")
+    return title, book_id
+
+def get_books_page(limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Get one page of books ordered by title, using keyset pagination.
+
+    Args:
+        limit: Maximum number of books to return
+        cursor: Opaque cursor from a previous page (None for the first page)
+
+    Returns:
+        tuple: (books, next_cursor) where next_cursor is None on the last page
+
+    Raises:
+        ValueError: If cursor is malformed
+    """
+    with _connection() as conn:
+        if cursor is None:
+            books = conn.execute('''
+                SELECT * FROM books ORDER BY title, id LIMIT ?
+            ''', (limit + 1,)).fetchall()
+        else:
+            books = conn.execute('''
+                SELECT * FROM books WHERE (title, id) > (?, ?)
+                ORDER BY title, id LIMIT ?
+            ''', (*_decode_book_cursor(cursor), limit + 1)).fetchall()
+
+    books = [dict(book) for book in books]
+    if len(books) > limit:
+        books = books[:limit]
+        return books, _encode_book_cursor(books[-1])
+    return books, None
+
+def iter_books(cursor: Optional[str] = None, batch_size: int = 500) -> Iterator[Dict]:
+    """
+    Yield every book ordered by title, fetching batch_size rows per query.
+
+    Each batch is a separate short query, so no connection is held between
+    batches and memory stays bounded regardless of catalog size.
+    """
+    while True:
+        books, cursor = get_books_page(batch_size, cursor)
+        yield from books
+        if cursor is None:
+            return
+
+def _cache_book(book: Dict):
+    _book_cache.set(book['id'], book)
+    _isbn_cache.set(book['isbn'], book['id'])
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    """
+    Get a specific book by ID.
+
+    Served from the book cache when possible. Lookups inside a transaction
+    or uncached_book_reads() always read the database so they see the
+    current row.
+    """
+    use_cache = _book_cache_usable()
+    if use_cache:
+        book = _book_cache.get(book_id)
+        if book is not None:
+            return dict(book)
+
+    with _connection() as conn:
+        book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+    if not book:
+        return None
+    book = dict(book)
+    if use_cache:
+        _cache_book(book)
+    return dict(book)
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    """Get a specific book by ISBN (cached like get_book_by_id)."""
+    use_cache = _book_cache_usable()
+    if use_cache:
+        book_id = _isbn_cache.get(isbn)
+        book = _book_cache.get(book_id) if book_id is not None else None
+        if book is not None:
+            return dict(book)
 
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
-    """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
+    with _connection() as conn:
+        book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    if not book:
+        return None
+    book = dict(book)
+    if use_cache:
+        _cache_book(book)
+    return dict(book)
+
+def search_books(search_term: str, column: str, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Full-text search of book titles or authors.
+
+    Every word in search_term must match the start of a word in the column
+    ("gats" finds "The Great Gatsby"). Results are ranked by relevance, then
+    by title.
+    """
+    if column not in ('title', 'author'):
+        raise ValueError(f"Cannot search books by {column!r}.")
+    with _connection() as conn:
+        query = conn.backend.search_query(column, search_term, limit)
+        if query is None:
+            return []
+        books = conn.execute(*query).fetchall()
+    return [dict(book) for book in books]
+
+def _query_borrowed_books(conn, patron_id: str) -> List[BorrowedBook]:
     records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+        SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ? AND br.return_date IS NULL
         ORDER BY br.borrow_date
     ''', (patron_id,)).fetchall()
-    conn.close()
-    
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
-    
-    return borrowed_books
+    return [BorrowedBook(*record) for record in records]
 
-def get_patron_borrow_history(patron_id: str) -> List[Dict]:
-    """Get borrow history of patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
+def get_patron_borrowed_books(patron_id: str) -> List[BorrowedBook]:
+    """Get currently borrowed books for a patron."""
+    with _connection() as conn:
+        return _query_borrowed_books(conn, patron_id)
+
+# Every loan, live and archived, for history queries; ids are unique across
+# both tables and the patron/date filters are pushed down into each branch
+_ALL_BORROW_RECORDS = '''(
+    SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_records
+    UNION ALL
+    SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_records_archive
+)'''
+
+def _history_filters(since: Optional[date], until: Optional[date]) -> Tuple[str, list]:
+    """SQL conditions (and parameters) keeping loans borrowed on or after since and before until."""
+    # ISO dates and datetimes sort as text, so a bare date bounds the whole day
+    conditions, params = '', []
+    if since is not None:
+        conditions += ' AND br.borrow_date >= ?'
+        params.append(since.isoformat())
+    if until is not None:
+        conditions += ' AND br.borrow_date < ?'
+        params.append(until.isoformat())
+    return conditions, params
+
+def get_patron_borrow_history(patron_id: str, since: Optional[date] = None,
+                              until: Optional[date] = None) -> List[HistoryEntry]:
+    """Get borrow history of patron, oldest first, optionally limited to loans borrowed in [since, until)."""
+    conditions, params = _history_filters(since, until)
+    with _connection() as conn:
+        records = conn.execute(f'''
+            SELECT br.book_id, b.title, b.author, br.borrow_date, br.return_date
+            FROM {_ALL_BORROW_RECORDS} br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ?{conditions}
+            ORDER BY br.borrow_date
+        ''', (patron_id, *params)).fetchall()
+    return [HistoryEntry(*record) for record in records]
+
+def _encode_history_cursor(borrow_date: str, record_id: int) -> str:
+    """Encode a borrow record's (borrow_date, id) sort key as an opaque URL-safe cursor."""
+    key = json.dumps([borrow_date, record_id]).encode()
+    return base64.urlsafe_b64encode(key).decode().rstrip('=')
+
+def _decode_history_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a cursor produced by _encode_history_cursor, raising ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        borrow_date, record_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor.") from e
+    if not isinstance(borrow_date, str) or not isinstance(record_id, int):
+        raise ValueError("Invalid cursor.")
+    return borrow_date, record_id
+
+def _query_history_page(conn, patron_id: str, limit: Optional[int], cursor: Optional[str],
+                        since: Optional[date], until: Optional[date]) -> Tuple[List[HistoryEntry], Optional[str]]:
+    conditions, params = _history_filters(since, until)
+    if cursor is not None:
+        conditions += ' AND (br.borrow_date, br.id) < (?, ?)'
+        params.extend(_decode_history_cursor(cursor))
+    if limit is not None:
+        params.append(limit + 1)
+    records = conn.execute(f'''
+        SELECT br.book_id, b.title, b.author, br.borrow_date, br.return_date, br.id
+        FROM {_ALL_BORROW_RECORDS} br 
         JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ?
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
-    
-    borrowed_books = []
-    for record in records:
-        try:
-            borrowed_books.append({
-                'book_id': record['book_id'],
-                'title': record['title'],
-                'author': record['author'],
-                'borrow_date': datetime.fromisoformat(record['borrow_date']),
-                'return_date': datetime.fromisoformat(record['return_date'])
-            })
-        except:
-            borrowed_books.append({
-                'book_id': record['book_id'],
-                'title': record['title'],
-                'author': record['author'],
-                'borrow_date': datetime.fromisoformat(record['borrow_date']),
-                'return_date': None
-            })
-    
-    return borrowed_books
+        WHERE br.patron_id = ?{conditions}
+        ORDER BY br.borrow_date DESC, br.id DESC
+        {'' if limit is None else 'LIMIT ?'}
+    ''', (patron_id, *params)).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(records) > limit:
+        records = records[:limit]
+        next_cursor = _encode_history_cursor(records[-1][3], records[-1][5])
+    return [HistoryEntry(r[0], r[1], r[2], r[3], r[4]) for r in records], next_cursor
+
+def get_patron_history_page(patron_id: str, limit: int = 50, cursor: Optional[str] = None,
+                            since: Optional[date] = None,
+                            until: Optional[date] = None) -> Tuple[List[HistoryEntry], Optional[str]]:
+    """
+    Get one page of a patron's borrow history, newest first, using keyset pagination.
+
+    Args:
+        patron_id: 6-digit library card ID
+        limit: Maximum number of loans to return
+        cursor: Opaque cursor from a previous page (None for the most recent loans)
+        since: Only loans borrowed on or after this date or datetime
+        until: Only loans borrowed before this date or datetime
+
+    Returns:
+        tuple: (loans, next_cursor) where next_cursor is None on the last page
+
+    Raises:
+        ValueError: If cursor is malformed
+    """
+    with _connection() as conn:
+        return _query_history_page(conn, patron_id, limit, cursor, since, until)
+
+def _query_history_summary(conn, patron_id: str, since: Optional[date], until: Optional[date]) -> Dict:
+    conditions, params = _history_filters(since, until)
+    months = conn.execute(f'''
+        SELECT substr(br.borrow_date, 1, 7) AS month, COUNT(*) AS loans,
+               SUM(CASE WHEN br.return_date IS NULL THEN 1 ELSE 0 END) AS open_loans
+        FROM {_ALL_BORROW_RECORDS} br
+        WHERE br.patron_id = ?{conditions}
+        GROUP BY substr(br.borrow_date, 1, 7)
+        ORDER BY month
+    ''', (patron_id, *params)).fetchall()
+    return {
+        'total_loans': sum(row['loans'] for row in months),
+        'open_loans': sum(row['open_loans'] for row in months),
+        'loans_per_month': [{'month': row['month'], 'loans': row['loans']} for row in months]
+    }
+
+def get_patron_history_summary(patron_id: str, since: Optional[date] = None, until: Optional[date] = None) -> Dict:
+    """
+    Aggregate a patron's borrow history in SQL without loading the loans.
+
+    Returns:
+        Dict: {'total_loans', 'open_loans', 'loans_per_month': [{'month': 'YYYY-MM', 'loans'}]},
+        months in ascending order and only those with loans
+    """
+    with _connection() as conn:
+        return _query_history_summary(conn, patron_id, since, until)
+
+def get_patron_activity(patron_id: str, history_limit: Optional[int]) -> Dict:
+    """
+    Load everything a patron status report shows over one connection.
+
+    Returns:
+        Dict: {'borrowed_books': open loans oldest first, 'history': the
+        history_limit most recent loans newest first (all when None),
+        'next_cursor': cursor for get_patron_history_page to continue the
+        history, 'summary': get_patron_history_summary() of the whole history}
+    """
+    with _connection() as conn:
+        borrowed_books = _query_borrowed_books(conn, patron_id)
+        history, next_cursor = _query_history_page(conn, patron_id, history_limit, None, None, None)
+        summary = _query_history_summary(conn, patron_id, None, None)
+    return {
+        'borrowed_books': borrowed_books,
+        'history': history,
+        'next_cursor': next_cursor,
+        'summary': summary
+    }
+
+def get_patron_loans(patron_id: str) -> List[Loan]:
+    """
+    Get every borrow record of a patron, active and returned, in one query.
+
+    Records are ordered by borrow date; dates are parsed on first access and
+    return_date is None for books still on loan.
+    """
+    with _connection() as conn:
+        records = conn.execute(f'''
+            SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date, br.return_date
+            FROM {_ALL_BORROW_RECORDS} br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ?
+            ORDER BY br.borrow_date
+        ''', (patron_id,)).fetchall()
+    return [Loan(*record) for record in records]
+
+def get_overdue_loan_fees(as_of: date) -> List[Dict]:
+    """
+    Compute late fees for every overdue open loan in one query.
+
+    Applies the same rule as the per-book calculation in SQL: $0.50/day for
+    the first 7 days overdue, $1.00/day after that, capped at $15.00.
+
+    Args:
+        as_of: Date to compute fees as of
+
+    Returns:
+        List[Dict]: One row per overdue loan (patron_id, book_id, days_overdue,
+        fee_amount), ordered by patron then book
+    """
+    with _connection() as conn:
+        backend = conn.backend
+        fee = backend.least_sql(
+            f"{backend.least_sql('days_overdue', '7')} * 0.50 + {backend.greatest_sql('days_overdue - 7', '0')} * 1.00",
+            '15.00'
+        )
+        records = conn.execute(f'''
+            SELECT patron_id, book_id, days_overdue, CAST({fee} AS REAL) AS fee_amount
+            FROM (
+                SELECT patron_id, book_id, {backend.days_overdue_sql(':as_of', 'due_date')} AS days_overdue
+                FROM borrow_records
+                WHERE return_date IS NULL
+            ) AS open_loans
+            WHERE days_overdue > 0
+            ORDER BY patron_id, book_id
+        ''', {'as_of': as_of.isoformat()}).fetchall()
+    return [dict(record) for record in records]
 
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
+    with _connection() as conn:
+        count = conn.execute('''
+            SELECT COUNT(*) as count FROM borrow_records 
+            WHERE patron_id = ? AND return_date IS NULL
+        ''', (patron_id,)).fetchone()['count']
     return count
 
-def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
-    """Insert a new book into the database."""
+def _parse_book_ids(active_book_ids: str) -> List[int]:
+    return [int(book_id) for book_id in active_book_ids.split(',') if book_id]
+
+def get_patron_loan_summary(patron_id: str) -> Dict:
+    """
+    Get a patron's open loan count and borrowed book ids with one primary-key read.
+
+    Reads the counters the borrow_records triggers maintain, so it agrees
+    with get_patron_borrow_count without scanning the patron's loans.
+
+    Returns:
+        Dict: {'active_loans': int, 'book_ids': set of int}
+    """
+    with _connection() as conn:
+        row = conn.execute('''
+            SELECT active_loans, active_book_ids FROM patrons WHERE patron_id = ?
+        ''', (patron_id,)).fetchone()
+    if row is None:
+        return {'active_loans': 0, 'book_ids': set()}
+    return {'active_loans': row['active_loans'], 'book_ids': set(_parse_book_ids(row['active_book_ids']))}
+
+def _expected_patron_loans_sql(backend) -> str:
+    return f'''
+        SELECT patron_id, COUNT(*) AS active_loans,
+               ',' || {backend.concat_agg_sql("book_id || ','")} AS active_book_ids
+        FROM borrow_records WHERE return_date IS NULL GROUP BY patron_id
+    '''
+
+def check_patron_loan_counters() -> List[Dict]:
+    """
+    Compare the patrons counters with the open loans in borrow_records.
+
+    Returns:
+        List[Dict]: One entry per patron whose counters disagree (patron_id,
+        recorded_loans, expected_loans, recorded_book_ids, expected_book_ids),
+        ordered by patron_id; empty when everything is consistent
+    """
+    with _connection() as conn:
+        expected = {row['patron_id']: row for row in conn.execute(_expected_patron_loans_sql(conn.backend))}
+        recorded = {row['patron_id']: row for row in conn.execute('SELECT * FROM patrons')}
+
+    mismatches = []
+    for patron_id in sorted(set(expected) | set(recorded)):
+        want = expected.get(patron_id)
+        have = recorded.get(patron_id)
+        expected_loans = want['active_loans'] if want else 0
+        recorded_loans = have['active_loans'] if have else 0
+        expected_book_ids = sorted(_parse_book_ids(want['active_book_ids'])) if want else []
+        recorded_book_ids = sorted(_parse_book_ids(have['active_book_ids'])) if have else []
+        if expected_loans != recorded_loans or expected_book_ids != recorded_book_ids:
+            mismatches.append({
+                'patron_id': patron_id,
+                'recorded_loans': recorded_loans,
+                'expected_loans': expected_loans,
+                'recorded_book_ids': recorded_book_ids,
+                'expected_book_ids': expected_book_ids
+            })
+    return mismatches
+
+def rebuild_patron_loan_counters() -> int:
+    """
+    Recompute every patron's counters from borrow_records.
+
+    Runs under the database-wide write lock so no borrow or return can
+    interleave. Returns the number of patrons with open loans.
+    """
     conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
+        if conn.in_transaction:
+            conn.commit()
+        conn.backend.begin(conn, exclusive=True)
+        conn.execute('DELETE FROM patrons')
+        cursor = conn.execute(f'''
+            INSERT INTO patrons (patron_id, active_loans, active_book_ids)
+            {_expected_patron_loans_sql(conn.backend)}
+        ''')
         conn.commit()
+        return cursor.rowcount
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
+
+def archive_closed_loans(older_than_days: Optional[int] = None, batch_size: int = 1000,
+                         now: Optional[datetime] = None) -> int:
+    """
+    Move loans returned more than older_than_days ago into borrow_records_archive.
+
+    Keeps borrow_records, which every open-loan query reads, down to open and
+    recently closed loans. Rows move in id order, batch_size at a time, each
+    batch copied and deleted in its own short transaction so borrows and
+    returns wait for at most one batch. History queries read both tables, so
+    no loan disappears from a patron's history.
+
+    Args:
+        older_than_days: Minimum age of the return date (default ARCHIVE_AFTER_DAYS)
+        batch_size: Rows moved per transaction
+        now: Time to measure the age from (default: now)
+
+    Returns:
+        int: Number of loans archived
+    """
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = ((now or datetime.now()) - timedelta(days=days)).isoformat()
+    closed = 'return_date IS NOT NULL AND return_date < ?'
+    moved = 0
+    last_id = 0
+    while True:
+        with transaction() as conn:
+            ids = conn.execute(f'''
+                SELECT id FROM borrow_records WHERE id > ? AND {closed} ORDER BY id LIMIT ?
+            ''', (last_id, cutoff, batch_size)).fetchall()
+            if not ids:
+                break
+            batch = (ids[0][0], ids[-1][0], cutoff)
+            conn.execute(f'''
+                INSERT INTO borrow_records_archive (id, patron_id, book_id, borrow_date, due_date, return_date)
+                SELECT id, patron_id, book_id, borrow_date, due_date, return_date
+                FROM borrow_records WHERE id BETWEEN ? AND ? AND {closed}
+            ''', batch)
+            conn.execute(f'DELETE FROM borrow_records WHERE id BETWEEN ? AND ? AND {closed}', batch)
+        moved += len(ids)
+        last_id = ids[-1][0]
+    return moved
+
+def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
+    """Insert a new book into the database."""
+    try:
+        with _connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (title, author, isbn, total_copies, available_copies))
+        _isbn_cache.invalidate(isbn)
+        _invalidate_book(cursor.lastrowid)
         return True
     except Exception as e:
-        conn.close()
         return False
 
+def get_existing_isbns(isbns: List[str]) -> set:
+    """Get the subset of the given ISBNs that are already in the catalog."""
+    isbns = list(isbns)
+    existing = set()
+    with _connection() as conn:
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(isbns), 500):
+            chunk = isbns[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = conn.execute(f'SELECT isbn FROM books WHERE isbn IN ({placeholders})', chunk).fetchall()
+            existing.update(row['isbn'] for row in rows)
+    return existing
+
+def insert_books(books: List[Tuple[str, str, str, int, int]]) -> int:
+    """
+    Insert many books with a single executemany.
+
+    Args:
+        books: (title, author, isbn, total_copies, available_copies) tuples
+
+    Returns:
+        int: Number of books inserted
+    """
+    with _connection() as conn:
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', books)
+    for book in books:
+        _isbn_cache.invalidate(book[2])
+    return len(books)
+
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
+        with _connection() as conn:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
         return True
     except Exception as e:
-        conn.close()
         return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
+        with _connection() as conn:
+            conn.execute('''
+                UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+            ''', (change, book_id))
+        _invalidate_book(book_id)
         return True
     except Exception as e:
-        conn.close()
+        return False
+
+def checkout_book_copy(book_id: int) -> bool:
+    """
+    Take one copy of a book off the shelf.
+
+    The decrement only applies while a copy is available, so two concurrent
+    borrowers can never both take the last copy. Returns False if no copy was
+    available (or the book does not exist).
+    """
+    try:
+        with _connection() as conn:
+            cursor = conn.execute('''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id = ? AND available_copies > 0
+            ''', (book_id,))
+        _invalidate_book(book_id)
+        return cursor.rowcount == 1
+    except Exception as e:
+        return False
+
+def checkin_book_copy(book_id: int) -> bool:
+    """Put one copy of a book back on the shelf, never exceeding total copies."""
+    try:
+        with _connection() as conn:
+            cursor = conn.execute('''
+                UPDATE books SET available_copies = available_copies + 1
+                WHERE id = ? AND available_copies < total_copies
+            ''', (book_id,))
+        _invalidate_book(book_id)
+        return cursor.rowcount == 1
+    except Exception as e:
         return False
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
+        with _connection() as conn:
+            conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (return_date.isoformat(), patron_id, book_id))
         return True
     except Exception as e:
-        conn.close()
         return False
+
+def insert_payment_allocations(transaction_id: str, patron_id: str, allocations: List[Tuple[int, float]]) -> bool:
+    """Record how a payment was split across books as (book_id, amount) pairs."""
+    created_at = datetime.now().isoformat()
+    try:
+        with _connection() as conn:
+            conn.executemany('''
+                INSERT INTO payment_allocations (transaction_id, patron_id, book_id, amount, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(transaction_id, patron_id, book_id, amount, created_at) for book_id, amount in allocations])
+        return True
+    except Exception as e:
+        return False
+
+def get_payment_allocation(transaction_id: str, book_id: int) -> Optional[Dict]:
+    """Get the part of a payment allocated to one book."""
+    with _connection() as conn:
+        allocation = conn.execute('''
+            SELECT * FROM payment_allocations WHERE transaction_id = ? AND book_id = ?
+        ''', (transaction_id, book_id)).fetchone()
+    return dict(allocation) if allocation else None
+
+def get_payment_allocations(transaction_id: str) -> List[Dict]:
+    """Get every book allocation of a payment."""
+    with _connection() as conn:
+        allocations = conn.execute('''
+            SELECT * FROM payment_allocations WHERE transaction_id = ? ORDER BY book_id
+        ''', (transaction_id,)).fetchall()
+    return [dict(allocation) for allocation in allocations]
+
+def add_refunded_amount(transaction_id: str, book_id: int, amount: float) -> bool:
+    """Add a refund against a book's allocation, never refunding more than was paid."""
+    try:
+        with _connection() as conn:
+            cursor = conn.execute('''
+                UPDATE payment_allocations SET refunded_amount = ROUND(CAST(refunded_amount + ? AS NUMERIC), 2)
+                WHERE transaction_id = ? AND book_id = ? AND refunded_amount + ? <= amount + 0.005
+            ''', (amount, transaction_id, book_id, amount))
+        return cursor.rowcount == 1
+    except Exception as e:
+        return False
+
+# Payment ledger statuses: 'pending' while the gateway call is in flight, then
+# 'completed' or 'declined' (final), or 'error' when the outcome is unknown
+PAYMENT_FINAL_STATUSES = ('completed', 'declined')
+
+def get_payment(idempotency_key: str) -> Optional[Dict]:
+    """Get a ledger entry by its idempotency key."""
+    with _connection() as conn:
+        payment = conn.execute('''
+            SELECT * FROM payments WHERE idempotency_key = ?
+        ''', (idempotency_key,)).fetchone()
+    return dict(payment) if payment else None
+
+def record_pending_payment(idempotency_key: str, kind: str, patron_id: Optional[str], book_id: Optional[int],
+                           amount: float, transaction_id: Optional[str] = None) -> bool:
+    """
+    Record a payment or refund as pending before it is sent to the gateway.
+
+    An entry left in 'error' (outcome unknown) is reset to pending so the
+    request can be retried under the same key; any other existing entry is
+    left untouched and False is returned.
+    """
+    now = datetime.now().isoformat()
+    try:
+        with _connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO payments (idempotency_key, kind, patron_id, book_id, amount, status,
+                                      transaction_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+                ON CONFLICT (idempotency_key) DO UPDATE SET
+                    status = 'pending', amount = excluded.amount, message = NULL, updated_at = excluded.updated_at
+                WHERE payments.status = 'error'
+            ''', (idempotency_key, kind, patron_id, book_id, amount, transaction_id, now, now))
+        return cursor.rowcount == 1
+    except Exception as e:
+        return False
+
+def complete_payment(idempotency_key: str, status: str, message: str, transaction_id: Optional[str] = None) -> bool:
+    """Record the gateway's answer for a pending ledger entry."""
+    try:
+        with _connection() as conn:
+            conn.execute('''
+                UPDATE payments SET status = ?, message = ?,
+                    transaction_id = COALESCE(?, transaction_id), updated_at = ?
+                WHERE idempotency_key = ?
+            ''', (status, message, transaction_id, datetime.now().isoformat(), idempotency_key))
+        return True
+    except Exception as e:
+        return False
+
+def get_payments(start: datetime, end: datetime, kind: Optional[str] = None,
+                 status: Optional[str] = None) -> List[Dict]:
+    """Get ledger entries created in [start, end), optionally filtered by kind and status."""
+    query = 'SELECT * FROM payments WHERE created_at >= ? AND created_at < ?'
+    params = [start.isoformat(), end.isoformat()]
+    if kind is not None:
+        query += ' AND kind = ?'
+        params.append(kind)
+    if status is not None:
+        query += ' AND status = ?'
+        params.append(status)
+    with _connection() as conn:
+        payments = conn.execute(query + ' ORDER BY created_at', params).fetchall()
+    return [dict(payment) for payment in payments]
+
+def _job_from_row(row) -> Dict:
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+def enqueue_job(kind: str, payload: Dict, max_attempts: int, run_at: Optional[datetime] = None) -> int:
+    """Add a job to the queue and return its id."""
+    now = datetime.now().isoformat()
+    with _connection() as conn:
+        cursor = conn.execute('''
+            INSERT INTO jobs (kind, payload, status, max_attempts, run_at, created_at, updated_at)
+            VALUES (?, ?, 'queued', ?, ?, ?, ?)
+        ''', (kind, json.dumps(payload), max_attempts, (run_at.isoformat() if run_at else now), now, now))
+    return cursor.lastrowid
+
+def claim_next_job(now: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Atomically take the next due job off the queue.
+
+    The job is marked running and its attempt count incremented in the same
+    transaction, so two workers can never claim the same job.
+    """
+    now = (now or datetime.now()).isoformat()
+    # Cheap read first so idle workers never take the write lock
+    with _connection() as conn:
+        due = conn.execute('''
+            SELECT 1 FROM jobs WHERE status = 'queued' AND run_at <= ? LIMIT 1
+        ''', (now,)).fetchone()
+    if due is None:
+        return None
+
+    with transaction() as conn:
+        row = conn.execute('''
+            SELECT id FROM jobs WHERE status = 'queued' AND run_at <= ?
+            ORDER BY run_at, id LIMIT 1
+        ''', (now,)).fetchone()
+        if row is None:
+            return None
+        claimed = conn.execute('''
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+            WHERE id = ? AND status = 'queued'
+        ''', (now, row['id']))
+        # Backends without a database-wide write lock can lose the race to another worker
+        if claimed.rowcount != 1:
+            return None
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],)).fetchone()
+    return _job_from_row(job)
+
+def finish_job(job_id: int, status: str, result: Optional[Dict] = None, error: Optional[str] = None,
+               run_at: Optional[datetime] = None) -> bool:
+    """Record a job's outcome; status 'queued' with run_at schedules a retry."""
+    now = datetime.now()
+    try:
+        with _connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, last_error = ?, run_at = COALESCE(?, run_at), updated_at = ?
+                WHERE id = ?
+            ''', (status, json.dumps(result) if result is not None else None, error,
+                  run_at.isoformat() if run_at else None, now.isoformat(), job_id))
+        return True
+    except Exception as e:
+        return False
+
+def get_job(job_id: int) -> Optional[Dict]:
+    """Get a job by id."""
+    with _connection() as conn:
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_from_row(job) if job else None
+
+def requeue_stale_jobs(started_before: datetime) -> int:
+    """Put jobs left running by a worker that died back on the queue."""
+    with _connection() as conn:
+        cursor = conn.execute('''
+            UPDATE jobs SET status = 'queued', updated_at = ?
+            WHERE status = 'running' AND updated_at < ?
+        ''', (datetime.now().isoformat(), started_before.isoformat()))
+    return cursor.rowcount
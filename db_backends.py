@@ -0,0 +1,262 @@
+"""
+Database backends for Library Management System
+Connection setup and the SQL that differs between SQLite and PostgreSQL
+"""
+
+import re
+import sqlite3
+from typing import Dict, Optional, Tuple
+
+class SQLiteBackend:
+    """Single-file SQLite database (the default)."""
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+    # Errors a later retry may not hit, e.g. "database is locked" under write contention
+    TransientError = sqlite3.OperationalError
+
+    def __init__(self, database: str, pragmas: Optional[Dict] = None):
+        self.database = database
+        self.pragmas = pragmas or {}
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        for pragma, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def begin(self, conn, exclusive: bool = False):
+        """Start a transaction holding the write lock, so writers serialize instead of racing."""
+        conn.execute('BEGIN IMMEDIATE')
+
+    def lock(self, conn, name: str):
+        """Nothing to do: the transaction already holds the database's only write lock."""
+
+    def prepare(self, conn):
+        # Persistent per database file; lets readers proceed while a writer commits
+        conn.execute('PRAGMA journal_mode=WAL')
+
+    def get_schema_version(self, conn) -> int:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def set_schema_version(self, conn, version: int):
+        conn.execute(f'PRAGMA user_version = {int(version)}')
+
+    def optimize(self, conn):
+        conn.execute('PRAGMA optimize')
+
+    def search_query(self, column: str, search_term: str, limit: Optional[int]) -> Optional[Tuple[str, tuple]]:
+        """Build an FTS5 search matching every word of search_term as a prefix within column."""
+        words = re.findall(r'\w+', search_term.lower())
+        if not words:
+            return None
+        match = ' AND '.join(f'{column} : "{word}"*' for word in words)
+        return '''
+            SELECT b.* FROM books_fts
+            JOIN books b ON b.id = books_fts.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY bm25(books_fts), b.title
+            LIMIT ?
+        ''', (match, -1 if limit is None else limit)
+
+    def days_overdue_sql(self, as_of: str, due_date: str) -> str:
+        """SQL for whole calendar days from the date part of due_date to as_of."""
+        return f'CAST(julianday({as_of}) - julianday(date({due_date})) AS INTEGER)'
+
+    def least_sql(self, *args: str) -> str:
+        return f"MIN({', '.join(args)})"
+
+    def greatest_sql(self, *args: str) -> str:
+        return f"MAX({', '.join(args)})"
+
+    def concat_agg_sql(self, expression: str) -> str:
+        """SQL aggregate concatenating expression over a group with no separator."""
+        return f"group_concat({expression}, '')"
+
+# ? and :name placeholders outside string literals and :: casts
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|\?|(?<!:):(\w+)|%")
+
+def translate_placeholders(sql: str) -> str:
+    """Rewrite sqlite3-style ? and :name placeholders in the psycopg2 (pyformat) style."""
+    def replace(match):
+        text = match.group(0)
+        if text.startswith("'"):
+            return text.replace('%', '%%')
+        if text == '?':
+            return '%s'
+        if text == '%':
+            return '%%'
+        return f'%({match.group(1)})s'
+    return _PLACEHOLDER.sub(replace, sql)
+
+class PostgresCursor:
+    """psycopg2 cursor with sqlite3's lastrowid for SERIAL primary keys."""
+
+    def __init__(self, cursor, conn):
+        self._cursor = cursor
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        cursor = self._conn.cursor()
+        cursor.execute('SELECT lastval()')
+        return cursor.fetchone()[0]
+
+class PostgresConnection:
+    """
+    psycopg2 connection with the subset of the sqlite3 connection API the
+    database module uses: execute/executemany returning cursors, rows
+    addressable by name or index, in_transaction, commit/rollback/close.
+    """
+
+    def __init__(self, raw):
+        import psycopg2.extensions
+        self._raw = raw
+        self._idle = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def execute(self, sql: str, parameters=()) -> PostgresCursor:
+        cursor = self._raw.cursor()
+        if parameters:
+            cursor.execute(translate_placeholders(sql), parameters)
+        else:
+            # Without parameters psycopg2 sends the text as-is, so % needs no escaping
+            cursor.execute(sql)
+        return PostgresCursor(cursor, self._raw)
+
+    def executemany(self, sql: str, seq_of_parameters) -> PostgresCursor:
+        cursor = self._raw.cursor()
+        cursor.executemany(translate_placeholders(sql), list(seq_of_parameters))
+        return PostgresCursor(cursor, self._raw)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._raw.info.transaction_status != self._idle
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+# Arbitrary application-wide keys for pg_advisory_xact_lock
+_SCHEMA_LOCK_KEY = 327_0001
+_NAMED_LOCK_SPACE = 327_0002
+
+class PostgresBackend:
+    """
+    PostgreSQL server, for deployments with more concurrent writers than a
+    single SQLite file lock allows. Requires psycopg2 (pip install psycopg2-binary);
+    `database` is a libpq connection string or postgresql:// URL.
+    """
+
+    name = 'postgresql'
+
+    def __init__(self, database: str):
+        self.database = database
+        try:
+            import psycopg2
+            import psycopg2.extras
+        except ImportError as e:
+            raise ImportError("The postgresql database backend requires psycopg2 "
+                              "(pip install psycopg2-binary).") from e
+        self._psycopg2 = psycopg2
+        self.Error = psycopg2.Error
+        # Lost connections, lock timeouts, and serialization failures/deadlocks
+        # (TransactionRollbackError is a subclass)
+        self.TransientError = psycopg2.OperationalError
+
+    def connect(self) -> PostgresConnection:
+        raw = self._psycopg2.connect(self.database, cursor_factory=self._psycopg2.extras.DictCursor)
+        return PostgresConnection(raw)
+
+    def begin(self, conn, exclusive: bool = False):
+        """
+        Start a transaction. Unlike SQLite's BEGIN IMMEDIATE this takes no
+        lock: only schema changes and one-time setup (exclusive=True) take a
+        database-wide one. Read-then-write checks must lock what they check
+        with lock().
+        """
+        if conn.in_transaction:
+            conn.commit()
+        if exclusive:
+            conn.execute('SELECT pg_advisory_xact_lock(?)', (_SCHEMA_LOCK_KEY,))
+
+    def lock(self, conn, name: str):
+        """Take a transaction-scoped advisory lock on name, waiting while another transaction holds it."""
+        # hashtext collisions only make unrelated names share a lock
+        conn.execute('SELECT pg_advisory_xact_lock(?, hashtext(?))', (_NAMED_LOCK_SPACE, name))
+
+    def prepare(self, conn):
+        conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        conn.commit()
+
+    def get_schema_version(self, conn) -> int:
+        if conn.execute("SELECT to_regclass('schema_version')").fetchone()[0] is None:
+            return 0
+        return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+    def set_schema_version(self, conn, version: int):
+        conn.execute('DELETE FROM schema_version')
+        conn.execute('INSERT INTO schema_version (version) VALUES (?)', (int(version),))
+
+    def optimize(self, conn):
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.commit()
+
+    def search_query(self, column: str, search_term: str, limit: Optional[int]) -> Optional[Tuple[str, tuple]]:
+        """Build a full-text search matching every word of search_term as a prefix within column."""
+        words = re.findall(r'\w+', search_term.lower())
+        if not words:
+            return None
+        query = ' & '.join(f'{word}:*' for word in words)
+        document = f"to_tsvector('simple', b.{column})"
+        return f'''
+            SELECT b.* FROM books b
+            WHERE {document} @@ to_tsquery('simple', ?)
+            ORDER BY ts_rank({document}, to_tsquery('simple', ?)) DESC, b.title
+            LIMIT ?
+        ''', (query, query, limit)
+
+    def days_overdue_sql(self, as_of: str, due_date: str) -> str:
+        return f'(CAST({as_of} AS date) - CAST(CAST({due_date} AS timestamp) AS date))'
+
+    def least_sql(self, *args: str) -> str:
+        return f"LEAST({', '.join(args)})"
+
+    def greatest_sql(self, *args: str) -> str:
+        return f"GREATEST({', '.join(args)})"
+
+    def concat_agg_sql(self, expression: str) -> str:
+        return f"string_agg({expression}, '')"
+
+BACKENDS = {
+    SQLiteBackend.name: SQLiteBackend,
+    PostgresBackend.name: PostgresBackend,
+}
+
+def create_backend(name: str, database: str, **options):
+    """Create the backend registered under name for the given database path or URL."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown database backend {name!r}; choose one of {', '.join(BACKENDS)}.")
+    return BACKENDS[name](database, **options)
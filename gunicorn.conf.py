@@ -0,0 +1,80 @@
+"""
+Gunicorn settings for the Library Management System.
+
+Every setting can be overridden from the environment:
+
+    LIBRARY_BIND              address to listen on (default 0.0.0.0:5000)
+    LIBRARY_WORKERS           worker processes (default WEB_CONCURRENCY or 2 x CPUs + 1, at most 8)
+    LIBRARY_THREADS           request threads per worker (default 4)
+    LIBRARY_KEEPALIVE         seconds to hold idle keep-alive connections (default 5)
+    LIBRARY_TIMEOUT           seconds before a silent worker is killed and restarted (default 30)
+    LIBRARY_GRACEFUL_TIMEOUT  seconds workers get to finish requests on reload/shutdown (default 30)
+    LIBRARY_MAX_REQUESTS      recycle a worker after this many requests, 0 = never (default 0)
+    LIBRARY_SAMPLE_DATA       set to true to add the demo books to an empty catalog
+    LIBRARY_JOB_WORKERS       background job threads per worker process (default 0: run
+                              `python manage.py run-workers` separately)
+    LIBRARY_DB_POOL_SIZE      database connections per worker (default and minimum: threads
+                              plus job threads, so no request waits on pool checkout)
+    LIBRARY_DATABASE          SQLite file, or PostgreSQL URL with LIBRARY_DATABASE_BACKEND=postgresql
+
+Send SIGHUP to the master for a graceful reload: new workers start with the
+new code and config while old ones finish their in-flight requests.
+"""
+
+import multiprocessing
+import os
+
+import database
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get('LIBRARY_BIND', '0.0.0.0:5000')
+workers = _env_int('LIBRARY_WORKERS', os.environ.get('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count() + 1, 8)))
+threads = _env_int('LIBRARY_THREADS', 4)
+worker_class = 'gthread'
+keepalive = _env_int('LIBRARY_KEEPALIVE', 5)
+timeout = _env_int('LIBRARY_TIMEOUT', 30)
+graceful_timeout = _env_int('LIBRARY_GRACEFUL_TIMEOUT', 30)
+max_requests = _env_int('LIBRARY_MAX_REQUESTS', 0)
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+
+# Every request thread and job thread holds a pooled connection while it works
+job_workers = _env_int('LIBRARY_JOB_WORKERS', 0)
+db_pool_size = _env_int('LIBRARY_DB_POOL_SIZE', threads + job_workers)
+if db_pool_size < threads + job_workers:
+    raise ValueError(f"LIBRARY_DB_POOL_SIZE={db_pool_size} is smaller than the {threads} request "
+                     f"and {job_workers} job threads per worker.")
+# Set in the master's environment, which each worker's create_app() reads
+raw_env = [f'LIBRARY_DB_POOL_SIZE={db_pool_size}']
+
+# Each worker builds its own app, connection pool and any job worker threads;
+# neither SQLite connections nor threads may be carried across fork()
+preload_app = False
+
+
+def on_starting(server):
+    """Prepare the database once in the master, before any worker starts."""
+    database.DATABASE = os.environ.get('LIBRARY_DATABASE', database.DATABASE)
+    database.DATABASE_BACKEND = os.environ.get('LIBRARY_DATABASE_BACKEND', database.DATABASE_BACKEND)
+    database.init_database()
+    if os.environ.get('LIBRARY_SAMPLE_DATA', '').lower() in ('1', 'true', 'yes'):
+        database.add_sample_data()
+    # Workers open their own connections after fork
+    database.close_pool()
+
+
+def post_fork(server, worker):
+    # The master's pool was closed in on_starting; start from a clean slate anyway
+    database.close_pool()
+
+
+def worker_exit(server, worker):
+    """Let background jobs finish their current step before the worker exits."""
+    app = getattr(worker, 'wsgi', None)
+    job_workers = getattr(app, 'extensions', {}).get('job_workers')
+    if job_workers is not None:
+        job_workers.stop(timeout=graceful_timeout)
@@ -0,0 +1,163 @@
+"""
+Management commands for the Library Management System.
+
+Usage:
+    python manage.py [--db PATH] <command> [options]
+
+Run `python manage.py --help` for the list of commands.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime
+import database
+from db_backends import BACKENDS
+
+
+def import_books_command(args):
+    """Bulk-import books from a CSV or JSONL feed."""
+    from services.catalog_import import import_books
+
+    report = import_books(args.path, args.format, args.chunk_size)
+    for reject in report['rejected'][:args.show_rejects]:
+        print(f"line {reject['line']}: {reject['reason']} (isbn={reject['isbn']})", file=sys.stderr)
+    if len(report['rejected']) > args.show_rejects:
+        print(f"... {len(report['rejected']) - args.show_rejects} more rejects", file=sys.stderr)
+    print(f"{report['imported']} imported, {len(report['rejected'])} rejected of {report['rows']} rows "
+          f"in {report['seconds']:.2f}s ({report['rows_per_second']:.0f} rows/s)")
+    return 0 if not report['rejected'] else 1
+
+
+def run_workers_command(args):
+    """Run background job workers until interrupted."""
+    from services.job_queue import JobWorkerPool
+
+    pool = JobWorkerPool(args.workers, args.poll_interval)
+    pool.start()
+    print(f"{args.workers} job worker(s) running; press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop(timeout=30)
+    return 0
+
+
+def reconcile_command(args):
+    """Reconcile a day's ledger charges against the payment gateway."""
+    from services.library_service import reconcile_payments
+
+    day = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else date.today()
+    started = time.perf_counter()
+    report = reconcile_payments(day, max_workers=args.workers)
+    for mismatch in report['mismatched']:
+        print(f"MISMATCH {mismatch['transaction_id']} (key={mismatch['idempotency_key']}, "
+              f"${mismatch['amount']:.2f}): gateway status {mismatch['gateway_status']}", file=sys.stderr)
+    for entry in report['unresolved']:
+        print(f"UNRESOLVED key={entry['idempotency_key']} (${entry['amount']:.2f}): {entry['status']}", file=sys.stderr)
+    print(f"{day}: {report['matched']}/{report['checked']} charges match, {len(report['mismatched'])} mismatched, "
+          f"{len(report['unresolved'])} unresolved in {time.perf_counter() - started:.2f}s")
+    return 0 if not report['mismatched'] and not report['unresolved'] else 1
+
+
+def check_patrons_command(args):
+    """Check the per-patron loan counters against borrow_records, optionally rebuilding them."""
+    mismatches = database.check_patron_loan_counters()
+    for mismatch in mismatches[:args.show]:
+        print(f"patron {mismatch['patron_id']}: recorded {mismatch['recorded_loans']} loans "
+              f"{mismatch['recorded_book_ids']}, expected {mismatch['expected_loans']} "
+              f"{mismatch['expected_book_ids']}", file=sys.stderr)
+    if len(mismatches) > args.show:
+        print(f"... {len(mismatches) - args.show} more patrons", file=sys.stderr)
+    if args.rebuild:
+        patrons = database.rebuild_patron_loan_counters()
+        print(f"{len(mismatches)} inconsistent patron(s); rebuilt counters for {patrons} patron(s) with open loans")
+        return 0
+    print(f"{len(mismatches)} inconsistent patron(s)")
+    return 0 if not mismatches else 1
+
+
+def archive_command(args):
+    """Move old returned loans from borrow_records into the archive table."""
+    started = time.perf_counter()
+    moved = database.archive_closed_loans(args.older_than_days, args.batch_size)
+    print(f"archived {moved} loan(s) returned more than {args.older_than_days} days ago "
+          f"in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def serve_command(args):
+    """Serve the app with Gunicorn using gunicorn.conf.py."""
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    argv = [sys.executable, '-m', 'gunicorn', '-c', config]
+    if args.bind:
+        argv += ['--bind', args.bind]
+    if args.workers:
+        argv += ['--workers', str(args.workers)]
+    if args.threads:
+        argv += ['--threads', str(args.threads)]
+    # The workers pick up the database chosen with --db
+    os.environ['LIBRARY_DATABASE'] = database.DATABASE
+    os.environ['LIBRARY_DATABASE_BACKEND'] = database.DATABASE_BACKEND
+    os.execv(sys.executable, argv + ['wsgi:app'])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Library Management System management commands")
+    parser.add_argument('--db', default=None, help=f"database file or URL (default: {database.DATABASE})")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=None,
+                        help=f"database backend (default: {database.DATABASE_BACKEND})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import-books', help=import_books_command.__doc__)
+    command.add_argument('path', help='CSV (with header: title,author,isbn,total_copies) or JSONL file')
+    command.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                         help='feed format (default: from file extension)')
+    command.add_argument('--chunk-size', type=int, default=5000, help='rows per transaction')
+    command.add_argument('--show-rejects', type=int, default=20, help='number of rejected rows to print')
+    command.set_defaults(handler=import_books_command)
+
+    command = commands.add_parser('run-workers', help=run_workers_command.__doc__)
+    command.add_argument('--workers', type=int, default=4, help='number of worker threads')
+    command.add_argument('--poll-interval', type=float, default=1.0, help='seconds between queue polls when idle')
+    command.set_defaults(handler=run_workers_command)
+
+    command = commands.add_parser('reconcile', help=reconcile_command.__doc__)
+    command.add_argument('--date', default=None, help='ledger day as YYYY-MM-DD (default: today)')
+    command.add_argument('--workers', type=int, default=16, help='concurrent gateway status checks')
+    command.set_defaults(handler=reconcile_command)
+
+    command = commands.add_parser('check-patrons', help=check_patrons_command.__doc__)
+    command.add_argument('--rebuild', action='store_true', help='recompute every patron\'s counters from borrow_records')
+    command.add_argument('--show', type=int, default=20, help='number of inconsistent patrons to print')
+    command.set_defaults(handler=check_patrons_command)
+
+    command = commands.add_parser('archive', help=archive_command.__doc__)
+    command.add_argument('--older-than-days', type=int, default=database.ARCHIVE_AFTER_DAYS,
+                         help='archive loans returned more than this many days ago')
+    command.add_argument('--batch-size', type=int, default=1000, help='loans moved per transaction')
+    command.set_defaults(handler=archive_command)
+
+    command = commands.add_parser('serve', help=serve_command.__doc__)
+    command.add_argument('--bind', default=None, help='address to listen on (default: LIBRARY_BIND or 0.0.0.0:5000)')
+    command.add_argument('--workers', type=int, default=None, help='worker processes (default: LIBRARY_WORKERS)')
+    command.add_argument('--threads', type=int, default=None, help='threads per worker (default: LIBRARY_THREADS)')
+    command.set_defaults(handler=serve_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db:
+        database.DATABASE = args.db
+    if args.backend:
+        database.DATABASE_BACKEND = args.backend
+    database.init_database()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Metrics module for Library Management System
+Per-route request latency and SQL query counts, exposed in Prometheus text format
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from flask import Response, g, has_request_context, request
+from database import add_query_listener, get_book_cache_stats, get_pool_stats
+
+REQUEST_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style (not thread-safe on its own)."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """Return (upper_bound, observations <= upper_bound) pairs, ending with +Inf."""
+        pairs = []
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            pairs.append((bound, running))
+        pairs.append((float('inf'), self.count))
+        return pairs
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+class RequestMetrics:
+    """Thread-safe store of request and query measurements, keyed by (method, route)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._latency = {}
+        self._queries = {}
+        self._query_seconds = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        queries: int, query_seconds: float):
+        key = (method, route)
+        with self._lock:
+            self._requests[key + (status,)] = self._requests.get(key + (status,), 0) + 1
+            self._latency.setdefault(key, Histogram(REQUEST_LATENCY_BUCKETS)).observe(seconds)
+            self._queries.setdefault(key, Histogram(QUERIES_PER_REQUEST_BUCKETS)).observe(queries)
+            self._query_seconds[key] = self._query_seconds.get(key, 0.0) + query_seconds
+
+    def _render_histograms(self, lines: List[str], name: str, help_text: str, histograms: Dict):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (method, route), histogram in sorted(histograms.items()):
+            for bound, count in histogram.cumulative_counts():
+                lines.append(f'{name}_bucket{_labels(method=method, route=route, le=_format_bound(bound))} {count}')
+            lines.append(f'{name}_sum{_labels(method=method, route=route)} {histogram.sum}')
+            lines.append(f'{name}_count{_labels(method=method, route=route)} {histogram.count}')
+
+    def render(self) -> str:
+        """Render every metric, plus pool and book cache statistics, in Prometheus text format."""
+        lines = []
+        with self._lock:
+            lines.append('# HELP library_http_requests_total HTTP requests handled, by route and status.')
+            lines.append('# TYPE library_http_requests_total counter')
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'library_http_requests_total{_labels(method=method, route=route, status=status)} {count}')
+            self._render_histograms(lines, 'library_http_request_duration_seconds',
+                                    'Time spent handling a request.', self._latency)
+            self._render_histograms(lines, 'library_db_queries_per_request',
+                                    'SQL statements executed while handling a request.', self._queries)
+            lines.append('# HELP library_db_query_duration_seconds_total Time spent executing SQL, by route.')
+            lines.append('# TYPE library_db_query_duration_seconds_total counter')
+            for (method, route), seconds in sorted(self._query_seconds.items()):
+                lines.append(f'library_db_query_duration_seconds_total{_labels(method=method, route=route)} {seconds}')
+
+        pool = get_pool_stats()
+        lines.append('# HELP library_db_pool_connections Pooled database connections, by state.')
+        lines.append('# TYPE library_db_pool_connections gauge')
+        for state in ('idle', 'in_use'):
+            lines.append(f'library_db_pool_connections{_labels(state=state)} {pool[state]}')
+        lines.append('# HELP library_db_pool_wait_seconds_total Time spent waiting for a free connection.')
+        lines.append('# TYPE library_db_pool_wait_seconds_total counter')
+        lines.append(f"library_db_pool_wait_seconds_total {pool['wait_time']}")
+
+        cache = get_book_cache_stats()
+        lines.append('# HELP library_book_cache_lookups_total Book cache lookups, by result.')
+        lines.append('# TYPE library_book_cache_lookups_total counter')
+        lines.append(f"library_book_cache_lookups_total{_labels(result='hit')} {cache['hits']}")
+        lines.append(f"library_book_cache_lookups_total{_labels(result='miss')} {cache['misses']}")
+        return '\n'.join(lines) + '\n'
+
+def _record_query(sql: str, seconds: float):
+    """Query listener: add a statement to the current request's totals."""
+    if not has_request_context():
+        return
+    totals = g.get('_metrics_queries')
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += seconds
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+    g._metrics_queries = [0, 0.0]
+
+def init_app(app) -> Optional[RequestMetrics]:
+    """
+    Instrument the app if METRICS_ENABLED is set in its config.
+
+    Times every request and the SQL it runs, and serves the results at
+    METRICS_PATH (default /metrics).
+    """
+    if not app.config.get('METRICS_ENABLED', False):
+        return None
+    metrics = RequestMetrics()
+    add_query_listener(_record_query)
+
+    def record_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            queries, query_seconds = g.pop('_metrics_queries')
+            route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+            metrics.observe_request(request.method, route, response.status_code,
+                                    time.perf_counter() - started, queries, query_seconds)
+        return response
+
+    def metrics_view():
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+    app.before_request(_start_timer)
+    app.after_request(record_request)
+    app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics_view)
+    app.extensions['metrics'] = metrics
+    return metrics
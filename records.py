@@ -0,0 +1,149 @@
+"""
+Record types for Library Management System
+Compact loan records built straight from query rows, with dates parsed on first use
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, Tuple
+
+def _lazy_datetime(text_slot, value_slot) -> property:
+    """Property reading a date from value_slot, parsing the ISO text in text_slot the first time."""
+    get_value, set_value, get_text = value_slot.__get__, value_slot.__set__, text_slot.__get__
+
+    def get(self):
+        value = get_value(self)
+        if value is None:
+            text = get_text(self)
+            if text is not None:
+                value = datetime.fromisoformat(text)
+                set_value(self, value)
+        return value
+
+    return property(get)
+
+class Record:
+    """
+    Base class for loan records.
+
+    Subclasses list their columns in _fields (constructor order) and their
+    date columns in _date_fields, and give each date two slots: _<name>_text
+    with the ISO text stored in the database, and _<name> for the datetime,
+    which stays None until the date is first read. Records also support
+    read-only dict-style access (record['due_date']), so callers written
+    against per-row dicts keep working.
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    _date_fields: Tuple[str, ...] = ()
+    _computed: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls._date_fields:
+            setattr(cls, name, _lazy_datetime(cls.__dict__[f'_{name}_text'], cls.__dict__[f'_{name}']))
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields + self._computed
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields and key not in self._computed:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fields or key in self._computed
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._fields) + len(self._computed)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
+
+    def to_dict(self) -> Dict:
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            return type(other) is type(self) and all(
+                getattr(self, field) == getattr(other, field) for field in self._fields)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{field}={getattr(self, field)!r}' for field in self._fields)
+        return f'{type(self).__name__}({values})'
+
+class Loan(Record):
+    """One borrow record of a patron, open (return_date None) or returned."""
+
+    __slots__ = ('book_id', 'title', 'author', '_borrow_date_text', '_borrow_date',
+                 '_due_date_text', '_due_date', '_return_date_text', '_return_date')
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date', 'return_date')
+    _date_fields = ('borrow_date', 'due_date', 'return_date')
+
+    def __init__(self, book_id: int, title: str, author: str, borrow_date: str, due_date: str,
+                 return_date: str = None):
+        self.book_id = book_id
+        self.title = title
+        self.author = author
+        self._borrow_date_text = borrow_date
+        self._borrow_date = None
+        self._due_date_text = due_date
+        self._due_date = None
+        self._return_date_text = return_date
+        self._return_date = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._return_date_text is None
+
+    def borrowed_book(self) -> 'BorrowedBook':
+        return BorrowedBook(self.book_id, self.title, self.author, self._borrow_date_text, self._due_date_text)
+
+    def history_entry(self) -> 'HistoryEntry':
+        return HistoryEntry(self.book_id, self.title, self.author, self._borrow_date_text, self._return_date_text)
+
+class BorrowedBook(Record):
+    """A book a patron currently has on loan."""
+
+    __slots__ = ('book_id', 'title', 'author', '_borrow_date_text', '_borrow_date', '_due_date_text', '_due_date')
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date')
+    _date_fields = ('borrow_date', 'due_date')
+    _computed = ('is_overdue',)
+
+    def __init__(self, book_id: int, title: str, author: str, borrow_date: str, due_date: str):
+        self.book_id = book_id
+        self.title = title
+        self.author = author
+        self._borrow_date_text = borrow_date
+        self._borrow_date = None
+        self._due_date_text = due_date
+        self._due_date = None
+
+    @property
+    def is_overdue(self) -> bool:
+        return datetime.now() > self.due_date
+
+class HistoryEntry(Record):
+    """A loan in a patron's borrow history; return_date is None while still on loan."""
+
+    __slots__ = ('book_id', 'title', 'author', '_borrow_date_text', '_borrow_date',
+                 '_return_date_text', '_return_date')
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'return_date')
+    _date_fields = ('borrow_date', 'return_date')
+
+    def __init__(self, book_id: int, title: str, author: str, borrow_date: str, return_date: str = None):
+        self.book_id = book_id
+        self.title = title
+        self.author = author
+        self._borrow_date_text = borrow_date
+        self._borrow_date = None
+        self._return_date_text = return_date
+        self._return_date = None
@@ -0,0 +1,85 @@
+"""
+Response cache module for Library Management System
+Conditional GETs and a rendered-response cache for pages built from the catalog
+"""
+
+import functools
+import hashlib
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional, Tuple
+from flask import Response, current_app, make_response, request, session
+from cache import LRUCache
+from database import get_catalog_version, uncached_book_reads
+
+RESPONSE_CACHE_SIZE = 256
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    content_type: str
+    etag: str
+    last_modified: datetime
+
+def _render(view: Callable, args, kwargs, last_modified: datetime) -> Tuple[Response, Optional[CachedResponse]]:
+    """Run the view; return its response and, if it can be reused, the entry to cache."""
+    # The entry lives as long as the catalog version, well past the book
+    # cache's TTL, and the version may have been bumped by another process
+    # that could not invalidate this one's book cache
+    with uncached_book_reads():
+        response = make_response(view(*args, **kwargs))
+    if response.status_code != 200 or response.is_streamed:
+        return response, None
+    body = response.get_data()
+    # Hash of the bytes: a strong validator that agrees across server processes
+    return response, CachedResponse(body, response.content_type, hashlib.sha256(body).hexdigest()[:32], last_modified)
+
+def cached_by_catalog_version(view: Callable) -> Callable:
+    """
+    Serve a GET view from the response cache, keyed by (path, query string, catalog version).
+
+    Responses carry a strong ETag and Last-Modified and are answered with
+    304 Not Modified when the client's If-None-Match names the current ETag. Any change to books
+    bumps the catalog version, so stale pages are never served; old entries
+    simply age out of the LRU. Requests with flashed messages waiting to be
+    shown bypass the cache, since their page differs from everyone else's.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = current_app.extensions.get('response_cache')
+        if cache is None or request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        version, last_modified = get_catalog_version()
+        key = (request.path, request.query_string, version)
+        entry = cache.get(key)
+        if entry is None:
+            response, entry = _render(view, args, kwargs, last_modified)
+            if entry is None:
+                return response
+            cache.set(key, entry)
+
+        response = Response(entry.body, content_type=entry.content_type)
+        response.set_etag(entry.etag)
+        # Clients may keep the page but must check it is current before reuse
+        response.cache_control.no_cache = True
+        response = response.make_conditional(request)
+        # Set after the conditional check so only the ETag decides a 304:
+        # Last-Modified has one-second resolution, and two catalog changes
+        # in the same second would make If-Modified-Since match a stale copy
+        response.last_modified = entry.last_modified
+        return response
+
+    return wrapper
+
+def init_app(app) -> Optional[LRUCache]:
+    """
+    Create the rendered-response cache for views decorated with cached_by_catalog_version.
+
+    RESPONSE_CACHE_SIZE in the app config sets how many responses are kept;
+    0 disables caching and validators entirely.
+    """
+    size = app.config.get('RESPONSE_CACHE_SIZE', RESPONSE_CACHE_SIZE)
+    if not size:
+        return None
+    cache = LRUCache(size)
+    app.extensions['response_cache'] = cache
+    return cache
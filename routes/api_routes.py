@@ -2,11 +2,21 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+import json
+from datetime import date, datetime
+from flask import Blueprint, Response, jsonify, request, url_for
+from database import get_books_page, iter_books, get_patron_history_page, get_patron_history_summary
+from services.library_service import calculate_late_fee_for_book, search_books_in_catalog, pay_all_late_fees
+from services.job_queue import submit_job, get_job_status
+from response_cache import cached_by_catalog_version
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+BOOKS_PAGE_SIZE = 100
+MAX_BOOKS_PAGE_SIZE = 1000
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
     """
@@ -16,7 +26,55 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/late_fees/<patron_id>/pay', methods=['POST'])
+def pay_all_late_fees_api(patron_id):
+    """
+    Pay all of a patron's outstanding late fees with a single charge.
+    Send an Idempotency-Key header to make retries safe.
+    """
+    idempotency_key = request.headers.get('Idempotency-Key') or None
+    success, message, transaction_id = pay_all_late_fees(patron_id, idempotency_key=idempotency_key)
+    
+    return jsonify({
+        'success': success,
+        'message': message,
+        'transaction_id': transaction_id
+    }), 200 if success else 400
+
+@api_bp.route('/payments/jobs', methods=['POST'])
+def submit_payment_job():
+    """
+    Queue a payment or refund to run in the background.
+    
+    Body: {"type": "pay_late_fees" | "pay_all_late_fees" | "refund_late_fee_payment", ...arguments}
+    Returns 202 with the job id; poll /api/jobs/<job_id> for the outcome.
+    """
+    payload = request.get_json(silent=True) or {}
+    kind = payload.pop('type', None)
+    
+    try:
+        job_id = submit_job(kind, payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('api.job_status', job_id=job_id)
+    }), 202
+
+@api_bp.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    """
+    Get the status and result of a background job.
+    """
+    status = get_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
 @api_bp.route('/search')
+@cached_by_catalog_version
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -37,3 +95,93 @@ def search_books_api():
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/books')
+def list_books_api():
+    """
+    List books ordered by title.
+    
+    Returns one page of results with a `next_cursor` to pass back as `cursor`.
+    With `format=ndjson` the whole catalog from `cursor` onwards is streamed as
+    one JSON object per line, fetched in batches so it never sits in memory.
+    """
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', BOOKS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_BOOKS_PAGE_SIZE))
+    
+    try:
+        books, next_cursor = get_books_page(limit, cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            # Send the page already fetched, then pull further batches lazily
+            # as the client reads
+            for book in books:
+                yield json.dumps(book) + '\n'
+            if next_cursor is not None:
+                for book in iter_books(next_cursor, batch_size=limit):
+                    yield json.dumps(book) + '\n'
+        
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    return jsonify({
+        'books': books,
+        'count': len(books),
+        'next_cursor': next_cursor
+    })
+
+def _loan_json(loan) -> dict:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in loan.to_dict().items()}
+
+def _history_range():
+    """Parse the since/until (YYYY-MM-DD) query arguments, raising ValueError if malformed."""
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    return (date.fromisoformat(since) if since else None,
+            date.fromisoformat(until) if until else None)
+
+@api_bp.route('/patrons/<patron_id>/history')
+def patron_history_api(patron_id):
+    """
+    List a patron's loans, newest first.
+    
+    Returns one page with a `next_cursor` to pass back as `cursor`; `since`
+    and `until` (YYYY-MM-DD, until exclusive) restrict it to loans borrowed
+    in that range.
+    """
+    if not patron_id.isdigit() or len(patron_id) != 6:
+        return jsonify({'error': 'Invalid patron ID'}), 400
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    
+    try:
+        since, until = _history_range()
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    try:
+        loans, next_cursor = get_patron_history_page(patron_id, limit, cursor, since, until)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'loans': [_loan_json(loan) for loan in loans],
+        'count': len(loans),
+        'next_cursor': next_cursor
+    })
+
+@api_bp.route('/patrons/<patron_id>/history/summary')
+def patron_history_summary_api(patron_id):
+    """
+    Count a patron's loans in total and per month, optionally within since/until.
+    """
+    if not patron_id.isdigit() or len(patron_id) != 6:
+        return jsonify({'error': 'Invalid patron ID'}), 400
+    try:
+        since, until = _history_range()
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    return jsonify(get_patron_history_summary(patron_id, since, until))
@@ -3,24 +3,40 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+from database import get_books_page
 from services.library_service import add_book_to_catalog
+from response_cache import cached_by_catalog_version
 
 catalog_bp = Blueprint('catalog', __name__)
 
+CATALOG_PAGE_SIZE = 50
+MAX_CATALOG_PAGE_SIZE = 200
+
 @catalog_bp.route('/')
 def index():
     """Home page redirects to catalog."""
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@cached_by_catalog_version
 def catalog():
     """
-    Display all books in the catalog.
+    Display the book catalog, one page at a time.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', CATALOG_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_CATALOG_PAGE_SIZE))
+    
+    try:
+        books, next_cursor = get_books_page(limit, cursor)
+    except ValueError:
+        flash('Invalid page link; showing the first page.', 'error')
+        cursor = None
+        books, next_cursor = get_books_page(limit)
+    
+    return render_template('catalog.html', books=books, next_cursor=next_cursor,
+                           is_first_page=cursor is None, limit=limit)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
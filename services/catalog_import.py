@@ -0,0 +1,144 @@
+"""
+Catalog Import Module - Bulk loading of vendor book feeds
+Streams CSV or JSONL feeds into the catalog in large batched transactions
+"""
+
+import csv
+import json
+import os
+import time
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
+from database import get_existing_isbns, insert_books, transaction
+from services.library_service import validate_book_fields
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_FIELDS = ('title', 'author', 'isbn', 'total_copies')
+
+def read_book_rows(source: TextIO, file_format: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Read book rows from a CSV (with a header row) or JSONL feed, one at a time.
+
+    Args:
+        source: Open text file
+        file_format: 'csv' or 'jsonl'
+
+    Yields:
+        tuple: (line_number, row: dict or None, error: str or None)
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(source)
+        missing = [field for field in IMPORT_FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row, None
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(source, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None, "Invalid JSON."
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "Each line must be a JSON object."
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+def _parse_row(row: Dict) -> Tuple[Optional[Tuple[str, str, str, int]], Optional[str]]:
+    """Normalize a raw row and apply the same validation rules as add_book_to_catalog."""
+    title = str(row.get('title') or '')
+    author = str(row.get('author') or '')
+    isbn = str(row.get('isbn') or '').strip()
+    total_copies = row.get('total_copies')
+
+    # CSV values arrive as strings; JSON may already hold an int
+    if isinstance(total_copies, str):
+        try:
+            total_copies = int(total_copies.strip())
+        except ValueError:
+            return None, "Total copies must be a positive integer."
+    if isinstance(total_copies, bool):
+        total_copies = None
+
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return None, error
+    return (title.strip(), author.strip(), isbn, total_copies), None
+
+def _import_chunk(rows: List[Tuple[int, Optional[Dict], Optional[str]]], seen_isbns: set, report: Dict):
+    """Validate, deduplicate and insert one chunk of rows in a single transaction."""
+    candidates = []
+    for line_number, row, error in rows:
+        report['rows'] += 1
+        book = None
+        if error is None:
+            book, error = _parse_row(row)
+        if error is None and book[2] in seen_isbns:
+            error = "Duplicate ISBN in import file."
+        if error:
+            report['rejected'].append({'line': line_number, 'isbn': (row or {}).get('isbn'), 'reason': error})
+            continue
+        seen_isbns.add(book[2])
+        candidates.append((line_number, book))
+
+    if not candidates:
+        return
+
+    with transaction():
+        existing = get_existing_isbns(book[2] for _, book in candidates)
+        books = []
+        for line_number, book in candidates:
+            if book[2] in existing:
+                report['rejected'].append({'line': line_number, 'isbn': book[2], 'reason': "A book with this ISBN already exists."})
+            else:
+                title, author, isbn, total_copies = book
+                books.append((title, author, isbn, total_copies, total_copies))
+        report['imported'] += insert_books(books)
+
+def import_books(source: Union[str, TextIO], file_format: Optional[str] = None,
+                 chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Import books from a CSV or JSONL feed.
+
+    Rows are read lazily and processed chunk_size at a time: each chunk is
+    validated with the add_book_to_catalog rules, checked for duplicate ISBNs
+    (within the feed and against the catalog, one query per chunk) and
+    inserted with executemany in one transaction.
+
+    Args:
+        source: Path to the feed, or an open text file
+        file_format: 'csv' or 'jsonl' (inferred from the file extension if omitted)
+        chunk_size: Rows per transaction
+
+    Returns:
+        Dict: {'rows', 'imported', 'rejected': [{'line', 'isbn', 'reason'}], 'seconds', 'rows_per_second'}
+    """
+    if file_format is None:
+        if not isinstance(source, str):
+            raise ValueError("file_format is required when importing from an open file.")
+        file_format = 'jsonl' if os.path.splitext(source)[1].lower() in ('.jsonl', '.ndjson') else 'csv'
+
+    report = {'rows': 0, 'imported': 0, 'rejected': []}
+    started = time.perf_counter()
+
+    stream = open(source, newline='', encoding='utf-8') if isinstance(source, str) else source
+    try:
+        rows = read_book_rows(stream, file_format)
+        seen_isbns = set()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            _import_chunk(chunk, seen_isbns, report)
+    finally:
+        if isinstance(source, str):
+            stream.close()
+
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] > 0 else 0.0
+    return report
@@ -0,0 +1,260 @@
+"""
+Job Queue Module - Background execution of payment gateway calls
+Payments and refunds are queued in the database and run by worker threads,
+so HTTP workers return a job id immediately instead of waiting on the gateway
+"""
+
+import logging
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from database import claim_next_job, enqueue_job, finish_job, get_job, get_payment, get_pool, requeue_stale_jobs
+from services.library_service import pay_all_late_fees, pay_late_fees, refund_late_fee_payment
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_DELAY = 5.0     # seconds before the first retry, doubled for each further retry
+JOB_RETRY_MAX_DELAY = 300.0
+JOB_STALE_AFTER = timedelta(minutes=10)
+
+class RetryableJobError(Exception):
+    """Raised by a job handler when the job failed transiently and should be retried."""
+
+def _idempotency_key(job: Dict) -> str:
+    # The same key on every attempt, so a retry never charges or refunds twice
+    return f"job-{job['id']}"
+
+def _check_outcome(job: Dict, success: bool, message: str):
+    """
+    Retry when the gateway outcome is unknown: the ledger entry was left in
+    'error', or is still 'pending' from an earlier attempt whose worker died
+    or stalled (the retry replays its result once it is recorded).
+    """
+    payment = get_payment(_idempotency_key(job))
+    if not success and payment is not None and payment['status'] in ('error', 'pending'):
+        raise RetryableJobError(message)
+
+def _run_pay_late_fees(job: Dict) -> Dict:
+    payload = job['payload']
+    success, message, transaction_id = pay_late_fees(payload['patron_id'], payload['book_id'],
+                                                     idempotency_key=_idempotency_key(job))
+    _check_outcome(job, success, message)
+    return {'success': success, 'message': message, 'transaction_id': transaction_id}
+
+def _run_pay_all_late_fees(job: Dict) -> Dict:
+    payload = job['payload']
+    success, message, transaction_id = pay_all_late_fees(payload['patron_id'], idempotency_key=_idempotency_key(job))
+    _check_outcome(job, success, message)
+    return {'success': success, 'message': message, 'transaction_id': transaction_id}
+
+def _run_refund_late_fee_payment(job: Dict) -> Dict:
+    payload = job['payload']
+    success, message = refund_late_fee_payment(payload['transaction_id'], payload['amount'],
+                                               book_id=payload.get('book_id'),
+                                               idempotency_key=_idempotency_key(job))
+    _check_outcome(job, success, message)
+    return {'success': success, 'message': message}
+
+# Payload converters: return the value as the handler expects it, or raise ValueError
+def _text(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError("must be a string")
+    return value
+
+def _integer(value: Any) -> int:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise ValueError("must be an integer")
+
+def _number(value: Any) -> float:
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        try:
+            number = float(value)
+        except ValueError:
+            pass
+        else:
+            if math.isfinite(number):
+                return number
+    raise ValueError("must be a number")
+
+# Job kind -> (handler, {payload field: (converter, required)})
+JOB_HANDLERS: Dict[str, tuple] = {
+    'pay_late_fees': (_run_pay_late_fees, {'patron_id': (_text, True), 'book_id': (_integer, True)}),
+    'pay_all_late_fees': (_run_pay_all_late_fees, {'patron_id': (_text, True)}),
+    'refund_late_fee_payment': (_run_refund_late_fee_payment, {
+        'transaction_id': (_text, True), 'amount': (_number, True), 'book_id': (_integer, False)}),
+}
+
+# Errors worth another attempt: the handler's own signal, network/socket
+# failures (requests' exceptions derive from OSError), and the database
+# backend's TransientError (lock contention, lost connections). Anything else
+# is a bug or bad data that would fail the same way every time.
+RETRYABLE_ERRORS = (RetryableJobError, OSError)
+
+def _retryable_errors() -> tuple:
+    return RETRYABLE_ERRORS + (get_pool().backend.TransientError,)
+
+def submit_job(kind: str, payload: Dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """
+    Queue a payment job.
+
+    Args:
+        kind: One of JOB_HANDLERS
+        payload: Arguments for the job's handler
+
+    Returns:
+        int: Job id
+
+    Raises:
+        ValueError: If the kind is unknown, a required payload field is missing
+            or a field has the wrong type
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {kind}")
+    fields: Dict[str, tuple] = JOB_HANDLERS[kind][1]
+    missing = [field for field, (_, required) in fields.items() if required and payload.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing job fields: {', '.join(missing)}")
+
+    # Store the converted values, so handlers always see the types they expect
+    arguments = {}
+    for field, (convert, _) in fields.items():
+        if payload.get(field) in (None, ''):
+            continue
+        try:
+            arguments[field] = convert(payload[field])
+        except ValueError as e:
+            raise ValueError(f"Job field {field} {e}") from None
+    return enqueue_job(kind, arguments, max_attempts)
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    return min(JOB_RETRY_BASE_DELAY * (2 ** (attempts - 1)), JOB_RETRY_MAX_DELAY)
+
+def run_job(job: Dict) -> str:
+    """
+    Run a claimed job and record the outcome.
+
+    Successful handlers mark the job 'succeeded' (or 'failed' if the operation
+    itself was refused, e.g. a declined card). Transient errors (RETRYABLE_ERRORS
+    and the database backend's TransientError)
+    put the job back on the queue after an exponential backoff until
+    max_attempts is reached, after which it is dead-lettered with status
+    'dead'. Any other error dead-letters the job at once.
+
+    Returns:
+        str: The job's new status
+    """
+    handler, _ = JOB_HANDLERS.get(job['kind'], (None, None))
+    if handler is None:
+        finish_job(job['id'], 'dead', error=f"Unknown job type: {job['kind']}")
+        return 'dead'
+
+    try:
+        result = handler(job)
+    except _retryable_errors() as e:
+        error = f"{type(e).__name__}: {e}"
+        if job['attempts'] >= job['max_attempts']:
+            logger.error("Job %s dead-lettered after %s attempts: %s", job['id'], job['attempts'], error)
+            finish_job(job['id'], 'dead', error=error)
+            return 'dead'
+        run_at = datetime.now() + timedelta(seconds=retry_delay(job['attempts']))
+        finish_job(job['id'], 'queued', error=error, run_at=run_at)
+        return 'queued'
+    except Exception as e:
+        logger.exception("Job %s dead-lettered after a non-retryable error", job['id'])
+        finish_job(job['id'], 'dead', error=f"{type(e).__name__}: {e}")
+        return 'dead'
+
+    status = 'succeeded' if result.get('success') else 'failed'
+    finish_job(job['id'], status, result=result)
+    return status
+
+def run_pending_jobs(limit: Optional[int] = None) -> int:
+    """Run due jobs in the calling thread until the queue is empty (or limit is reached)."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+def get_job_status(job_id: int) -> Optional[Dict]:
+    """Get the public view of a job: status, attempts, result and last error."""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    return {
+        'job_id': job['id'],
+        'type': job['kind'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'max_attempts': job['max_attempts'],
+        'result': job['result'],
+        'last_error': job['last_error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+    }
+
+class JobWorkerPool:
+    """
+    Pool of daemon threads that poll the job queue and run due jobs.
+
+    Several pools (e.g. one per server process) can share a database: each
+    job is claimed atomically by exactly one worker.
+    """
+
+    def __init__(self, workers: int = 2, poll_interval: float = 1.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """Requeue jobs abandoned by dead workers and start the worker threads."""
+        requeue_stale_jobs(datetime.now() - JOB_STALE_AFTER)
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = claim_next_job()
+            except Exception:
+                logger.exception("Could not claim a job")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            run_job(job)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Ask the workers to exit after their current job and wait for them."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+def init_app(app) -> Optional[JobWorkerPool]:
+    """
+    Start a worker pool in the app's process when JOB_WORKERS is set.
+
+    Off by default (0), so building an app starts no threads and writes
+    nothing; run workers with `manage.py run-workers`, or set JOB_WORKERS
+    (LIBRARY_JOB_WORKERS) to the number of threads per server process.
+    """
+    workers = app.config.get('JOB_WORKERS', 0)
+    if workers <= 0:
+        return None
+    pool = JobWorkerPool(workers, app.config.get('JOB_POLL_INTERVAL', 1.0))
+    pool.start()
+    app.extensions['job_workers'] = pool
+    return pool
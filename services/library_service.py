@@ -3,16 +3,23 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
-from datetime import datetime, timedelta
+import uuid
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from services.payment_service import PaymentGateway
+from services.payment_service import PaymentGateway, get_payment_gateway, verify_payment_statuses
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books,
-    get_patron_borrow_history
+    get_book_by_id, get_book_by_isbn, get_patron_loan_summary,
+    insert_book, insert_borrow_record,
+    update_borrow_record_return_date, get_patron_borrowed_books,
+    checkout_book_copy, checkin_book_copy, transaction, acquire_lock,
+    search_books, get_patron_activity, get_overdue_loan_fees,
+    insert_payment_allocations, get_payment_allocation, add_refunded_amount,
+    get_payment, record_pending_payment, complete_payment, get_payments
 )
 
+# Loans shown in a patron status report's borrow history unless asked for more
+REPORT_HISTORY_LIMIT = 20
+
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
@@ -28,23 +35,9 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         tuple: (success: bool, message: str)
     """
     # Input validation
-    if not title or not title.strip():
-        return False, "Title is required."
-    
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    
-    if not author or not author.strip():
-        return False, "Author is required."
-    
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
-    
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -58,6 +51,33 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     else:
         return False, "Database error occurred while adding the book."
 
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """
+    Validate the fields of a new book (R1 rules, excluding the duplicate ISBN check).
+    
+    Returns:
+        Optional[str]: Error message, or None if the fields are valid
+    """
+    if not title or not title.strip():
+        return "Title is required."
+    
+    if len(title.strip()) > 200:
+        return "Title must be less than 200 characters."
+    
+    if not author or not author.strip():
+        return "Author is required."
+    
+    if len(author.strip()) > 100:
+        return "Author must be less than 100 characters."
+    
+    if len(isbn) != 13:
+        return "ISBN must be exactly 13 digits."
+    
+    if not isinstance(total_copies, int) or total_copies <= 0:
+        return "Total copies must be a positive integer."
+    
+    return None
+
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
@@ -74,37 +94,43 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-
-    #Check if patron has the book borrowed
-    borrowed_books = get_patron_borrowed_books(patron_id) #I (the student) added this to prevent a bug that occurs when borrowing multiple copies of same book
-    if any(d['book_id'] == book_id for d in borrowed_books): 
-        return False, "Cannot borrow multiple copies of the same book."
-    
     # Create borrow record
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
-        return False, "Database error occurred while creating borrow record."
-    
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    # All checks and writes run in one transaction so concurrent borrowers
+    # cannot both take the last copy, and one patron's concurrent borrows
+    # cannot both pass the loan limit
+    with transaction() as conn:
+        acquire_lock(f"patron:{patron_id}")
+        
+        # Check if book exists and is available
+        book = get_book_by_id(book_id)
+        if not book:
+            return False, "Book not found."
+        
+        if book['available_copies'] <= 0:
+            return False, "This book is currently not available."
+        
+        # Check patron's current borrowed books count (one read of the patron's counters)
+        loans = get_patron_loan_summary(patron_id)
+        current_borrowed = loans['active_loans']
+        
+        if current_borrowed > 5:
+            return False, "You have reached the maximum borrowing limit of 5 books."
+
+        #Check if patron has the book borrowed
+        if book_id in loans['book_ids']: #I (the student) added this to prevent a bug that occurs when borrowing multiple copies of same book
+            return False, "Cannot borrow multiple copies of the same book."
+        
+        # Take a copy only if one is still available, then record the loan
+        if not checkout_book_copy(book_id):
+            return False, "This book is currently not available."
+        
+        borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+        if not borrow_success:
+            conn.rollback()
+            return False, "Database error occurred while creating borrow record."
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -125,30 +151,34 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
-    # Check if book exists
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-
-    #Check if book can be returned
-    if book['available_copies'] >= book['total_copies']:
-        return False, "Total copies already returned."
-
-    #Check if patron has the book borrowed
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    if not any(d['book_id'] == book_id for d in borrowed_books):
-        return False, "Book not borrowed by patron ID."
-
-    #Update return record
-    return_date = datetime.now()
-    return_success = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not return_success:
-        return False, "Database error occurred while updating return record."
-    
-    #update book availability
-    availability_success = update_book_availability(book_id, 1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    with transaction() as conn:
+        acquire_lock(f"patron:{patron_id}")
+        
+        # Check if book exists
+        book = get_book_by_id(book_id)
+        if not book:
+            return False, "Book not found."
+
+        #Check if book can be returned
+        if book['available_copies'] >= book['total_copies']:
+            return False, "Total copies already returned."
+
+        #Check if patron has the book borrowed
+        if book_id not in get_patron_loan_summary(patron_id)['book_ids']:
+            return False, "Book not borrowed by patron ID."
+
+        #Update return record
+        return_date = datetime.now()
+        return_success = update_borrow_record_return_date(patron_id, book_id, return_date)
+        if not return_success:
+            conn.rollback()
+            return False, "Database error occurred while updating return record."
+        
+        #update book availability
+        availability_success = checkin_book_copy(book_id)
+        if not availability_success:
+            conn.rollback()
+            return False, "Database error occurred while updating book availability."
 
     return True, "Book successfully returned."
 
@@ -191,26 +221,62 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': 'implemented'
         }
 
-    due_date = book['due_date'].date()
-    today = datetime.now().date()
-    overdue_days = (today - due_date).days
+    fee, overdue_days = _late_fee_for_due_date(book['due_date'], datetime.now().date())
+
+    return { #return the calculated values
+        'fee_amount': fee,
+        'days_overdue': overdue_days,
+        'status': 'implemented'
+    }
+
+def _late_fee_for_due_date(due_date: datetime, today: date) -> Tuple[float, int]:
+    """
+    Compute the late fee for a loan from its due date.
+
+    Args:
+        due_date: When the book was due
+        today: Date to compute the fee as of
+
+    Returns:
+        tuple: (fee_amount: float, days_overdue: int)
+    """
+    overdue_days = (today - due_date.date()).days
 
     #If book is returned on time
     if overdue_days <= 0:
-        fee = 0.0
-        overdue_days = 0
+        return 0.0, 0
 
     #if book is overdue
-    else:
-        #Returns 15 dollars if calculated fee is greater than 15
-        fee = min((min(overdue_days, 7) * 0.50) + (max(overdue_days - 7, 0) * 1.00), 15.00)
+    #Returns 15 dollars if calculated fee is greater than 15
+    fee = min((min(overdue_days, 7) * 0.50) + (max(overdue_days - 7, 0) * 1.00), 15.00)
+    return round(fee, 2), overdue_days
 
-    return { #return the calculated values
-        'fee_amount': round(fee, 2),
-        'days_overdue': overdue_days,
-        'status': 'implemented'
-    }
 
+def calculate_all_late_fees(as_of: Optional[date] = None) -> Dict[str, Dict]:
+    """
+    Calculate late fees for every overdue loan in the system.
+    Batch counterpart of calculate_late_fee_for_book for nightly fee runs.
+
+    Args:
+        as_of: Date to compute fees as of (defaults to today)
+
+    Returns:
+        Dict: patron_id -> {'total_fee': float, 'books': [{'book_id', 'days_overdue', 'fee_amount'}]}
+    """
+    if as_of is None:
+        as_of = datetime.now().date()
+
+    fees = {}
+    for loan in get_overdue_loan_fees(as_of):
+        patron = fees.setdefault(loan['patron_id'], {'total_fee': 0.00, 'books': []})
+        patron['books'].append({
+            'book_id': loan['book_id'],
+            'days_overdue': loan['days_overdue'],
+            'fee_amount': loan['fee_amount']
+        })
+        patron['total_fee'] = round(patron['total_fee'] + loan['fee_amount'], 2)
+
+    return fees
 
 
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
@@ -224,77 +290,137 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     Returns:
         List[Dict]: Books matching search term based on search type
     """
-    books = get_all_books()
-    results = []
-
-    if search_type.lower() == "title":
-        for book in books:
-            if search_term.lower() in book['title'].lower():
-                results.append(book)
-            
-    elif search_type.lower() == "author":
-        for book in books:
-            if search_term.lower() in book['author'].lower():
-                results.append(book)
-
-    elif search_type.lower() == "isbn":
-        for book in books:
-            if search_term == book['isbn']:
-                results.append(book)
-    else:
-        return []
+    search_type = search_type.lower()
+
+    # ISBN is an exact match served by the unique index on books.isbn
+    if search_type == "isbn":
+        book = get_book_by_isbn(search_term)
+        return [book] if book else []
+
+    # Title and author use the full-text index with prefix matching
+    if search_type in ("title", "author"):
+        return search_books(search_term, search_type)
 
-    return results
+    return []
     
 
-def get_patron_status_report(patron_id: str) -> Dict:
+def get_patron_status_report(patron_id: str, history_limit: Optional[int] = REPORT_HISTORY_LIMIT) -> Dict:
     """
     Get status report for a patron.
     
     Args:
         patron_id: 6-digit library card ID
+        history_limit: Most recent loans to include in borrow_history (None for all)
 
     Returns:
-        Dict: Patron status
+        Dict: Patron status. borrow_history holds the most recent loans, newest
+        first; pass history_cursor to get_patron_history_page for older ones.
+        history_summary counts the whole history per month.
     """
 
     # Validate patron ID
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
 
-    #Get borrowed books
-    borrowed_books = get_patron_borrowed_books(patron_id)
+    #Open loans, the recent history window and the monthly summary over one connection
+    activity = get_patron_activity(patron_id, history_limit)
+    today = datetime.now().date()
 
-    #Get late fees
+    borrowed_books = activity['borrowed_books']
     late_fee = 0.00
     for book in borrowed_books:
-        results = calculate_late_fee_for_book(patron_id, book['book_id'])
-        late_fee += results['fee_amount']
-
-    #Get borrow count
-    borrow_count = get_patron_borrow_count(patron_id)
-
-    #get borrow history
-    borrow_history = get_patron_borrow_history(patron_id)
+        late_fee += _late_fee_for_due_date(book.due_date, today)[0]
 
     return {
         'borrowed_books': borrowed_books,
         'late_fees': late_fee,
-        'borrow_count': borrow_count,
-        'borrow_history': borrow_history
+        'borrow_count': len(borrowed_books),
+        'borrow_history': activity['history'],
+        'history_cursor': activity['next_cursor'],
+        'history_summary': activity['summary']
     }
 
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+def _ledger_charge_result(payment: Dict, patron_id: str, book_id: Optional[int]) -> Optional[Tuple[bool, str, Optional[str]]]:
+    """
+    Build the response for a charge whose idempotency key is already in the ledger.
+
+    Returns None when the earlier attempt for this same charge ended in
+    'error', so it may be retried under the key.
+    """
+    if payment['kind'] != 'charge' or payment['patron_id'] != patron_id or payment['book_id'] != book_id:
+        return False, "Idempotency key was already used for a different request.", None
+    if payment['status'] == 'error':
+        return None
+    if payment['status'] == 'completed':
+        return True, f"Payment successful! {payment['message']}", payment['transaction_id']
+    if payment['status'] == 'declined':
+        return False, f"Payment failed: {payment['message']}", None
+    return False, "Payment is already being processed.", None
+
+def _ledger_refund_result(payment: Dict, transaction_id: str, book_id: Optional[int]) -> Optional[Tuple[bool, str]]:
+    """
+    Build the response for a refund whose idempotency key is already in the ledger.
+
+    Returns None when the earlier attempt for this same refund ended in
+    'error', so it may be retried under the key.
+    """
+    if payment['kind'] != 'refund' or payment['transaction_id'] != transaction_id or payment['book_id'] != book_id:
+        return False, "Idempotency key was already used for a different request."
+    if payment['status'] == 'error':
+        return None
+    if payment['status'] == 'completed':
+        return True, payment['message']
+    if payment['status'] == 'declined':
+        return False, f"Refund failed: {payment['message']}"
+    return False, "Refund is already being processed."
+
+def _charge_patron(idempotency_key: str, patron_id: str, amount: float, description: str,
+                   allocations: List[Tuple[int, float]], payment_gateway) -> Tuple[bool, str, Optional[str]]:
+    """Send a charge already recorded as pending to the gateway and record the outcome."""
+    # Use provided gateway or the shared default one
+    if payment_gateway is None:
+        payment_gateway = get_payment_gateway()
+    
+    # Process payment through external gateway
+    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=amount,
+            description=description,
+            idempotency_key=idempotency_key
+        )
+    except Exception as e:
+        # Handle payment gateway errors; the outcome is unknown so the key may be retried
+        complete_payment(idempotency_key, 'error', str(e))
+        return False, f"Payment processing error: {str(e)}", None
+    
+    if success:
+        with transaction():
+            complete_payment(idempotency_key, 'completed', message, transaction_id)
+            insert_payment_allocations(transaction_id, patron_id, allocations)
+        return True, f"Payment successful! {message}", transaction_id
+    else:
+        complete_payment(idempotency_key, 'declined', message)
+        return False, f"Payment failed: {message}", None
+
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None,
+                  idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
     
     NEW FEATURE FOR ASSIGNMENT 3: Demonstrates need for mocking/stubbing
     This function depends on an external payment service that should be mocked in tests.
     
+    Every charge is recorded in the payments ledger. Repeating a request with
+    the same idempotency_key returns the recorded result instead of charging
+    the patron again.
+    
     Args:
         patron_id: 6-digit library card ID
         book_id: ID of the book with late fees
         payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Client-chosen key identifying this payment request (optional)
         
     Returns:
         tuple: (success: bool, message: str, transaction_id: Optional[str])
@@ -309,47 +435,96 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits.", None
     
-    # Calculate late fee first
-    fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    if idempotency_key is None:
+        idempotency_key = str(uuid.uuid4())
     
-    # Check if there's a fee to pay
-    if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
+    # Check the ledger, compute the fee and reserve the key in one transaction
+    with transaction():
+        acquire_lock(f"payment:{idempotency_key}")
+        existing = get_payment(idempotency_key)
+        replay = existing and _ledger_charge_result(existing, patron_id, book_id)
+        if replay:
+            return replay
+        
+        # Calculate late fee first
+        fee_info = calculate_late_fee_for_book(patron_id, book_id)
+        
+        # Check if there's a fee to pay
+        if not fee_info or 'fee_amount' not in fee_info:
+            return False, "Unable to calculate late fees.", None
+        
+        fee_amount = fee_info.get('fee_amount', 0.0)
+        
+        if fee_amount <= 0:
+            return False, "No late fees to pay for this book.", None
+        
+        # Get book details for payment description
+        book = get_book_by_id(book_id)
+        if not book:
+            return False, "Book not found.", None
+        
+        if not record_pending_payment(idempotency_key, 'charge', patron_id, book_id, fee_amount):
+            return False, "Payment is already being processed.", None
     
-    fee_amount = fee_info.get('fee_amount', 0.0)
+    return _charge_patron(idempotency_key, patron_id, fee_amount, f"Late fees for '{book['title']}'",
+                          [(book_id, fee_amount)], payment_gateway)
+
+
+def pay_all_late_fees(patron_id: str, payment_gateway: PaymentGateway = None,
+                      idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Pay the late fees on all of a patron's overdue books with one gateway charge.
     
-    if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
+    Fees are computed in one pass over the patron's open loans. The charge is
+    recorded per book (see payment_allocations), so individual books can still
+    be refunded with refund_late_fee_payment(..., book_id=...). Idempotent
+    like pay_late_fees.
     
-    # Get book details for payment description
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found.", None
+    Args:
+        patron_id: 6-digit library card ID
+        payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Client-chosen key identifying this payment request (optional)
+        
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None
     
-    # Use provided gateway or create new one
-    if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+    if idempotency_key is None:
+        idempotency_key = str(uuid.uuid4())
     
-    # Process payment through external gateway
-    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
-    try:
-        success, transaction_id, message = payment_gateway.process_payment(
-            patron_id=patron_id,
-            amount=fee_amount,
-            description=f"Late fees for '{book['title']}'"
-        )
+    with transaction():
+        acquire_lock(f"payment:{idempotency_key}")
+        existing = get_payment(idempotency_key)
+        replay = existing and _ledger_charge_result(existing, patron_id, None)
+        if replay:
+            return replay
         
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
-            return False, f"Payment failed: {message}", None
-            
-    except Exception as e:
-        # Handle payment gateway errors
-        return False, f"Payment processing error: {str(e)}", None
+        # Compute every outstanding fee from the open loans, read in one query
+        today = datetime.now().date()
+        allocations = []
+        titles = []
+        for loan in get_patron_borrowed_books(patron_id):
+            fee_amount, _ = _late_fee_for_due_date(loan.due_date, today)
+            if fee_amount > 0:
+                allocations.append((loan.book_id, fee_amount))
+                titles.append(loan.title)
+        
+        if not allocations:
+            return False, "No late fees to pay.", None
+        
+        total = round(sum(amount for _, amount in allocations), 2)
+        if not record_pending_payment(idempotency_key, 'charge', patron_id, None, total):
+            return False, "Payment is already being processed.", None
+    
+    description = f"Late fees for {len(titles)} book(s): " + ", ".join(f"'{title}'" for title in titles)
+    return _charge_patron(idempotency_key, patron_id, total, description, allocations, payment_gateway)
 
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None,
+                            book_id: Optional[int] = None, idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -359,6 +534,9 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         transaction_id: Original transaction ID to refund
         amount: Amount to refund
         payment_gateway: Payment gateway instance (injectable for testing)
+        book_id: Book whose share of the payment is refunded (optional); the
+            refund may not exceed what was paid for that book
+        idempotency_key: Client-chosen key identifying this refund request (optional)
         
     Returns:
         tuple: (success: bool, message: str)
@@ -373,19 +551,88 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     if amount > 15.00:  # Maximum late fee per book
         return False, "Refund amount exceeds maximum late fee."
     
-    # Use provided gateway or create new one
+    if idempotency_key is None:
+        idempotency_key = str(uuid.uuid4())
+    
+    with transaction():
+        acquire_lock(f"payment:{idempotency_key}")
+        existing = get_payment(idempotency_key)
+        replay = existing and _ledger_refund_result(existing, transaction_id, book_id)
+        if replay:
+            return replay
+        
+        if book_id is not None:
+            allocation = get_payment_allocation(transaction_id, book_id)
+            if not allocation:
+                return False, "No late fee payment found for this book in that transaction."
+            if amount > round(allocation['amount'] - allocation['refunded_amount'], 2):
+                return False, "Refund amount exceeds the amount paid for this book."
+        
+        if not record_pending_payment(idempotency_key, 'refund', None, book_id, amount, transaction_id):
+            return False, "Refund is already being processed."
+    
+    # Use provided gateway or the shared default one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = get_payment_gateway()
     
     # Process refund through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
     try:
-        success, message = payment_gateway.refund_payment(transaction_id, amount)
-        
-        if success:
-            return True, message
-        else:
-            return False, f"Refund failed: {message}"
-            
+        success, message = payment_gateway.refund_payment(transaction_id, amount, idempotency_key=idempotency_key)
     except Exception as e:
+        complete_payment(idempotency_key, 'error', str(e))
         return False, f"Refund processing error: {str(e)}"
+    
+    if success:
+        with transaction():
+            complete_payment(idempotency_key, 'completed', message)
+            if book_id is not None:
+                add_refunded_amount(transaction_id, book_id, amount)
+        return True, message
+    else:
+        complete_payment(idempotency_key, 'declined', message)
+        return False, f"Refund failed: {message}"
+
+def reconcile_payments(day: date, payment_gateway: PaymentGateway = None, max_workers: int = 16) -> Dict:
+    """
+    Compare one day's charges in the local ledger with the gateway.
+
+    Every completed charge is verified with the gateway in one batch; any whose
+    gateway status is not 'completed' is a mismatch. Charges still pending or
+    in error (outcome unknown) are listed as unresolved.
+
+    Args:
+        day: Ledger day to reconcile
+        payment_gateway: Gateway to verify against (defaults to the shared one)
+        max_workers: Maximum concurrent status checks
+
+    Returns:
+        Dict: {'checked', 'matched', 'mismatched': [{'idempotency_key', 'transaction_id', 'amount', 'gateway_status'}],
+               'unresolved': [{'idempotency_key', 'status', 'amount'}]}
+    """
+    start = datetime.combine(day, datetime.min.time())
+    charges = get_payments(start, start + timedelta(days=1), kind='charge')
+    completed = [charge for charge in charges if charge['status'] == 'completed']
+    statuses = verify_payment_statuses((charge['transaction_id'] for charge in completed),
+                                       payment_gateway, max_workers)
+
+    report = {'checked': len(completed), 'matched': 0, 'mismatched': [], 'unresolved': []}
+    for charge in completed:
+        gateway_status = statuses[charge['transaction_id']].get('status')
+        if gateway_status == 'completed':
+            report['matched'] += 1
+        else:
+            report['mismatched'].append({
+                'idempotency_key': charge['idempotency_key'],
+                'transaction_id': charge['transaction_id'],
+                'amount': charge['amount'],
+                'gateway_status': gateway_status
+            })
+    for charge in charges:
+        if charge['status'] in ('pending', 'error'):
+            report['unresolved'].append({
+                'idempotency_key': charge['idempotency_key'],
+                'status': charge['status'],
+                'amount': charge['amount']
+            })
+    return report
@@ -6,9 +6,20 @@ For Assignment 3: You will learn to mock this service in their tests
 since we cannot make actual payment API calls during testing.
 """
 
-import requests
-from typing import Dict, Tuple
+import asyncio
+import os
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
 import time
+from cache import LRUCache
+
+if TYPE_CHECKING:
+    # Imported on first use at runtime; requests is slow to import and most
+    # processes never talk to a real gateway
+    import requests
 
 
 class PaymentGateway:
@@ -32,7 +43,8 @@ class PaymentGateway:
         self.api_key = api_key
         self.base_url = "https://api.payment-gateway.example.com"
     
-    def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+    def process_payment(self, patron_id: str, amount: float, description: str = "",
+                        idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
         """
         Process a payment through the external gateway.
         
@@ -43,6 +55,7 @@ class PaymentGateway:
             patron_id: 6-digit patron/customer ID
             amount: Payment amount in dollars
             description: Payment description
+            idempotency_key: Key the gateway uses to apply a retried charge only once (optional)
             
         Returns:
             tuple: (success: bool, transaction_id: str, message: str)
@@ -57,7 +70,7 @@ class PaymentGateway:
         # In a real implementation, this would make an HTTP request:
         # response = requests.post(
         #     f"{self.base_url}/charges",
-        #     headers={"Authorization": f"Bearer {self.api_key}"},
+        #     headers={"Authorization": f"Bearer {self.api_key}", "Idempotency-Key": idempotency_key},
         #     json={
         #         "customer_id": patron_id,
         #         "amount": amount,
@@ -82,7 +95,8 @@ class PaymentGateway:
         transaction_id = f"txn_{patron_id}_{int(time.time())}"
         return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
     
-    def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+    def refund_payment(self, transaction_id: str, amount: float,
+                       idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
         """
         Refund a previous payment.
         
@@ -92,6 +106,7 @@ class PaymentGateway:
         Args:
             transaction_id: Original transaction ID to refund
             amount: Amount to refund
+            idempotency_key: Key the gateway uses to apply a retried refund only once (optional)
             
         Returns:
             tuple: (success: bool, message: str)
@@ -132,3 +147,287 @@ class PaymentGateway:
             "amount": 10.50,
             "timestamp": time.time()
         }
+
+
+class AsyncPaymentGateway:
+    """
+    asyncio client for the payment gateway's HTTP API.
+
+    All calls share one requests.Session whose connection pool keeps up to
+    `max_concurrency` keep-alive connections open, so repeated payments reuse
+    TCP/TLS connections. Blocking I/O runs on a bounded thread pool and at most
+    `max_concurrency` requests are in flight at once; the rest wait their turn.
+    Connection errors, timeouts, 429 and 5xx responses are retried with
+    exponential backoff. Charges and refunds carry an Idempotency-Key header
+    so a retried request is never applied twice by the gateway.
+
+    API used:
+        POST /charges          {customer_id, amount, currency, description} -> {id, status, message}
+        POST /refunds          {transaction_id, amount}                     -> {id, status, message}
+        GET  /charges/<txn_id>                                              -> status dict
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key: str = "test_key_12345", base_url: str = "https://api.payment-gateway.example.com",
+                 max_concurrency: int = 10, timeout: float = 5.0, max_retries: int = 3, backoff: float = 0.2):
+        """
+        Args:
+            api_key: API key for authentication
+            base_url: Gateway API root URL
+            max_concurrency: Maximum requests in flight (and pooled connections)
+            timeout: Per-request connect/read timeout in seconds
+            max_retries: Retries after the first attempt for transient failures
+            backoff: Base delay in seconds, doubled on each retry
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers['Authorization'] = f"Bearer {api_key}"
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='payment-gateway')
+        self._semaphores = {}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    async def _request(self, method: str, path: str, **kwargs) -> 'requests.Response':
+        """Send a request, retrying transient failures with exponential backoff."""
+        import requests
+
+        loop = asyncio.get_running_loop()
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore():
+                    response = await loop.run_in_executor(
+                        self._executor,
+                        lambda: self._session.request(method, url, timeout=self.timeout, **kwargs)
+                    )
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (1 + random.random() / 2))
+            attempt += 1
+
+    @staticmethod
+    def _message(response: 'requests.Response', default: str) -> str:
+        try:
+            return response.json().get('message', default)
+        except ValueError:
+            return default
+
+    async def process_payment(self, patron_id: str, amount: float, description: str = "",
+                              idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
+        """
+        Charge a patron. Same contract as PaymentGateway.process_payment.
+
+        Returns:
+            tuple: (success: bool, transaction_id: str, message: str)
+        """
+        response = await self._request(
+            'POST', '/charges',
+            headers={'Idempotency-Key': idempotency_key or str(uuid.uuid4())},
+            json={
+                "customer_id": patron_id,
+                "amount": amount,
+                "currency": "usd",
+                "description": description
+            }
+        )
+        if response.status_code >= 500:
+            response.raise_for_status()
+        if not response.ok:
+            return False, "", self._message(response, f"Payment declined (HTTP {response.status_code})")
+        body = response.json()
+        if body.get('status') != 'succeeded':
+            return False, "", body.get('message', "Payment declined")
+        return True, body['id'], body.get('message', f"Payment of ${amount:.2f} processed successfully")
+
+    async def refund_payment(self, transaction_id: str, amount: float,
+                             idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Refund a previous charge. Same contract as PaymentGateway.refund_payment.
+
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        response = await self._request(
+            'POST', '/refunds',
+            headers={'Idempotency-Key': idempotency_key or str(uuid.uuid4())},
+            json={"transaction_id": transaction_id, "amount": amount}
+        )
+        if response.status_code >= 500:
+            response.raise_for_status()
+        if not response.ok:
+            return False, self._message(response, f"Refund rejected (HTTP {response.status_code})")
+        body = response.json()
+        if body.get('status') != 'succeeded':
+            return False, body.get('message', "Refund rejected")
+        return True, body.get('message', f"Refund of ${amount:.2f} processed successfully. Refund ID: {body.get('id')}")
+
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """
+        Check the status of a charge. Same contract as PaymentGateway.verify_payment_status.
+
+        Returns:
+            dict: Payment status information
+        """
+        response = await self._request('GET', f"/charges/{transaction_id}")
+        if response.status_code == 404:
+            return {"status": "not_found", "message": "Transaction not found"}
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        """Close pooled connections and stop the worker threads."""
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+class PaymentGatewayClient:
+    """
+    Synchronous façade over AsyncPaymentGateway.
+
+    Exposes the same blocking methods as PaymentGateway, so it can be passed
+    as `payment_gateway` to pay_late_fees / refund_late_fee_payment. Calls are
+    run on a private event loop in a background thread, which keeps the async
+    client (and its pooled connections) alive between calls and lets several
+    Flask worker threads share it safely.
+    """
+
+    def __init__(self, api_key: str = "test_key_12345", base_url: str = "https://api.payment-gateway.example.com",
+                 **options):
+        """
+        Args:
+            api_key: API key for authentication
+            base_url: Gateway API root URL
+            **options: Passed through to AsyncPaymentGateway (max_concurrency, timeout, ...)
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.gateway = AsyncPaymentGateway(api_key, base_url, **options)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='payment-gateway-loop', daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def process_payment(self, patron_id: str, amount: float, description: str = "",
+                        idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
+        """Charge a patron; see AsyncPaymentGateway.process_payment."""
+        return self._run(self.gateway.process_payment(patron_id, amount, description, idempotency_key))
+
+    def refund_payment(self, transaction_id: str, amount: float,
+                       idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
+        """Refund a previous charge; see AsyncPaymentGateway.refund_payment."""
+        return self._run(self.gateway.refund_payment(transaction_id, amount, idempotency_key))
+
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check the status of a charge; see AsyncPaymentGateway.verify_payment_status."""
+        return self._run(self.gateway.verify_payment_status(transaction_id))
+
+    def close(self):
+        """Stop the background loop and close pooled connections."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self.gateway.close()
+        self._loop.close()
+
+
+_default_gateway = None
+_default_gateway_lock = threading.Lock()
+
+def get_payment_gateway():
+    """
+    Get the process-wide payment gateway used when none is injected.
+
+    Returns a shared PaymentGatewayClient when PAYMENT_GATEWAY_URL is set in
+    the environment (PAYMENT_GATEWAY_API_KEY, PAYMENT_GATEWAY_MAX_CONCURRENCY
+    and PAYMENT_GATEWAY_TIMEOUT tune it); otherwise the simulated PaymentGateway.
+    """
+    global _default_gateway
+    base_url = os.environ.get('PAYMENT_GATEWAY_URL')
+    if not base_url:
+        return PaymentGateway()
+    with _default_gateway_lock:
+        if _default_gateway is None:
+            _default_gateway = PaymentGatewayClient(
+                api_key=os.environ.get('PAYMENT_GATEWAY_API_KEY', "test_key_12345"),
+                base_url=base_url,
+                max_concurrency=int(os.environ.get('PAYMENT_GATEWAY_MAX_CONCURRENCY', 10)),
+                timeout=float(os.environ.get('PAYMENT_GATEWAY_TIMEOUT', 5.0))
+            )
+        return _default_gateway
+
+
+# Gateway statuses that can no longer change, so a verified result is reusable
+FINAL_PAYMENT_STATUSES = frozenset({'completed'})
+VERIFY_MAX_WORKERS = 16
+
+_verified_statuses = LRUCache(maxsize=100000)
+
+def verify_payment_statuses(transaction_ids: Iterable[str], payment_gateway=None,
+                            max_workers: int = VERIFY_MAX_WORKERS) -> Dict[str, Dict]:
+    """
+    Check the status of many transactions at once.
+
+    Duplicate ids are checked once, ids already verified in a final state are
+    answered from a cache, and the rest are checked concurrently on at most
+    max_workers threads. A check that raises is reported as status 'error'
+    rather than aborting the batch.
+
+    Args:
+        transaction_ids: Transaction IDs to check
+        payment_gateway: Gateway to use (defaults to get_payment_gateway())
+        max_workers: Maximum concurrent status checks
+
+    Returns:
+        dict: {transaction_id: payment status information}
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+    gateway = payment_gateway if payment_gateway is not None else get_payment_gateway()
+
+    results = {}
+    pending = []
+    for transaction_id in dict.fromkeys(transaction_ids):
+        cached = _verified_statuses.get(transaction_id)
+        if cached is not None:
+            results[transaction_id] = dict(cached)
+        else:
+            pending.append(transaction_id)
+
+    def check(transaction_id):
+        try:
+            return gateway.verify_payment_status(transaction_id)
+        except Exception as e:
+            return {"transaction_id": transaction_id, "status": "error", "message": str(e)}
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            for transaction_id, status in zip(pending, executor.map(check, pending)):
+                if status.get('status') in FINAL_PAYMENT_STATUSES:
+                    _verified_statuses.set(transaction_id, dict(status))
+                results[transaction_id] = status
+    return results
+
+def clear_verified_statuses():
+    """Forget every cached final payment status."""
+    _verified_statuses.clear()
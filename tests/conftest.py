@@ -0,0 +1,16 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import database
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the database module at a fresh, empty database file."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'test_library.db'))
+    database.init_database()
+    yield database.DATABASE
+    database.get_pool().close()
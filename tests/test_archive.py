@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+import pytest
+from database import (
+    insert_book, insert_borrow_record, update_borrow_record_return_date, get_db_connection,
+    archive_closed_loans, get_patron_borrow_history, get_patron_history_page, get_patron_history_summary,
+    get_patron_loan_summary, check_patron_loan_counters, get_patron_loans
+)
+from services.library_service import get_patron_status_report
+import manage
+
+def _count(table):
+    conn = get_db_connection()
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    conn.close()
+    return count
+
+@pytest.fixture
+def aged_loans(temp_db):
+    """Patron 222222: 12 loans returned 2-3 years ago, 3 returned last week and 1 open."""
+    now = datetime.now()
+    for i in range(1, 17):
+        insert_book(f"Aged Book {i}", "Author", f"{5000000000000 + i}", 1, 1)
+    for i in range(1, 13):
+        borrowed = now - timedelta(days=1100 - i * 30)
+        insert_borrow_record("222222", i, borrowed, borrowed + timedelta(days=14))
+        update_borrow_record_return_date("222222", i, borrowed + timedelta(days=10))
+    for i in range(13, 16):
+        insert_borrow_record("222222", i, now - timedelta(days=14), now)
+        update_borrow_record_return_date("222222", i, now - timedelta(days=7))
+    insert_borrow_record("222222", 16, now - timedelta(days=20), now - timedelta(days=6))
+    return "222222"
+
+def test_archive_moves_only_old_closed_loans(aged_loans):
+    history = get_patron_borrow_history(aged_loans)
+    summary = get_patron_history_summary(aged_loans)
+
+    assert archive_closed_loans(older_than_days=365, batch_size=5) == 12
+
+    assert _count('borrow_records') == 4
+    assert _count('borrow_records_archive') == 12
+    assert archive_closed_loans(older_than_days=365) == 0
+    assert get_patron_borrow_history(aged_loans) == history
+    assert get_patron_history_summary(aged_loans) == summary
+
+def test_reads_union_live_and_archived_loans(aged_loans):
+    before = get_patron_status_report(aged_loans, history_limit=None)
+    archive_closed_loans(older_than_days=365)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = get_patron_history_page(aged_loans, limit=5, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert seen == before['borrow_history']
+    assert get_patron_status_report(aged_loans, history_limit=None) == before
+    assert len(get_patron_loans(aged_loans)) == 16
+
+def test_archive_leaves_open_loan_counters_alone(aged_loans):
+    archive_closed_loans(older_than_days=0)
+
+    assert _count('borrow_records') == 1
+    assert get_patron_loan_summary(aged_loans) == {'active_loans': 1, 'book_ids': {16}}
+    assert check_patron_loan_counters() == []
+
+def test_manage_archive_command(aged_loans, temp_db, capsys):
+    assert manage.main(['--db', temp_db, 'archive', '--older-than-days', '30', '--batch-size', '4']) == 0
+
+    assert "archived 12 loan(s)" in capsys.readouterr().out
+    assert _count('borrow_records_archive') == 12
@@ -0,0 +1,68 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from cache import LRUCache
+from database import (
+    insert_book, get_book_by_id, get_book_by_isbn, update_book_availability,
+    get_book_cache_stats, get_pool_stats, configure_book_cache
+)
+from services.library_service import borrow_book_by_patron
+
+@pytest.fixture
+def cached_book(temp_db):
+    configure_book_cache(size=16, ttl=60)
+    insert_book("Cached", "Author", "6100000000001", 2, 2)
+    yield get_book_by_isbn("6100000000001")['id']
+    configure_book_cache(size=1024, ttl=30.0)
+
+def test_repeat_lookups_skip_the_database(cached_book):
+    get_book_by_id(cached_book)
+    before = get_pool_stats()
+
+    for _ in range(5):
+        assert get_book_by_id(cached_book)['title'] == "Cached"
+        assert get_book_by_isbn("6100000000001")['id'] == cached_book
+
+    after = get_pool_stats()
+    assert after['hits'] + after['misses'] == before['hits'] + before['misses']
+    assert get_book_cache_stats()['hit_rate'] > 0.5
+
+def test_writes_invalidate_cached_book(cached_book):
+    get_book_by_id(cached_book)
+
+    update_book_availability(cached_book, -1)
+    assert get_book_by_id(cached_book)['available_copies'] == 1
+
+    assert borrow_book_by_patron("123456", cached_book)[0] is True
+    assert get_book_by_id(cached_book)['available_copies'] == 0
+
+def test_returned_books_are_copies(cached_book):
+    get_book_by_id(cached_book)['title'] = "Mutated"
+
+    assert get_book_by_id(cached_book)['title'] == "Cached"
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_ttl_expires_entries(monkeypatch):
+    cache = LRUCache(maxsize=2, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache.set('a', 1)
+
+    now[0] += 11
+
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
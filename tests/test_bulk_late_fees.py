@@ -0,0 +1,49 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from datetime import datetime, timedelta
+from database import insert_book, insert_borrow_record, update_borrow_record_return_date
+from services.library_service import calculate_all_late_fees, _late_fee_for_due_date
+from benchmarks import bench_late_fees
+
+def test_bulk_fees_match_scalar_rule_on_random_loans(temp_db):
+    rng = random.Random(327)
+    now = datetime.now()
+    expected = {}
+    for i in range(200):
+        insert_book(f"Book {i}", "Author", f"{2000000000000 + i}", 1, 1)
+        patron_id = f"{rng.randint(300000, 300030)}"
+        due_date = now + timedelta(days=rng.randint(-60, 14), hours=rng.randint(-23, 23))
+        insert_borrow_record(patron_id, i + 1, due_date - timedelta(days=14), due_date)
+
+        if rng.random() < 0.2:
+            update_borrow_record_return_date(patron_id, i + 1, now)
+            continue
+        fee, _ = _late_fee_for_due_date(due_date, now.date())
+        if fee > 0:
+            expected[patron_id] = round(expected.get(patron_id, 0.00) + fee, 2)
+
+    fees = calculate_all_late_fees()
+
+    assert {patron_id: patron['total_fee'] for patron_id, patron in fees.items()} == expected
+    for patron in fees.values():
+        assert all(0 < book['fee_amount'] <= 15.00 for book in patron['books'])
+
+def test_fee_tiers_and_cap(temp_db):
+    as_of = datetime(2025, 3, 31)
+    for i, days in enumerate([0, 1, 7, 8, 14, 40]):
+        insert_book(f"Tier {i}", "Author", f"{2100000000000 + i}", 1, 1)
+        insert_borrow_record("400000", i + 1, as_of - timedelta(days=days + 14), as_of - timedelta(days=days))
+
+    books = calculate_all_late_fees(as_of.date())["400000"]['books']
+
+    assert [(book['days_overdue'], book['fee_amount']) for book in books] == [
+        (1, 0.50), (7, 3.50), (8, 4.50), (14, 10.50), (40, 15.00)
+    ]
+
+def test_benchmark_agrees_with_scalar_function():
+    assert bench_late_fees.run(loans=300)['matches'] is True
@@ -0,0 +1,65 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import pytest
+from database import insert_book, get_book_by_isbn, get_all_books
+from services.catalog_import import import_books
+import manage
+
+CSV_FEED = """title,author,isbn,total_copies
+Dune,Frank Herbert,9780441013593,4
+  Neuromancer  ,William Gibson,9780441569595,2
+Bad Copies,Someone,9780000000001,zero
+,No Title,9780000000002,1
+Short Isbn,Someone,97800,1
+Dune Again,Frank Herbert,9780441013593,1
+Existing,Someone,9780000000003,1
+"""
+
+def test_csv_import_applies_catalog_rules(temp_db):
+    insert_book("Existing", "Someone", "9780000000003", 1, 1)
+
+    report = import_books(io.StringIO(CSV_FEED), 'csv', chunk_size=3)
+
+    assert report['rows'] == 7
+    assert report['imported'] == 2
+    assert {(reject['line'], reject['reason']) for reject in report['rejected']} == {
+        (4, "Total copies must be a positive integer."),
+        (5, "Title is required."),
+        (6, "ISBN must be exactly 13 digits."),
+        (7, "Duplicate ISBN in import file."),
+        (8, "A book with this ISBN already exists."),
+    }
+    assert get_book_by_isbn("9780441569595")['title'] == "Neuromancer"
+    assert get_book_by_isbn("9780441013593")['available_copies'] == 4
+
+def test_jsonl_import_reports_bad_lines(temp_db):
+    feed = "\n".join([
+        json.dumps({'title': 'Kindred', 'author': 'Octavia Butler', 'isbn': '9780807083697', 'total_copies': 2}),
+        "{not json",
+        json.dumps(['a', 'list']),
+        "",
+    ])
+
+    report = import_books(io.StringIO(feed), 'jsonl')
+
+    assert report['imported'] == 1
+    assert [reject['line'] for reject in report['rejected']] == [2, 3]
+    assert report['rows_per_second'] > 0
+
+def test_csv_requires_header(temp_db):
+    with pytest.raises(ValueError):
+        import_books(io.StringIO("title,author\nA,B\n"), 'csv')
+
+def test_manage_command_imports_file(temp_db, tmp_path, capsys):
+    path = tmp_path / 'feed.jsonl'
+    path.write_text(json.dumps({'title': 'Kindred', 'author': 'Octavia Butler', 'isbn': '9780807083697', 'total_copies': 2}) + "\n")
+
+    assert manage.main(['--db', temp_db, 'import-books', str(path)]) == 0
+    assert "1 imported" in capsys.readouterr().out
+    assert len(get_all_books()) == 1
@@ -0,0 +1,66 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import pytest
+from flask import Flask
+import database
+from database import insert_book, get_books_page, iter_books
+from routes import register_blueprints
+
+@pytest.fixture
+def catalog(temp_db):
+    # Two books share a title so the id tie-breaker is exercised
+    for i in range(7):
+        insert_book(f"Book {i // 2}", "Author", f"{9000000000000 + i}", 1, 1)
+
+@pytest.fixture
+def client(catalog):
+    app = Flask(__name__, root_path=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app.secret_key = "test"
+    database.init_app(app)
+    register_blueprints(app)
+    return app.test_client()
+
+def test_pages_cover_catalog_without_overlap(catalog):
+    seen = []
+    cursor = None
+    while True:
+        books, cursor = get_books_page(3, cursor)
+        seen.extend(book['id'] for book in books)
+        if cursor is None:
+            break
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+    assert [book['id'] for book in iter_books(batch_size=2)] == seen
+
+def test_invalid_cursor_is_rejected(catalog):
+    with pytest.raises(ValueError):
+        get_books_page(3, "not-a-cursor")
+
+def test_api_books_pages(client):
+    first = client.get('/api/books?limit=4').get_json()
+    second = client.get(f"/api/books?limit=4&cursor={first['next_cursor']}").get_json()
+
+    assert first['count'] == 4
+    assert second['count'] == 3
+    assert second['next_cursor'] is None
+    assert client.get('/api/books?cursor=bogus').status_code == 400
+
+def test_api_books_streams_ndjson(client):
+    response = client.get('/api/books?format=ndjson&limit=2')
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(lines) == 7
+    assert json.loads(lines[0])['title'] == "Book 0"
+
+def test_catalog_page_links_to_next_page(client):
+    page = client.get('/catalog?limit=5').get_data(as_text=True)
+
+    assert 'Next Page' in page
+    assert 'Book 3' not in page
@@ -0,0 +1,81 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import threading
+import pytest
+from flask import Flask
+import database
+from database import ConnectionPool, get_db_connection, get_pool_stats, get_book_by_isbn, get_patron_borrow_count
+
+def test_connections_are_reused(temp_db):
+    before = get_pool_stats()
+
+    for _ in range(10):
+        assert get_patron_borrow_count("123456") == 0
+
+    after = get_pool_stats()
+    assert after['hits'] - before['hits'] == 10
+    assert after['misses'] == before['misses']
+    assert after['in_use'] == 0
+
+def test_pool_is_bounded_and_times_out(temp_db):
+    pool = ConnectionPool(temp_db, size=1, timeout=0.05)
+    conn = pool.acquire()
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+
+    pool.release(conn)
+    stats = pool.stats()
+    assert stats['waits'] == 1
+    assert stats['timeouts'] == 1
+    assert stats['open'] == 1
+
+def test_waiting_thread_gets_released_connection(temp_db):
+    pool = ConnectionPool(temp_db, size=1, timeout=5)
+    conn = pool.acquire()
+    acquired = []
+
+    worker = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    worker.start()
+    pool.release(conn)
+    worker.join(timeout=5)
+
+    assert acquired == [conn]
+    assert pool.stats()['waits'] == 1
+
+def test_unhealthy_connection_is_replaced(temp_db):
+    pool = ConnectionPool(temp_db, size=1, health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # simulate a connection that died while idle
+
+    replacement = pool.acquire()
+
+    assert replacement is not conn
+    assert replacement.execute('SELECT 1').fetchone()[0] == 1
+    assert pool.stats()['discarded'] == 1
+
+def test_release_rolls_back_open_transaction(temp_db):
+    pool = ConnectionPool(temp_db, size=1)
+    conn = pool.acquire()
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES ('T', 'A', '2222222222222', 1, 1)")
+    pool.release(conn)
+
+    assert get_book_by_isbn("2222222222222") is None
+
+def test_app_context_reuses_one_connection(temp_db):
+    app = Flask(__name__)
+    database.init_app(app)
+
+    with app.app_context():
+        first = get_db_connection()
+        first.close()
+        assert get_db_connection() is first
+        assert get_pool_stats()['in_use'] == 1
+
+    assert get_pool_stats()['in_use'] == 0
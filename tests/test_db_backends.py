@@ -0,0 +1,143 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest.mock import Mock
+import pytest
+import database
+from db_backends import SQLiteBackend, create_backend, translate_placeholders
+from services.payment_service import PaymentGateway
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron, search_books_in_catalog,
+    calculate_all_late_fees, pay_late_fees
+)
+
+# Set to a disposable PostgreSQL database URL to run the backend conformance tests against it
+POSTGRES_URL = os.environ.get('LIBRARY_TEST_POSTGRES_URL')
+
+def test_placeholders_are_translated_outside_literals():
+    assert translate_placeholders("SELECT * FROM t WHERE a = ? AND b = ?") == \
+        "SELECT * FROM t WHERE a = %s AND b = %s"
+    assert translate_placeholders("SELECT CAST(:as_of AS date) - due::date FROM t") == \
+        "SELECT CAST(%(as_of)s AS date) - due::date FROM t"
+    assert translate_placeholders("SELECT 'a?b:c%' || ? FROM t WHERE x LIKE '50%'") == \
+        "SELECT 'a?b:c%%' || %s FROM t WHERE x LIKE '50%%'"
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_backend('oracle', 'scott/tiger')
+
+def test_sqlite_is_the_default_backend(temp_db):
+    assert database.get_pool().backend.name == 'sqlite'
+    assert isinstance(database.get_db_connection().backend, SQLiteBackend)
+
+def test_switching_backend_replaces_pool(temp_db, monkeypatch):
+    pool = database.get_pool()
+    monkeypatch.setattr(database, 'DATABASE_BACKEND', 'postgresql')
+    try:
+        import psycopg2
+    except ImportError:
+        with pytest.raises(ImportError, match="psycopg2"):
+            database.get_pool()
+    else:
+        assert database.get_pool() is not pool
+    monkeypatch.setattr(database, 'DATABASE_BACKEND', 'sqlite')
+    database.close_pool()
+
+@pytest.fixture
+def postgres_db(monkeypatch):
+    if not POSTGRES_URL:
+        pytest.skip("LIBRARY_TEST_POSTGRES_URL is not set")
+    monkeypatch.setattr(database, 'DATABASE_BACKEND', 'postgresql')
+    monkeypatch.setattr(database, 'DATABASE', POSTGRES_URL)
+    conn = database.get_db_connection()
+    for table in ('catalog_version', 'borrow_records_archive', 'patrons', 'jobs', 'payments', 'payment_allocations', 'borrow_records', 'books', 'schema_version'):
+        conn.execute(f'DROP TABLE IF EXISTS {table} CASCADE')
+    conn.commit()
+    conn.close()
+    database.init_database()
+    yield
+    database.close_pool()
+
+def test_postgres_runs_the_library_workflow(postgres_db):
+    assert database.get_schema_version() == database.SCHEMA_MIGRATIONS[-1][0]
+    version = database.get_catalog_version()[0]
+    assert add_book_to_catalog("Great Expectations", "Charles Dickens", "9780141439563", 1)[0]
+    book_id = database.get_book_by_isbn("9780141439563")['id']
+    assert database.get_catalog_version()[0] == version + 1
+
+    assert [book['id'] for book in search_books_in_catalog("great exp", "title")] == [book_id]
+    assert borrow_book_by_patron("222222", book_id)[0]
+    assert not borrow_book_by_patron("333333", book_id)[0]
+    assert return_book_by_patron("222222", book_id)[0]
+
+    now = datetime.now()
+    database.insert_borrow_record("444444", book_id, now - timedelta(days=30), now - timedelta(days=16))
+    assert calculate_all_late_fees(date.today())["444444"]['total_fee'] == 12.50
+    assert database.get_patron_loan_summary("444444") == {'active_loans': 1, 'book_ids': {book_id}}
+    assert database.check_patron_loan_counters() == []
+
+    history, cursor = database.get_patron_history_page("222222", limit=1)
+    assert [entry.book_id for entry in history] == [book_id] and cursor is None
+    assert database.get_patron_history_summary("444444")['total_loans'] == 1
+    assert database.archive_closed_loans(older_than_days=0) == 1
+    assert database.get_patron_history_page("222222", limit=1)[0] == history
+
+def test_postgres_borrow_race_has_one_winner(postgres_db):
+    database.insert_book("Race", "Author", "9999999999990", 1, 1)
+    book_id = database.get_book_by_isbn("9999999999990")['id']
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(borrow_book_by_patron(f"{700000 + i}", book_id)))
+               for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(success for success, _ in results) == 1
+    assert database.get_book_by_id(book_id)['available_copies'] == 0
+
+def run_concurrently(calls):
+    results = []
+    threads = [threading.Thread(target=lambda call=call: results.append(call())) for call in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_postgres_patron_cannot_exceed_loan_limit_concurrently(postgres_db, monkeypatch):
+    database.insert_books([(f"Limit {i}", "Author", f"{9999999999900 + i}", 1, 1) for i in range(10)])
+    book_ids = [database.get_book_by_isbn(f"{9999999999900 + i}")['id'] for i in range(10)]
+    for book_id in book_ids[:5]:
+        assert borrow_book_by_patron("800000", book_id)[0]
+    def slow_loan_summary(patron_id):
+        # Widen the gap between checking the limit and recording the loan
+        summary = database.get_patron_loan_summary(patron_id)
+        time.sleep(0.1)
+        return summary
+    monkeypatch.setattr('services.library_service.get_patron_loan_summary', slow_loan_summary)
+
+    results = run_concurrently([lambda book_id=book_id: borrow_book_by_patron("800000", book_id)
+                                for book_id in book_ids[5:]])
+
+    assert sum(success for success, _ in results) == 1
+    assert database.get_patron_loan_summary("800000")['active_loans'] == 6
+
+def test_postgres_same_idempotency_key_charges_once(postgres_db):
+    database.insert_book("Fees", "Author", "9999999999980", 1, 1)
+    book_id = database.get_book_by_isbn("9999999999980")['id']
+    now = datetime.now()
+    database.insert_borrow_record("810000", book_id, now - timedelta(days=24), now - timedelta(days=10))
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.side_effect = lambda **kwargs: time.sleep(0.2) or (True, "txn_810000_1", "ok")
+
+    results = run_concurrently([lambda: pay_late_fees("810000", book_id, gateway, idempotency_key="race-1")] * 4)
+
+    gateway.process_payment.assert_called_once()
+    assert sum(success for success, _, _ in results) == 1
@@ -0,0 +1,32 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import database
+from benchmarks import bench_hot_paths
+
+def test_benchmark_runs_every_hot_path():
+    result = bench_hot_paths.run(rows=400, iterations=5)
+
+    assert result['meta']['rows'] == 400
+    assert set(result['results']) == {
+        'borrow_book_by_patron', 'return_book_by_patron', 'search_title', 'search_author', 'search_isbn',
+        'get_patron_status_report', 'route_catalog', 'route_search', 'route_catalog_cached',
+        'route_search_cached', 'route_api_books', 'route_borrow', 'route_return'
+    }
+    assert all(stats['count'] == 5 for stats in result['results'].values())
+    assert database.DATABASE == 'library.db'
+
+def test_stored_baseline_is_comparable():
+    with open(bench_hot_paths.default_baseline_path(10000)) as f:
+        baseline = json.load(f)
+    slower = {'results': {name: dict(stats, p50_ms=stats['p50_ms'] * 2) for name, stats in baseline['results'].items()}}
+
+    comparison = bench_hot_paths.compare(slower, baseline)
+
+    assert {entry['name'] for entry in comparison} == set(baseline['results'])
+    assert all(entry['regression'] for entry in comparison)
+    assert not any(entry['regression'] for entry in bench_hot_paths.compare(baseline, baseline))
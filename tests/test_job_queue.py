@@ -0,0 +1,149 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import pytest
+from flask import Flask
+import database
+from database import insert_book, insert_borrow_record, claim_next_job, get_job
+from routes import register_blueprints
+from services.payment_service import PaymentGateway
+from services import job_queue
+from services.job_queue import submit_job, run_job, run_pending_jobs, JobWorkerPool, init_app as init_job_workers
+
+@pytest.fixture
+def gateway(temp_db, mocker):
+    now = datetime.now()
+    insert_book("Queued Book", "Author", "7200000000001", 1, 1)
+    insert_borrow_record("555555", 1, now - timedelta(days=20), now - timedelta(days=6))
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_555555_1", "Payment of $3.00 processed successfully")
+    mocker.patch('services.library_service.get_payment_gateway', return_value=gateway)
+    return gateway
+
+def test_submitted_payment_runs_in_background(gateway):
+    job_id = submit_job('pay_late_fees', {'patron_id': '555555', 'book_id': 1})
+
+    assert get_job(job_id)['status'] == 'queued'
+    assert run_pending_jobs() == 1
+    job = get_job(job_id)
+    assert job['status'] == 'succeeded'
+    assert job['result']['transaction_id'] == "txn_555555_1"
+
+def test_transient_failure_is_retried_then_dead_lettered(gateway):
+    gateway.process_payment.side_effect = ConnectionError("gateway down")
+    job_id = submit_job('pay_late_fees', {'patron_id': '555555', 'book_id': 1}, max_attempts=2)
+
+    assert run_job(claim_next_job()) == 'queued'
+    assert claim_next_job() is None  # backoff: not due yet
+    assert run_job(claim_next_job(datetime.now() + timedelta(hours=1))) == 'dead'
+    job = get_job(job_id)
+    assert job['attempts'] == 2
+    assert "gateway down" in job['last_error']
+
+def test_retry_reuses_idempotency_key(gateway):
+    gateway.process_payment.side_effect = [ConnectionError("timeout"), (True, "txn_555555_1", "ok")]
+    job_id = submit_job('pay_late_fees', {'patron_id': '555555', 'book_id': 1})
+
+    run_job(claim_next_job())
+    assert run_job(claim_next_job(datetime.now() + timedelta(hours=1))) == 'succeeded'
+    assert [call.kwargs['idempotency_key'] for call in gateway.process_payment.call_args_list] == [f"job-{job_id}"] * 2
+    assert database.get_payment(f"job-{job_id}")['status'] == 'completed'
+
+def test_declined_payment_fails_without_retry(gateway):
+    gateway.process_payment.return_value = (False, "", "Card declined")
+    job_id = submit_job('pay_all_late_fees', {'patron_id': '555555'})
+
+    run_pending_jobs()
+
+    assert get_job(job_id)['status'] == 'failed'
+    assert gateway.process_payment.call_count == 1
+
+def test_invalid_jobs_are_rejected(temp_db):
+    with pytest.raises(ValueError):
+        submit_job('launch_rockets', {})
+    with pytest.raises(ValueError):
+        submit_job('pay_late_fees', {'patron_id': '555555'})
+    with pytest.raises(ValueError, match="patron_id must be a string"):
+        submit_job('pay_late_fees', {'patron_id': 555555, 'book_id': 1})
+    with pytest.raises(ValueError, match="amount must be a number"):
+        submit_job('refund_late_fee_payment', {'transaction_id': 'txn_555555_1', 'amount': 'lots'})
+
+def test_payload_is_stored_with_handler_types(temp_db):
+    job_id = submit_job('refund_late_fee_payment', {'transaction_id': 'txn_555555_1', 'amount': '3.50', 'book_id': '1'})
+
+    assert get_job(job_id)['payload'] == {'transaction_id': 'txn_555555_1', 'amount': 3.5, 'book_id': 1}
+
+def test_database_lock_contention_is_retried(gateway, mocker):
+    mocker.patch('services.job_queue.pay_late_fees', side_effect=sqlite3.OperationalError("database is locked"))
+    job_id = submit_job('pay_late_fees', {'patron_id': '555555', 'book_id': 1})
+
+    assert run_job(claim_next_job()) == 'queued'
+    assert "database is locked" in get_job(job_id)['last_error']
+
+def test_stale_job_with_pending_charge_waits_for_its_outcome(gateway):
+    job_id = submit_job('pay_late_fees', {'patron_id': '555555', 'book_id': 1})
+    claim_next_job()
+    # The worker reserved the charge, then died before the gateway answered
+    database.record_pending_payment(f"job-{job_id}", 'charge', '555555', 1, 3.00)
+    later = datetime.now() + timedelta(hours=1)
+    assert database.requeue_stale_jobs(later) == 1
+
+    assert run_job(claim_next_job()) == 'queued'
+    gateway.process_payment.assert_not_called()
+
+    # The stalled attempt's charge is recorded after all; the retry replays it
+    database.complete_payment(f"job-{job_id}", 'completed', "ok", "txn_555555_9")
+    assert run_job(claim_next_job(later)) == 'succeeded'
+    gateway.process_payment.assert_not_called()
+    assert get_job(job_id)['result']['transaction_id'] == "txn_555555_9"
+
+def test_unexpected_errors_are_not_retried(gateway, mocker):
+    mocker.patch('services.job_queue.pay_late_fees', side_effect=AttributeError("bug"))
+    job_id = submit_job('pay_late_fees', {'patron_id': '555555', 'book_id': 1})
+
+    assert run_job(claim_next_job()) == 'dead'
+    assert get_job(job_id)['attempts'] == 1
+    assert "AttributeError: bug" in get_job(job_id)['last_error']
+
+def test_worker_pool_and_endpoints(gateway):
+    app = Flask(__name__)
+    database.init_app(app)
+    register_blueprints(app)
+    client = app.test_client()
+    pool = JobWorkerPool(workers=2, poll_interval=0.01)
+    pool.start()
+    try:
+        response = client.post('/api/payments/jobs', json={'type': 'pay_late_fees', 'patron_id': '555555', 'book_id': 1})
+        assert response.status_code == 202
+        status_url = response.get_json()['status_url']
+
+        deadline = time.time() + 5
+        while client.get(status_url).get_json()['status'] in ('queued', 'running') and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.stop(timeout=5)
+
+    assert client.get(status_url).get_json()['status'] == 'succeeded'
+    assert client.get('/api/jobs/9999').status_code == 404
+    assert client.post('/api/payments/jobs', json={'type': 'nope'}).status_code == 400
+    assert client.post('/api/payments/jobs', json={'type': 'pay_late_fees', 'patron_id': 555555, 'book_id': 1}).status_code == 400
+
+def test_workers_only_start_when_configured(temp_db):
+    app = Flask(__name__)
+    assert init_job_workers(app) is None
+    assert 'job_workers' not in app.extensions
+
+    app.config['JOB_WORKERS'] = 1
+    pool = init_job_workers(app)
+    try:
+        assert app.extensions['job_workers'] is pool
+        assert [thread.name for thread in pool._threads] == ['job-worker-0']
+    finally:
+        pool.stop(timeout=5)
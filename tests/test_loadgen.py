@@ -0,0 +1,38 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from collections import Counter
+from datetime import datetime
+import database
+from benchmarks import loadgen
+
+def test_zipf_sampler_favours_low_ranks():
+    sampler = loadgen.ZipfSampler(100, 1.2)
+    rng = random.Random(1)
+    counts = Counter(sampler.sample(rng) for _ in range(5000))
+
+    assert set(counts) <= set(range(1, 101))
+    assert counts[1] > counts[2] > counts[10]
+
+def test_contended_borrow_return_keeps_catalog_consistent():
+    result = loadgen.run(threads=6, max_requests=600, books=10, copies=1, zipf=1.5, read_ratio=0.2)
+
+    assert result['violations'] == []
+    assert result['requests'] == 600
+    assert result['operations']['borrow']['ok'] > 0
+    assert result['operations']['borrow']['rejected'] > 0  # hot titles run out
+    assert all(stats['error'] == 0 for stats in result['operations'].values())
+    assert database.DATABASE == 'library.db'
+
+def test_invariant_check_detects_drift(temp_db):
+    database.insert_book("Drifted", "Author", "3100000000001", 2, 2)
+    database.insert_borrow_record("123456", 1, datetime.now(), datetime.now())
+
+    violations = loadgen.check_invariants(successful_borrows=1, successful_returns=0)
+
+    assert len(violations) == 1
+    assert "1 open loans" in violations[0]
@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import database
+from app import create_app
+from metrics import Histogram, _record_query
+
+@pytest.fixture
+def client(temp_db):
+    app = create_app({'METRICS_ENABLED': True})
+    yield app.test_client()
+    database.remove_query_listener(_record_query)
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert histogram.sum == pytest.approx(2.65)
+
+def test_metrics_report_latency_and_queries_per_route(client):
+    client.get('/catalog')
+    client.get('/catalog')
+    client.get('/api/books/does-not-exist')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'library_http_requests_total{method="GET",route="/catalog",status="200"} 2' in body
+    assert 'library_http_requests_total{method="GET",route="<unmatched>",status="404"} 1' in body
+    assert 'library_http_request_duration_seconds_count{method="GET",route="/catalog"} 2' in body
+    assert 'library_http_request_duration_seconds_bucket{method="GET",route="/catalog",le="+Inf"} 2' in body
+    assert 'library_db_queries_per_request_bucket{method="GET",route="/catalog",le="0"} 0' in body
+    assert 'library_db_query_duration_seconds_total{method="GET",route="/catalog"}' in body
+    assert 'library_db_pool_connections{state="idle"}' in body
+
+def test_query_listener_sees_each_statement(temp_db):
+    statements = []
+    listener = lambda sql, seconds: statements.append(sql)
+    database.add_query_listener(listener)
+    try:
+        database.get_book_by_id(1)
+        database.get_patron_borrow_count("123456")
+    finally:
+        database.remove_query_listener(listener)
+    database.get_patron_borrow_count("123456")
+
+    assert len(statements) == 2
+    assert 'borrow_records' in statements[1]
+
+def test_metrics_are_opt_in(temp_db):
+    app = create_app()
+
+    assert app.test_client().get('/metrics').status_code == 404
+    assert 'metrics' not in app.extensions
@@ -0,0 +1,73 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import database
+from database import SCHEMA_MIGRATIONS, get_schema_version, init_database, migrate_database, get_db_connection
+
+LATEST_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def test_fresh_database_is_fully_migrated(temp_db):
+    conn = get_db_connection()
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    conn.close()
+
+    assert get_schema_version() == LATEST_VERSION
+    assert journal_mode == 'wal'
+
+def test_migrations_are_idempotent(temp_db):
+    assert migrate_database() == []
+    init_database()
+    assert get_schema_version() == LATEST_VERSION
+
+def test_current_schema_skips_migrations(temp_db, monkeypatch):
+    def fail():
+        raise AssertionError("migrations should not run on a current schema")
+    monkeypatch.setattr(database, 'migrate_database', fail)
+
+    init_database()
+
+    assert get_schema_version() == LATEST_VERSION
+
+def test_existing_database_is_upgraded(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    legacy = sqlite3.connect(path)
+    for statement in SCHEMA_MIGRATIONS[0][2]:
+        legacy.execute(statement)
+    legacy.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES ('Old', 'Author', '7777777777777', 1, 1)")
+    legacy.commit()
+    legacy.close()
+
+    monkeypatch.setattr(database, 'DATABASE', path)
+    applied = migrate_database()
+
+    assert applied == [version for version, _, _ in SCHEMA_MIGRATIONS]
+    assert database.get_book_by_isbn('7777777777777')['title'] == 'Old'
+    database.get_pool().close()
+
+def test_patron_queries_use_indexes(temp_db):
+    conn = get_db_connection()
+    plan = ' '.join(row['detail'] for row in conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL
+    ''', ('123456',)))
+    conn.close()
+
+    assert 'idx_borrow_records_patron_return' in plan
+
+def test_borrowed_books_are_read_from_the_open_loan_index(temp_db):
+    conn = get_db_connection()
+    plan = ' '.join(row['detail'] for row in conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date
+        FROM borrow_records br JOIN books b ON br.book_id = b.id
+        WHERE br.patron_id = ? AND br.return_date IS NULL
+        ORDER BY br.borrow_date
+    ''', ('123456',)))
+    conn.close()
+
+    assert 'idx_borrow_records_patron_return (patron_id=? AND return_date=?)' in plan
+    assert 'TEMP B-TREE' not in plan
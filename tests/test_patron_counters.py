@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from database import (
+    insert_book, get_book_by_isbn, get_db_connection, get_patron_loan_summary, get_patron_borrow_count,
+    check_patron_loan_counters, rebuild_patron_loan_counters, insert_borrow_record
+)
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+import manage
+
+def _add_books(count):
+    book_ids = []
+    for i in range(count):
+        insert_book(f"Counter Book {i}", "Author", f"{6000000000000 + i}", 2, 2)
+        book_ids.append(get_book_by_isbn(f"{6000000000000 + i}")['id'])
+    return book_ids
+
+def test_borrow_and_return_keep_counters_in_step(temp_db):
+    first, second = _add_books(2)
+
+    assert borrow_book_by_patron("222222", first)[0] is True
+    assert borrow_book_by_patron("222222", second)[0] is True
+    assert get_patron_loan_summary("222222") == {'active_loans': 2, 'book_ids': {first, second}}
+
+    assert return_book_by_patron("222222", first)[0] is True
+    assert get_patron_loan_summary("222222") == {'active_loans': 1, 'book_ids': {second}}
+    assert get_patron_borrow_count("222222") == 1
+    assert check_patron_loan_counters() == []
+
+def test_unknown_patron_has_no_loans(temp_db):
+    assert get_patron_loan_summary("999999") == {'active_loans': 0, 'book_ids': set()}
+
+def test_duplicate_and_limit_checks_use_counters(temp_db):
+    book_ids = _add_books(7)
+
+    assert borrow_book_by_patron("333333", book_ids[0])[0] is True
+    assert borrow_book_by_patron("333333", book_ids[0]) == (False, "Cannot borrow multiple copies of the same book.")
+    for book_id in book_ids[1:6]:
+        assert borrow_book_by_patron("333333", book_id)[0] is True
+    success, message = borrow_book_by_patron("333333", book_ids[6])
+
+    assert success is False
+    assert "maximum borrowing limit" in message
+    assert return_book_by_patron("444444", book_ids[0]) == (False, "Book not borrowed by patron ID.")
+
+def test_direct_writes_to_borrow_records_update_counters(temp_db):
+    book_id = _add_books(1)[0]
+    now = datetime.now()
+    insert_borrow_record("555555", book_id, now, now + timedelta(days=14))
+
+    conn = get_db_connection()
+    conn.execute("UPDATE borrow_records SET patron_id = '666666' WHERE patron_id = '555555'")
+    conn.commit()
+    conn.close()
+
+    assert get_patron_loan_summary("555555")['active_loans'] == 0
+    assert get_patron_loan_summary("666666") == {'active_loans': 1, 'book_ids': {book_id}}
+
+    conn = get_db_connection()
+    conn.execute("DELETE FROM borrow_records")
+    conn.commit()
+    conn.close()
+
+    assert get_patron_loan_summary("666666")['active_loans'] == 0
+    assert check_patron_loan_counters() == []
+
+def test_check_reports_and_rebuild_repairs_drift(temp_db, capsys):
+    first, second = _add_books(2)
+    borrow_book_by_patron("777777", first)
+    borrow_book_by_patron("777777", second)
+    conn = get_db_connection()
+    conn.execute("UPDATE patrons SET active_loans = 9, active_book_ids = ',1,' WHERE patron_id = '777777'")
+    conn.execute("INSERT INTO patrons (patron_id, active_loans, active_book_ids) VALUES ('888888', 1, ',5,')")
+    conn.commit()
+    conn.close()
+
+    mismatches = check_patron_loan_counters()
+    assert [m['patron_id'] for m in mismatches] == ['777777', '888888']
+    assert mismatches[0]['expected_loans'] == 2
+    assert mismatches[0]['expected_book_ids'] == sorted([first, second])
+    assert manage.main(['--db', temp_db, 'check-patrons']) == 1
+
+    assert rebuild_patron_loan_counters() == 1
+    assert check_patron_loan_counters() == []
+    assert get_patron_loan_summary("777777") == {'active_loans': 2, 'book_ids': {first, second}}
+    assert manage.main(['--db', temp_db, 'check-patrons']) == 0
+    assert "0 inconsistent patron(s)" in capsys.readouterr().out
@@ -0,0 +1,89 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, datetime, timedelta
+import pytest
+from database import (
+    insert_book, insert_borrow_record, update_borrow_record_return_date,
+    get_patron_borrow_history, get_patron_history_page, get_patron_history_summary
+)
+from services.library_service import get_patron_status_report
+
+@pytest.fixture
+def long_history(temp_db):
+    """Patron 222222 borrowed book i on day i of 2024 for 30 days, returning all but the last."""
+    start = datetime(2024, 1, 1, 9, 0)
+    for i in range(1, 31):
+        insert_book(f"History Book {i}", "Author", f"{7000000000000 + i}", 1, 1)
+        borrowed = start + timedelta(days=i * 5)
+        insert_borrow_record("222222", i, borrowed, borrowed + timedelta(days=14))
+        if i < 30:
+            update_borrow_record_return_date("222222", i, borrowed + timedelta(days=3))
+    return "222222"
+
+def test_pages_walk_history_newest_first(long_history):
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = get_patron_history_page(long_history, limit=7, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 30
+    assert seen == get_patron_borrow_history(long_history)[::-1]
+
+def test_pages_respect_date_range(long_history):
+    page, cursor = get_patron_history_page(long_history, limit=100, since=date(2024, 3, 1), until=date(2024, 4, 1))
+
+    assert cursor is None
+    assert [entry.borrow_date.month for entry in page] == [3] * len(page)
+    assert len(page) == len(get_patron_borrow_history(long_history, since=date(2024, 3, 1), until=date(2024, 4, 1)))
+
+def test_invalid_cursor_is_rejected(long_history):
+    with pytest.raises(ValueError):
+        get_patron_history_page(long_history, cursor="not-a-cursor")
+
+def test_summary_counts_loans_per_month(long_history):
+    summary = get_patron_history_summary(long_history)
+    history = get_patron_borrow_history(long_history)
+
+    assert summary['total_loans'] == 30
+    assert summary['open_loans'] == 1
+    assert sum(month['loans'] for month in summary['loans_per_month']) == 30
+    for month in summary['loans_per_month']:
+        assert month['loans'] == sum(1 for entry in history if entry.borrow_date.strftime('%Y-%m') == month['month'])
+    assert get_patron_history_summary(long_history, since=date(2024, 2, 1), until=date(2024, 3, 1))['loans_per_month'] == \
+        [month for month in summary['loans_per_month'] if month['month'] == '2024-02']
+
+def test_status_report_loads_recent_window(long_history):
+    report = get_patron_status_report(long_history)
+    full = get_patron_status_report(long_history, history_limit=None)
+
+    assert len(report['borrow_history']) == 20
+    assert report['borrow_history'] == full['borrow_history'][:20]
+    assert full['history_cursor'] is None
+    older, _ = get_patron_history_page(long_history, limit=100, cursor=report['history_cursor'])
+    assert report['borrow_history'] + older == full['borrow_history']
+    assert report['history_summary']['total_loans'] == 30
+    assert report['borrow_count'] == 1
+
+def test_history_api_pages_and_filters(long_history):
+    from app import create_app
+    client = create_app().test_client()
+
+    first = client.get('/api/patrons/222222/history?limit=25').get_json()
+    second = client.get(f"/api/patrons/222222/history?limit=25&cursor={first['next_cursor']}").get_json()
+    march = client.get('/api/patrons/222222/history?since=2024-03-01&until=2024-04-01').get_json()
+    summary = client.get('/api/patrons/222222/history/summary').get_json()
+
+    assert first['count'] == 25 and second['count'] == 5 and second['next_cursor'] is None
+    assert first['loans'][0]['borrow_date'] == '2024-05-30T09:00:00'
+    assert all(loan['borrow_date'].startswith('2024-03') for loan in march['loans'])
+    assert summary['total_loans'] == 30
+    assert client.get('/api/patrons/222222/history?since=March').status_code == 400
+    assert client.get('/api/patrons/222222/history?cursor=bogus').status_code == 400
+    assert client.get('/api/patrons/12/history').status_code == 400
@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import pytest
+from flask import Flask
+import database
+from database import insert_book, insert_borrow_record, get_payment_allocations
+from routes import register_blueprints
+from services.payment_service import PaymentGateway
+from services.library_service import pay_all_late_fees, refund_late_fee_payment
+
+@pytest.fixture
+def overdue_patron(temp_db):
+    now = datetime.now()
+    for i, days_overdue in enumerate([3, 10, -5]):
+        insert_book(f"Overdue {i}", "Author", f"{5100000000000 + i}", 1, 1)
+        insert_borrow_record("777777", i + 1, now - timedelta(days=14 + days_overdue), now - timedelta(days=days_overdue))
+    return "777777"
+
+@pytest.fixture
+def gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_777777_1", "Payment of $9.00 processed successfully")
+    gateway.refund_payment.return_value = (True, "Refund processed")
+    return gateway
+
+def test_one_charge_for_all_overdue_books(overdue_patron, gateway):
+    success, message, transaction_id = pay_all_late_fees(overdue_patron, gateway)
+
+    assert success is True
+    assert transaction_id == "txn_777777_1"
+    gateway.process_payment.assert_called_once()
+    assert gateway.process_payment.call_args.kwargs['amount'] == 1.50 + 6.50
+    assert [(a['book_id'], a['amount']) for a in get_payment_allocations(transaction_id)] == [(1, 1.50), (2, 6.50)]
+
+def test_refunds_are_limited_per_book(overdue_patron, gateway):
+    _, _, transaction_id = pay_all_late_fees(overdue_patron, gateway)
+
+    assert refund_late_fee_payment(transaction_id, 1.50, gateway, book_id=1)[0] is True
+    assert "exceeds the amount paid" in refund_late_fee_payment(transaction_id, 0.50, gateway, book_id=1)[1]
+    assert "No late fee payment" in refund_late_fee_payment(transaction_id, 1.00, gateway, book_id=3)[1]
+    assert refund_late_fee_payment(transaction_id, 6.50, gateway, book_id=2)[0] is True
+    assert gateway.refund_payment.call_count == 2
+    assert [a['refunded_amount'] for a in get_payment_allocations(transaction_id)] == [1.50, 6.50]
+
+def test_nothing_to_pay(temp_db, gateway):
+    assert pay_all_late_fees("888888", gateway) == (False, "No late fees to pay.", None)
+    assert pay_all_late_fees("12", gateway)[0] is False
+    gateway.process_payment.assert_not_called()
+
+def test_declined_charge_records_nothing(overdue_patron, gateway):
+    gateway.process_payment.return_value = (False, "", "Card declined")
+
+    success, message, transaction_id = pay_all_late_fees(overdue_patron, gateway)
+
+    assert (success, transaction_id) == (False, None)
+    assert "Card declined" in message
+    assert get_payment_allocations("txn_777777_1") == []
+
+def test_pay_all_route(overdue_patron, gateway, mocker):
+    mocker.patch('services.library_service.get_payment_gateway', return_value=gateway)
+    app = Flask(__name__)
+    database.init_app(app)
+    register_blueprints(app)
+
+    response = app.test_client().post(f'/api/late_fees/{overdue_patron}/pay')
+
+    assert response.status_code == 200
+    assert response.get_json()['transaction_id'] == "txn_777777_1"
@@ -0,0 +1,152 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from services.payment_service import AsyncPaymentGateway, PaymentGatewayClient
+from services.library_service import pay_late_fees, refund_late_fee_payment
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    """Minimal local stand-in for the payment gateway HTTP API."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        state = self.server.state
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with state['lock']:
+            state['connections'].add(self.client_address)
+            state['in_flight'] += 1
+            state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+            state['idempotency_keys'].append(self.headers.get('Idempotency-Key'))
+            fail = state['fail_next'] > 0
+            state['fail_next'] -= 1 if fail else 0
+        try:
+            time.sleep(state['delay'])
+            if fail:
+                return self._reply(503, {'message': 'try again'})
+            if self.path == '/charges':
+                if body['amount'] > 1000:
+                    return self._reply(402, {'message': 'Payment declined: amount exceeds limit'})
+                return self._reply(200, {'id': f"txn_{body['customer_id']}_1", 'status': 'succeeded',
+                                         'message': f"Payment of ${body['amount']:.2f} processed successfully"})
+            if self.path == '/refunds':
+                return self._reply(200, {'id': f"refund_{body['transaction_id']}", 'status': 'succeeded',
+                                         'message': 'Refund processed'})
+            self._reply(404, {'message': 'Not found'})
+        finally:
+            with state['lock']:
+                state['in_flight'] -= 1
+
+    def do_GET(self):
+        if self.path.startswith('/charges/txn_'):
+            return self._reply(200, {'transaction_id': self.path.rsplit('/', 1)[1], 'status': 'completed'})
+        self._reply(404, {'message': 'Transaction not found'})
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGatewayHandler)
+    server.daemon_threads = True
+    server.state = {'lock': threading.Lock(), 'connections': set(), 'in_flight': 0, 'max_in_flight': 0,
+                    'idempotency_keys': [], 'fail_next': 0, 'delay': 0.0}
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client(stub_server):
+    client = PaymentGatewayClient(base_url=f"http://127.0.0.1:{stub_server.server_address[1]}", backoff=0.01)
+    yield client
+    client.close()
+
+def test_charge_refund_and_status(client):
+    assert client.process_payment("123456", 5.50, "Late fees") == (True, "txn_123456_1", "Payment of $5.50 processed successfully")
+    assert client.refund_payment("txn_123456_1", 5.50) == (True, "Refund processed")
+    assert client.verify_payment_status("txn_123456_1")['status'] == 'completed'
+    assert client.verify_payment_status("bogus")['status'] == 'not_found'
+
+def test_declined_charge(client):
+    success, transaction_id, message = client.process_payment("123456", 5000.00)
+
+    assert success is False
+    assert transaction_id == ""
+    assert "declined" in message
+
+def test_transient_errors_are_retried_with_same_idempotency_key(client, stub_server):
+    stub_server.state['fail_next'] = 2
+
+    assert client.process_payment("123456", 3.00)[0] is True
+    keys = stub_server.state['idempotency_keys']
+    assert len(keys) == 3
+    assert len(set(keys)) == 1
+
+def test_retried_refunds_keep_their_idempotency_key(client, stub_server):
+    stub_server.state['fail_next'] = 1
+
+    assert client.refund_payment("txn_123456_1", 3.00)[0] is True
+    assert client.refund_payment("txn_123456_1", 3.00, idempotency_key="refund-key")[0] is True
+    keys = stub_server.state['idempotency_keys']
+    assert len(keys) == 3
+    assert keys[0] == keys[1] and keys[0] is not None
+    assert keys[2] == "refund-key"
+
+def test_gives_up_after_max_retries(stub_server):
+    stub_server.state['fail_next'] = 10
+    client = PaymentGatewayClient(base_url=f"http://127.0.0.1:{stub_server.server_address[1]}", max_retries=1, backoff=0.01)
+    try:
+        with pytest.raises(Exception):
+            client.process_payment("123456", 3.00)
+    finally:
+        client.close()
+    assert len(stub_server.state['idempotency_keys']) == 2
+
+def test_connections_are_kept_alive(client, stub_server):
+    for _ in range(5):
+        client.process_payment("123456", 1.00)
+
+    assert len(stub_server.state['connections']) == 1
+
+def test_concurrency_is_bounded(stub_server):
+    stub_server.state['delay'] = 0.05
+    gateway = AsyncPaymentGateway(base_url=f"http://127.0.0.1:{stub_server.server_address[1]}", max_concurrency=3)
+
+    async def charge_many():
+        return await asyncio.gather(*(gateway.process_payment("123456", 1.00) for _ in range(9)))
+
+    try:
+        results = asyncio.run(charge_many())
+    finally:
+        gateway.close()
+
+    assert all(success for success, _, _ in results)
+    assert stub_server.state['max_in_flight'] <= 3
+
+def test_service_functions_accept_client(client, mocker):
+    mocker.patch('services.library_service.calculate_late_fee_for_book',
+                 return_value={'fee_amount': 4.00, 'days_overdue': 8, 'status': 'implemented'})
+    mocker.patch('services.library_service.get_book_by_id', return_value={'id': 1, 'title': 'The Great Gatsby'})
+
+    success, message, transaction_id = pay_late_fees("123456", 1, client)
+
+    assert success is True
+    assert transaction_id == "txn_123456_1"
+    assert refund_late_fee_payment(transaction_id, 4.00, client) == (True, "Refund processed")
@@ -0,0 +1,86 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import pytest
+from database import insert_book, insert_borrow_record, get_payment, get_payments
+from services.payment_service import PaymentGateway
+from services.library_service import pay_late_fees, pay_all_late_fees, refund_late_fee_payment
+
+@pytest.fixture
+def overdue_book(temp_db):
+    now = datetime.now()
+    insert_book("Ledger Book", "Author", "7100000000001", 1, 1)
+    insert_borrow_record("999999", 1, now - timedelta(days=24), now - timedelta(days=10))
+    return 1
+
+@pytest.fixture
+def gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_999999_1", "Payment of $6.50 processed successfully")
+    gateway.refund_payment.return_value = (True, "Refund processed")
+    return gateway
+
+def test_retry_with_same_key_does_not_charge_twice(overdue_book, gateway):
+    first = pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-1")
+    second = pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-1")
+
+    assert first == second == (True, "Payment successful! Payment of $6.50 processed successfully", "txn_999999_1")
+    gateway.process_payment.assert_called_once()
+    assert get_payment("req-1")['status'] == 'completed'
+
+def test_declined_result_is_replayed(overdue_book, gateway):
+    gateway.process_payment.return_value = (False, "", "Card declined")
+
+    assert pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-2")[0] is False
+    assert pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-2") == (False, "Payment failed: Card declined", None)
+    gateway.process_payment.assert_called_once()
+
+def test_errored_request_can_be_retried(overdue_book, gateway):
+    gateway.process_payment.side_effect = [ConnectionError("timeout"), (True, "txn_999999_1", "ok")]
+
+    assert "processing error" in pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-3")[1]
+    assert get_payment("req-3")['status'] == 'error'
+    assert pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-3")[0] is True
+    assert gateway.process_payment.call_count == 2
+    assert [call.kwargs['idempotency_key'] for call in gateway.process_payment.call_args_list] == ["req-3", "req-3"]
+
+def test_errored_key_cannot_be_reused_for_a_refund(overdue_book, gateway):
+    gateway.process_payment.side_effect = ConnectionError("timeout")
+    pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-6")
+
+    success, message = refund_late_fee_payment("txn_999999_1", 6.50, gateway, idempotency_key="req-6")
+
+    assert success is False
+    assert "different request" in message
+    gateway.refund_payment.assert_not_called()
+    assert get_payment("req-6")['kind'] == 'charge' and get_payment("req-6")['status'] == 'error'
+
+def test_key_reused_for_different_request(overdue_book, gateway):
+    pay_all_late_fees("999999", gateway, idempotency_key="req-4")
+
+    success, message, _ = pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-4")
+
+    assert success is False
+    assert "different request" in message
+
+def test_refunds_are_idempotent(overdue_book, gateway):
+    _, _, transaction_id = pay_all_late_fees("999999", gateway)
+
+    assert refund_late_fee_payment(transaction_id, 6.50, gateway, book_id=overdue_book, idempotency_key="ref-1") == (True, "Refund processed")
+    assert refund_late_fee_payment(transaction_id, 6.50, gateway, book_id=overdue_book, idempotency_key="ref-1") == (True, "Refund processed")
+    gateway.refund_payment.assert_called_once()
+    assert gateway.refund_payment.call_args.kwargs['idempotency_key'] == "ref-1"
+
+def test_ledger_supports_local_reconciliation(overdue_book, gateway):
+    pay_late_fees("999999", overdue_book, gateway, idempotency_key="req-5")
+    start = datetime.now() - timedelta(hours=1)
+
+    payments = get_payments(start, start + timedelta(days=1), kind='charge', status='completed')
+
+    assert [payment['transaction_id'] for payment in payments] == ["txn_999999_1"]
+    assert payments[0]['amount'] == 6.50
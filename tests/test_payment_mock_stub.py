@@ -4,7 +4,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pytest
 from services.library_service import (pay_late_fees, refund_late_fee_payment)
-from unittest.mock import Mock
+from unittest.mock import ANY, Mock
 from services.payment_service import PaymentGateway
 
 class TestPayLateFees:
@@ -46,7 +46,8 @@ class TestPayLateFees:
         mock_gateway.process_payment.assert_called_once_with(
             patron_id="123456",
             amount=5.50,
-            description="Late fees for 'The Great Gatsby'"
+            description="Late fees for 'The Great Gatsby'",
+            idempotency_key=ANY
         )
     
     def test_payment_declined_by_gateway(self, mocker):
@@ -76,7 +77,8 @@ class TestPayLateFees:
         mock_gateway.process_payment.assert_called_once_with(
             patron_id="654321",
             amount=3.00,
-            description="Late fees for '1984'"
+            description="Late fees for '1984'",
+            idempotency_key=ANY
         )
     
     def test_invalid_patron_id(self, mocker):
@@ -188,7 +190,7 @@ class TestRefundLateFeePayment:
         assert success is True
         assert "Refund processed successfully" in message
         
-        mock_gateway.refund_payment.assert_called_once_with("txn_98765", 10.00)
+        mock_gateway.refund_payment.assert_called_once_with("txn_98765", 10.00, idempotency_key=ANY)
     
     def test_invalid_transaction_id(self):
         """Test rejection of invalid transaction IDs - mock should NOT be called"""
@@ -250,7 +252,7 @@ class TestRefundLateFeePayment:
         assert success is False
         assert "Refund failed: Transaction not found" in message
         
-        mock_gateway.refund_payment.assert_called_once_with("txn_44444", 8.50)
+        mock_gateway.refund_payment.assert_called_once_with("txn_44444", 8.50, idempotency_key=ANY)
     
     def test_refund_exception_handling(self):
         """Test exception handling when refund gateway raises error"""
@@ -272,7 +274,7 @@ class TestRefundLateFeePayment:
         success, message = refund_late_fee_payment("txn_66666", 15.00, mock_gateway)
         
         assert success is True
-        mock_gateway.refund_payment.assert_called_once_with("txn_66666", 15.00)
+        mock_gateway.refund_payment.assert_called_once_with("txn_66666", 15.00, idempotency_key=ANY)
 
 
 class TestPaymentGatewayDirectly:
@@ -0,0 +1,94 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from datetime import date, timedelta
+from unittest.mock import Mock
+import pytest
+from database import record_pending_payment, complete_payment
+from services.payment_service import PaymentGateway, verify_payment_statuses, clear_verified_statuses
+from services.library_service import reconcile_payments
+
+class SlowGateway:
+    """Gateway stub that records how many status checks run at once."""
+
+    def __init__(self, statuses=None, delay=0.05):
+        self.statuses = statuses or {}
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def verify_payment_status(self, transaction_id):
+        with self.lock:
+            self.calls.append(transaction_id)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return {"transaction_id": transaction_id, "status": self.statuses.get(transaction_id, "completed")}
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    clear_verified_statuses()
+    yield
+    clear_verified_statuses()
+
+def test_checks_run_concurrently_within_bound():
+    gateway = SlowGateway()
+    ids = [f"txn_{i}" for i in range(20)]
+
+    started = time.perf_counter()
+    results = verify_payment_statuses(ids, gateway, max_workers=5)
+
+    assert time.perf_counter() - started < 20 * gateway.delay / 2
+    assert gateway.peak <= 5
+    assert list(results) == ids
+    assert all(result['status'] == 'completed' for result in results.values())
+
+def test_duplicates_checked_once_and_final_states_cached():
+    gateway = SlowGateway({"txn_pending": "pending"}, delay=0)
+
+    verify_payment_statuses(["txn_a", "txn_a", "txn_pending"], gateway)
+    results = verify_payment_statuses(["txn_a", "txn_pending"], gateway)
+
+    assert gateway.calls.count("txn_a") == 1
+    assert gateway.calls.count("txn_pending") == 2
+    assert results["txn_pending"]['status'] == 'pending'
+
+def test_failed_check_is_reported_not_raised():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.verify_payment_status.side_effect = ConnectionError("timeout")
+
+    results = verify_payment_statuses(["txn_x"], gateway)
+
+    assert results["txn_x"] == {"transaction_id": "txn_x", "status": "error", "message": "timeout"}
+    # Errors are not cached
+    verify_payment_statuses(["txn_x"], gateway)
+    assert gateway.verify_payment_status.call_count == 2
+
+def test_reconcile_flags_mismatches_and_unresolved(temp_db):
+    record_pending_payment("k1", 'charge', "100001", None, 5.0)
+    complete_payment("k1", 'completed', "ok", "txn_ok")
+    record_pending_payment("k2", 'charge', "100002", None, 3.0)
+    complete_payment("k2", 'completed', "ok", "txn_reversed")
+    record_pending_payment("k3", 'charge', "100003", None, 2.0)
+    complete_payment("k3", 'error', "timeout")
+    record_pending_payment("k4", 'charge', "100004", None, 1.0)
+    complete_payment("k4", 'declined', "Card declined")
+    gateway = SlowGateway({"txn_reversed": "refunded"}, delay=0)
+
+    report = reconcile_payments(date.today(), gateway)
+
+    assert report['checked'] == 2
+    assert report['matched'] == 1
+    assert report['mismatched'] == [{'idempotency_key': "k2", 'transaction_id': "txn_reversed",
+                                     'amount': 3.0, 'gateway_status': 'refunded'}]
+    assert report['unresolved'] == [{'idempotency_key': "k3", 'status': 'error', 'amount': 2.0}]
+    assert reconcile_payments(date.today() - timedelta(days=1), gateway)['checked'] == 0
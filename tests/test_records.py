@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+import pytest
+from records import BorrowedBook, HistoryEntry, Loan
+from benchmarks import bench_records
+
+BORROWED = '2024-03-01T10:30:00'
+DUE = '2024-03-15T10:30:00'
+
+def test_dates_are_parsed_on_first_read_and_cached():
+    book = BorrowedBook(7, "Title", "Author", BORROWED, DUE)
+
+    assert book._due_date is None
+    assert book.due_date == datetime(2024, 3, 15, 10, 30)
+    assert book._due_date is book.due_date
+    assert book._borrow_date is None
+
+def test_records_support_dict_style_access():
+    book = BorrowedBook(7, "Title", "Author", BORROWED, DUE)
+
+    assert book['book_id'] == 7
+    assert book['is_overdue'] is True
+    assert 'due_date' in book and 'return_date' not in book
+    assert book == book.to_dict()
+    with pytest.raises(KeyError):
+        book['patron_id']
+
+def test_records_use_slots():
+    entry = HistoryEntry(7, "Title", "Author", BORROWED)
+
+    assert not hasattr(entry, '__dict__')
+    with pytest.raises(AttributeError):
+        entry.patron_id = '123456'
+
+def test_missing_return_date_is_none():
+    entry = HistoryEntry(7, "Title", "Author", BORROWED, None)
+
+    assert entry.return_date is None
+    assert entry == {'book_id': 7, 'title': "Title", 'author': "Author",
+                     'borrow_date': datetime(2024, 3, 1, 10, 30), 'return_date': None}
+
+def test_loan_converts_to_report_records():
+    future = (datetime.now() + timedelta(days=3)).isoformat()
+    loan = Loan(7, "Title", "Author", BORROWED, future, None)
+
+    assert loan.is_open
+    assert loan.borrowed_book().is_overdue is False
+    assert loan.history_entry() == HistoryEntry(7, "Title", "Author", BORROWED, None)
+    assert not Loan(7, "Title", "Author", BORROWED, DUE, '2024-03-10T09:00:00').is_open
+
+def test_benchmark_records_match_legacy_dicts():
+    result = bench_records.run(loans=200, repeat=1)
+
+    assert result['results']['borrowed_books']['rows'] == 20
+    assert result['results']['borrow_history']['rows'] == 200
+    assert result['results']['borrow_history']['record_bytes_per_row'] < \
+        result['results']['borrow_history']['dict_bytes_per_row']
@@ -0,0 +1,111 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import pytest
+from database import (
+    insert_book, insert_books, get_book_by_isbn, get_catalog_version, update_book_availability, checkout_book_copy
+)
+from app import create_app
+import routes.catalog_routes
+
+@pytest.fixture
+def app(temp_db):
+    insert_book("Cached Book", "Author", "4000000000001", 2, 2)
+    return create_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_catalog_version_follows_book_changes(temp_db):
+    version, updated_at = get_catalog_version()
+    insert_book("Versioned", "Author", "4000000000002", 1, 1)
+    book_id = get_book_by_isbn("4000000000002")['id']
+    after_insert = get_catalog_version()[0]
+    update_book_availability(book_id, -1)
+    after_update = get_catalog_version()[0]
+    checkout_book_copy(book_id)  # no copy left: nothing changes
+    insert_books([("Bulk", "Author", "4000000000003", 1, 1)])
+
+    assert version < after_insert < after_update
+    assert get_catalog_version()[0] > after_update
+    assert updated_at.tzinfo is not None
+
+def test_catalog_sends_validators_and_honours_if_none_match(client):
+    first = client.get('/catalog')
+    etag = first.headers['ETag']
+
+    assert first.status_code == 200
+    assert first.headers['Last-Modified']
+    assert 'no-cache' in first.headers['Cache-Control']
+    repeat = client.get('/catalog', headers={'If-None-Match': etag})
+    assert repeat.status_code == 304
+    assert repeat.get_data() == b''
+    assert client.get('/catalog', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+def test_if_modified_since_alone_never_answers_304(client):
+    first = client.get('/catalog')
+    book_id = get_book_by_isbn("4000000000001")['id']
+    update_book_availability(book_id, -1)  # same second as the page the client holds
+
+    second = client.get('/catalog', headers={'If-Modified-Since': first.headers['Last-Modified']})
+
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert client.get('/catalog', headers={'If-Modified-Since': second.headers['Last-Modified']}).status_code == 200
+
+def test_repeated_requests_are_served_from_cache(client, monkeypatch):
+    calls = []
+    get_books_page = routes.catalog_routes.get_books_page
+    monkeypatch.setattr(routes.catalog_routes, 'get_books_page',
+                        lambda *args: calls.append(args) or get_books_page(*args))
+
+    bodies = [client.get('/catalog').get_data() for _ in range(3)]
+
+    assert len(calls) == 1
+    assert bodies[0] == bodies[1] == bodies[2]
+
+def test_book_changes_invalidate_pages(client):
+    first = client.get('/api/search?q=cached&type=title')
+    book_id = get_book_by_isbn("4000000000001")['id']
+    update_book_availability(book_id, -1)
+    second = client.get('/api/search?q=cached&type=title', headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert second.get_json()['results'][0]['available_copies'] == 1
+
+def test_pages_ignore_books_cached_before_another_process_changed_them(client, temp_db):
+    assert get_book_by_isbn("4000000000001")['available_copies'] == 2  # now in the book cache
+    other_process = sqlite3.connect(temp_db)
+    other_process.execute("UPDATE books SET available_copies = 1 WHERE isbn = '4000000000001'")
+    other_process.commit()
+    other_process.close()
+
+    response = client.get('/api/search?q=4000000000001&type=isbn')
+
+    assert response.get_json()['results'][0]['available_copies'] == 1
+
+def test_pending_flash_messages_bypass_cache(client):
+    client.get('/catalog')
+    response = client.post('/borrow', data={'patron_id': 'bad', 'book_id': '1'}, follow_redirects=True)
+
+    assert 'Invalid patron ID' in response.get_data(as_text=True)
+    assert 'ETag' not in response.headers
+    assert 'Invalid patron ID' not in client.get('/catalog').get_data(as_text=True)
+
+def test_search_pages_are_cached_per_query(client):
+    title = client.get('/search?q=cached&type=title')
+    author = client.get('/search?q=cached&type=author')
+
+    assert title.headers['ETag'] != author.headers['ETag']
+    assert client.get('/search?q=cached&type=title', headers={'If-None-Match': title.headers['ETag']}).status_code == 304
+
+def test_cache_can_be_disabled(temp_db):
+    client = create_app({'RESPONSE_CACHE_SIZE': 0}).test_client()
+
+    assert 'ETag' not in client.get('/catalog').headers
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from database import insert_book, search_books
+from services.library_service import search_books_in_catalog
+
+@pytest.fixture
+def catalog(temp_db):
+    insert_book("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565", 3, 3)
+    insert_book("Great Expectations", "Charles Dickens", "9780141439563", 2, 2)
+    insert_book("A Tale of Two Cities", "Charles Dickens", "9780141439600", 1, 1)
+
+def test_title_prefix_match(catalog):
+    results = search_books_in_catalog("gats", "title")
+
+    assert [book['title'] for book in results] == ["The Great Gatsby"]
+
+def test_every_word_must_match(catalog):
+    results = search_books_in_catalog("great exp", "title")
+
+    assert [book['title'] for book in results] == ["Great Expectations"]
+
+def test_author_search_ignores_punctuation(catalog):
+    results = search_books_in_catalog("F. Scott", "author")
+
+    assert [book['isbn'] for book in results] == ["9780743273565"]
+
+def test_new_books_are_indexed_on_insert(catalog):
+    insert_book("Oliver Twist", "Charles Dickens", "9780141439747", 1, 1)
+
+    results = search_books_in_catalog("dickens", "author")
+
+    assert {book['title'] for book in results} == {"Great Expectations", "A Tale of Two Cities", "Oliver Twist"}
+
+def test_isbn_is_exact_match(catalog):
+    assert search_books_in_catalog("9780141439563", "isbn")[0]['title'] == "Great Expectations"
+    assert search_books_in_catalog("978014143956", "isbn") == []
+
+def test_terms_without_words_or_with_quotes(catalog):
+    assert search_books_in_catalog("!!!", "title") == []
+    assert search_books_in_catalog('"great', "title") != []
+
+def test_limit_and_unknown_column(catalog):
+    assert len(search_books("great", "title", limit=1)) == 1
+    with pytest.raises(ValueError):
+        search_books("great", "isbn")
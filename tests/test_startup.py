@@ -0,0 +1,37 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import threading
+import database
+from app import create_app
+from benchmarks import bench_startup
+
+def test_startup_does_not_import_requests():
+    result = bench_startup.run(runs=1)
+
+    assert result['heavy_modules'] == []
+    assert result['warm_total_ms'] > 0
+
+def test_sample_data_only_in_demo_config(temp_db):
+    create_app()
+    assert database.get_all_books() == []
+
+    create_app({'SAMPLE_DATA': True})
+    assert len(database.get_all_books()) == 3
+
+def test_default_app_starts_no_threads_and_writes_nothing(temp_db):
+    observer = sqlite3.connect(temp_db)
+    data_version = observer.execute('PRAGMA data_version').fetchone()[0]
+    threads_before = set(threading.enumerate())
+
+    app = create_app()
+
+    assert set(threading.enumerate()) - threads_before == set()
+    assert 'job_workers' not in app.extensions
+    # data_version changes whenever another connection commits a write
+    assert observer.execute('PRAGMA data_version').fetchone()[0] == data_version
+    observer.close()
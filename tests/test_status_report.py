@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+import pytest
+from database import (
+    insert_book, insert_borrow_record, update_borrow_record_return_date,
+    get_patron_borrowed_books, get_patron_borrow_history, get_pool_stats
+)
+from services.library_service import get_patron_status_report, calculate_late_fee_for_book
+
+@pytest.fixture
+def patron_loans(temp_db):
+    now = datetime.now()
+    for i in range(4):
+        insert_book(f"Report Book {i}", "Author", f"{8000000000000 + i}", 1, 1)
+    # Returned loan, one on time, one 3 days late, one 20 days late
+    insert_borrow_record("222222", 1, now - timedelta(days=60), now - timedelta(days=46))
+    update_borrow_record_return_date("222222", 1, now - timedelta(days=50))
+    insert_borrow_record("222222", 2, now - timedelta(days=2), now + timedelta(days=12))
+    insert_borrow_record("222222", 3, now - timedelta(days=17), now - timedelta(days=3))
+    insert_borrow_record("222222", 4, now - timedelta(days=34), now - timedelta(days=20))
+    return "222222"
+
+def test_report_matches_per_book_helpers(patron_loans):
+    report = get_patron_status_report(patron_loans)
+    expected_fees = sum(calculate_late_fee_for_book(patron_loans, book['book_id'])['fee_amount']
+                        for book in get_patron_borrowed_books(patron_loans))
+
+    assert report['borrowed_books'] == get_patron_borrowed_books(patron_loans)
+    assert [book['book_id'] for book in report['borrowed_books']] == [4, 3, 2]
+    assert report['borrow_count'] == 3
+    assert report['late_fees'] == expected_fees == 16.50
+    assert report['borrow_history'] == get_patron_borrow_history(patron_loans)[::-1]
+    assert [book['is_overdue'] for book in report['borrowed_books']] == [True, True, False]
+
+def test_report_uses_one_connection(patron_loans):
+    before = get_pool_stats()
+    get_patron_status_report(patron_loans)
+    after = get_pool_stats()
+
+    checkouts = (after['hits'] + after['misses']) - (before['hits'] + before['misses'])
+    assert checkouts == 1
@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import pytest
+from database import (
+    transaction, insert_book, get_book_by_isbn, get_book_by_id,
+    get_patron_borrow_count, checkout_book_copy, checkin_book_copy
+)
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+
+def test_concurrent_borrows_never_oversell(temp_db):
+    insert_book("Last Copy", "Author", "3333333333333", 1, 1)
+    book_id = get_book_by_isbn("3333333333333")['id']
+    results = []
+
+    def borrow(patron_id):
+        results.append(borrow_book_by_patron(patron_id, book_id))
+
+    threads = [threading.Thread(target=borrow, args=(f"{100000 + i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(1 for success, _ in results if success) == 1
+    assert get_book_by_id(book_id)['available_copies'] == 0
+
+def test_borrow_then_return_restores_availability(temp_db):
+    insert_book("Round Trip", "Author", "4444444444444", 2, 2)
+    book_id = get_book_by_isbn("4444444444444")['id']
+
+    assert borrow_book_by_patron("111111", book_id)[0] is True
+    assert get_book_by_id(book_id)['available_copies'] == 1
+    assert get_patron_borrow_count("111111") == 1
+
+    assert return_book_by_patron("111111", book_id)[0] is True
+    assert get_book_by_id(book_id)['available_copies'] == 2
+    assert get_patron_borrow_count("111111") == 0
+
+def test_transaction_rolls_back_on_error(temp_db):
+    insert_book("Rollback", "Author", "5555555555555", 1, 1)
+    book_id = get_book_by_isbn("5555555555555")['id']
+
+    with pytest.raises(RuntimeError):
+        with transaction():
+            assert checkout_book_copy(book_id) is True
+            raise RuntimeError("abort")
+
+    assert get_book_by_id(book_id)['available_copies'] == 1
+
+def test_copy_counts_stay_within_bounds(temp_db):
+    insert_book("Bounds", "Author", "6666666666666", 1, 1)
+    book_id = get_book_by_isbn("6666666666666")['id']
+
+    assert checkin_book_copy(book_id) is False
+    assert checkout_book_copy(book_id) is True
+    assert checkout_book_copy(book_id) is False
+    assert get_book_by_id(book_id)['available_copies'] == 0
@@ -0,0 +1,67 @@
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import runpy
+import threading
+import pytest
+import database
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+def test_server_settings_come_from_environment(monkeypatch):
+    monkeypatch.setenv('LIBRARY_WORKERS', '6')
+    monkeypatch.setenv('LIBRARY_THREADS', '3')
+    monkeypatch.setenv('LIBRARY_KEEPALIVE', '10')
+    monkeypatch.setenv('LIBRARY_MAX_REQUESTS', '1000')
+
+    settings = runpy.run_path(CONFIG)
+
+    assert (settings['workers'], settings['threads'], settings['keepalive']) == (6, 3, 10)
+    assert settings['max_requests'] == 1000 and settings['max_requests_jitter'] == 100
+    assert settings['worker_class'] == 'gthread'
+    assert settings['preload_app'] is False
+    assert settings['raw_env'] == ['LIBRARY_DB_POOL_SIZE=3']
+
+def test_pool_covers_request_and_job_threads(monkeypatch):
+    monkeypatch.setenv('LIBRARY_THREADS', '8')
+    monkeypatch.setenv('LIBRARY_JOB_WORKERS', '2')
+    assert runpy.run_path(CONFIG)['db_pool_size'] == 10
+
+    monkeypatch.setenv('LIBRARY_DB_POOL_SIZE', '5')
+    with pytest.raises(ValueError):
+        runpy.run_path(CONFIG)
+
+def test_master_prepares_database_then_releases_connections(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+    monkeypatch.setenv('LIBRARY_DATABASE', str(tmp_path / 'served.db'))
+    monkeypatch.setenv('LIBRARY_SAMPLE_DATA', 'true')
+    settings = runpy.run_path(CONFIG)
+
+    settings['on_starting'](None)
+
+    assert database._pool is None
+    assert database.get_schema_version() == database.SCHEMA_MIGRATIONS[-1][0]
+    assert len(database.get_all_books()) == 3
+    database.close_pool()
+
+def test_concurrent_startup_adds_sample_data_once(temp_db):
+    threads = [threading.Thread(target=database.add_sample_data) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(database.get_all_books()) == 3
+
+def test_app_config_selects_database(tmp_path, monkeypatch):
+    from app import create_app
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+
+    create_app({'DATABASE': str(tmp_path / 'configured.db')})
+
+    assert database.DATABASE == str(tmp_path / 'configured.db')
+    assert os.path.exists(database.DATABASE)
+    database.close_pool()